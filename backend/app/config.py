@@ -1,18 +1,105 @@
 from functools import cached_property
 from typing import Set
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from app.services.llm_router import DeploymentConfig
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./notes.db"  # Default to SQLite for local dev
+    # Optional read replica for the read-only endpoints (note, listing, search)
+    DATABASE_READ_URL: str = ""
+
+    # Connection pool, per gunicorn worker: a worker holds up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections to each database. On the
+    # primary, DB_SYNC_POOL_SIZE of the pooled ones go to the sync engine,
+    # which may also open LLM_MAX_IN_FLIGHT + 2 in total for the LLM cache
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_SYNC_POOL_SIZE: int = 2
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # wait for a free connection before failing
+    # Replace connections older than this; Neon suspends idle computes after
+    # 5 minutes, which silently kills the connections held open to them
+    DB_POOL_RECYCLE_SECONDS: int = 240
+    DB_POOL_PRE_PING: bool = True  # test each connection on checkout, reconnect if stale
 
     # Azure OpenAI Settings
     AZURE_OPENAI_ENDPOINT: str = ""
     AZURE_OPENAI_API_KEY: str = ""
     AZURE_OPENAI_API_VERSION: str = "2024-02-15-preview"
     AZURE_DEPLOYMENT_NAME: str = "gpt-4o"
+    # Optional smaller/faster deployment on the same endpoint for map chunks
+    AZURE_MAP_DEPLOYMENT_NAME: str = ""
+
+    # Multi-deployment routing: JSON list of app.services.llm_router.DeploymentConfig
+    # (endpoint, api_key, deployment, weight, quota, stages). Empty = the AZURE_*
+    # deployment(s) above with the LLM_* quota.
+    LLM_DEPLOYMENTS: list[DeploymentConfig] = []
+    LLM_ROUTER_COOLDOWN_SECONDS: float = 10.0
+
+    # YouTube transcripts
+    TRANSCRIPT_LANGUAGE: str = "en"
+    TRANSCRIPT_HTTP_POOL_SIZE: int = 10
+    # Strip rolling-caption repeats, [Music]-style markers and hesitations before chunking
+    TRANSCRIPT_NORMALIZE: bool = True
+
+    # LLM call scheduler (quota of the Azure deployment; 0 disables a limit)
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_MAX_IN_FLIGHT: int = 8
+    LLM_MAX_RETRIES: int = 5
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 60.0
+    LLM_OUTPUT_TOKENS_ESTIMATE: int = 1000  # counted against TPM before the call
+    LLM_BATCH_MAX_IN_FLIGHT: int = 4  # share of LLM_MAX_IN_FLIGHT batch ingestion may use
+    # Hedged map calls: a map call still running past this percentile of recent
+    # map latencies gets a duplicate request, the first answer wins (0 disables)
+    LLM_HEDGE_PERCENTILE: float = 0
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # map calls seen before hedging starts
+    LLM_HEDGE_WINDOW: int = 200  # recent map latencies the percentile is taken over
+
+    # Chunk planning budgets (estimated tokens, size them to the deployment)
+    LLM_MAP_CHUNK_TOKENS: int = 6000
+    LLM_SINGLE_CALL_TOKENS: int = 12000  # whole transcript in one call below this
+    LLM_REDUCE_INPUT_TOKENS: int = 25000
+
+    # Persistent cache of map/reduce outputs
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_MB: int = 256
+    LLM_CACHE_MAX_AGE_DAYS: int = 30
+
+    # Single-flight generation lock (cross-worker)
+    GENERATION_LOCK_TTL_SECONDS: int = 600
+    GENERATION_POLL_SECONDS: float = 2.0
+    # How long a request waits on another worker's generation of the same video
+    GENERATION_WAIT_SECONDS: int = 900
+
+    # Admission control, per worker, in projected prompt tokens (see
+    # app.services.admission; an hour of speech is ~20k, 0 disables a ceiling)
+    ADMISSION_MAX_IN_FLIGHT_TOKENS: int = 400_000
+    ADMISSION_MAX_JOB_TOKENS: int = 300_000
+    ADMISSION_MAX_QUEUED: int = 20
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 30.0  # interactive requests; background jobs wait
+
+    # POST /notes/batch: videos generated at once per batch
+    BATCH_CONCURRENCY: int = 2
+    # A job its worker has not touched for this long (the worker restarted
+    # mid-generation) is failed; running jobs touch theirs every fifth of it
+    JOB_STALE_SECONDS: int = 300
+
+    # HTTP caching of the read endpoints: how long clients may reuse a note
+    # without revalidating (listings and search always revalidate)
+    NOTE_CACHE_MAX_AGE_SECONDS: int = 300
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # bytes; smaller bodies are sent as-is
+
+    # Per-client (IP) generation quota; window 0 = lifetime
+    QUOTA_LIMIT: int = 2
+    QUOTA_WINDOW_SECONDS: int = 0
+
+    # Load the LLM/transcript/render libraries and connect the DB in the
+    # background after startup, so the first request doesn't pay for it
+    STARTUP_WARM_UP: bool = True
 
-    # Admin IPs (comma-separated string)
+    # Admin IPs (comma-separated string), exempt from the quota
     ADMIN_IPS: str = ""
 
     @cached_property
@@ -1,16 +1,209 @@
-from sqlmodel import SQLModel, create_engine, Session
+from contextlib import contextmanager
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.config import settings
+from app.models import UTCDateTime
+from app.services import metrics
 
 # check_same_thread=False is needed only for SQLite
 connect_args = {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 
-engine = create_engine(settings.DATABASE_URL, connect_args=connect_args)
 
+def pool_options(database_url: str, pool_size: int, max_overflow: int) -> dict:
+    """
+    Connection pool arguments for an engine on database_url. SQLite keeps
+    SQLAlchemy's defaults: its connections are local files with nothing to
+    size, recycle or ping.
+    """
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
 
-def create_db_and_tables():
+
+def count_connections(engine: Engine | AsyncEngine, database: str):
+    """Keeps the db_connections gauges in step with the engine's pool."""
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+    opened = metrics.DB_CONNECTIONS.labels(database=database, state="open")
+    checked_out = metrics.DB_CONNECTIONS.labels(database=database, state="checked_out")
+    event.listen(engine, "connect", lambda *args: opened.inc())
+    event.listen(engine, "close", lambda *args: opened.dec())
+    event.listen(engine, "close_detached", lambda *args: opened.dec())
+    event.listen(engine, "checkout", lambda *args: checked_out.inc())
+    event.listen(engine, "checkin", lambda *args: checked_out.dec())
+
+
+# The primary's two engines share the DB_POOL_SIZE pooled connections
+# (each engine keeps at least one)
+sync_pool_size = max(1, min(settings.DB_SYNC_POOL_SIZE, settings.DB_POOL_SIZE - 1))
+
+# Sync engine: schema creation, the warm-up, the LLM cache (run in threads)
+# and tooling such as app.services.transfer. Every in-flight LLM call can
+# look up the cache at once, next to an export and the search warm-up, so
+# it overflows up to that many connections rather than making them queue
+sync_max_overflow = max(0, settings.LLM_MAX_IN_FLIGHT + 2 - sync_pool_size)
+engine = create_engine(
+    settings.DATABASE_URL,
+    connect_args=connect_args,
+    **pool_options(settings.DATABASE_URL, sync_pool_size, sync_max_overflow),
+)
+count_connections(engine, "primary")
+
+
+def async_database_url(database_url: str) -> URL:
+    """
+    The async driver URL for DATABASE_URL: aiosqlite for SQLite, asyncpg
+    for Postgres. asyncpg takes ssl= instead of libpq's sslmode= (as in
+    Neon connection strings) and has no channel_binding option.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        query.pop("channel_binding", None)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    return url
+
+
+# Async engine: everything on the request path, so a database round trip
+# never blocks the event loop
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **pool_options(settings.DATABASE_URL, max(1, settings.DB_POOL_SIZE - sync_pool_size), settings.DB_MAX_OVERFLOW),
+)
+count_connections(async_engine, "primary")
+
+# Read-only endpoints go to the replica when one is configured
+if settings.DATABASE_READ_URL:
+    read_engine = create_async_engine(
+        async_database_url(settings.DATABASE_READ_URL),
+        **pool_options(settings.DATABASE_READ_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+    )
+    count_connections(read_engine, "replica")
+else:
+    read_engine = async_engine
+
+
+def schema_is_current() -> bool:
+    """Whether every model's table already exists, in a single catalog query."""
+    return set(SQLModel.metadata.tables) <= set(inspect(engine).get_table_names())
+
+
+# Key of the Postgres advisory lock held while a worker migrates the schema
+MIGRATION_LOCK_KEY = 7_301_865_214
+
+
+@contextmanager
+def migration_lock():
+    """
+    Holds the startup schema work (table creation, migrations) to one
+    worker at a time. gunicorn boots its workers together and each runs it;
+    the later ones then find nothing left to do. Postgres takes an advisory
+    lock on a connection of its own; a SQLite file, which only the workers
+    on its host can open, a lock file next to it.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        return
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or not database or database == ":memory:":
+        yield
+        return
+    import fcntl  # the workers sharing a SQLite file run on one Unix host
+
+    with open(f"{database}.migrate.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def create_db_and_tables() -> bool:
+    """
+    Creates any missing tables. Skipped on a database that already has them
+    all, which is every boot but the first after a model is added, since
+    create_all checks each table with a round trip of its own.
+    Returns whether the schema was created or extended.
+    """
+    if schema_is_current():
+        return False
     SQLModel.metadata.create_all(engine)
+    return True
+
+
+def migrate_timestamps() -> list[str]:
+    """
+    Converts timestamp columns created without a time zone (older SQLModel
+    versions mapped datetime to a plain DateTime) to timestamptz, reading
+    the stored values as UTC, so asyncpg takes the aware datetimes written
+    to them. Postgres only, and one catalog query once done. Returns the
+    columns converted.
+
+    Run it under migration_lock: the columns are looked up inside it, so a
+    worker never converts a column another one already has.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    expected = {
+        (table.name, column.name)
+        for table in SQLModel.metadata.tables.values()
+        for column in table.columns
+        if isinstance(column.type, UTCDateTime)
+    }
+    converted = []
+    with engine.begin() as connection:
+        # Conversions then never depend on the server's default time zone
+        connection.execute(text("SET LOCAL TimeZone = 'UTC'"))
+        rows = connection.execute(text(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND data_type = 'timestamp without time zone'"
+        )).all()
+        for table, column in rows:
+            if (table, column) not in expected:
+                continue
+            connection.execute(text(
+                f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE timestamptz USING "{column}" AT TIME ZONE \'UTC\''
+            ))
+            converted.append(f"{table}.{column}")
+    return converted
+
+
+async def _open_session(bind: AsyncEngine, database: str):
+    # expire_on_commit=False: attributes stay readable after a commit
+    # without an implicit (and, in async code, impossible) refresh
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        # Check the connection out up front, so the pool wait is measured
+        with metrics.DB_POOL_CHECKOUT_SECONDS.labels(database=database).time():
+            await session.connection()
+        yield session
+
+
+async def get_session():
+    """Session on the primary, for endpoints that write or must see their own writes."""
+    async for session in _open_session(async_engine, "primary"):
+        yield session
 
 
-def get_session():
-    with Session(engine) as session:
+async def get_read_session():
+    """Session on the read replica (the primary without one), for read-only endpoints."""
+    database = "primary" if read_engine is async_engine else "replica"
+    async for session in _open_session(read_engine, database):
         yield session
@@ -1,14 +1,88 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request
+# First, so the startup report covers every import below
+from app.services import startup
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select, func
-from app.db import create_db_and_tables, get_session
-from app.models import Note, NoteRead
-from app.services.transcript import extract_video_id, get_raw_transcript
-from app.services.ai import generate_notes_map_reduce
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import (
+    async_engine,
+    create_db_and_tables,
+    get_read_session,
+    get_session,
+    engine,
+    migrate_timestamps,
+    migration_lock,
+    read_engine,
+)
+from app.models import (
+    Note,
+    NoteRead,
+    NoteSummary,
+    NotePage,
+    NoteSearchResult,
+    NoteSearchPage,
+    RenderedNoteRead,
+    Job,
+    JobRead,
+    Batch,
+    BatchRead,
+)
+from app.services.transcript import (
+    extract_video_id,
+    get_raw_transcript,
+    get_transcript_api,
+    load_transcript,
+    save_transcript,
+    video_url,
+)
+from app.services.ai import generate_notes_map_reduce, get_router, llm_priority, ProgressCallback
+from app.services import http_cache, metrics, quota
+from app.services.admission import admission_controller, background_admission, estimate_workload
+from app.services.note_content import (
+    delete_note,
+    ensure_note_indexes,
+    index_missing_notes,
+    load_note_content,
+    move_inline_bodies,
+    save_note_content,
+    to_note_read,
+)
+from app.services.render import (
+    RENDER_VERSION,
+    RenderedMarkdown,
+    load_rendered,
+    render_markdown,
+    save_rendered,
+)
+from app.services.normalize import normalize_segments
+from app.services.search import make_snippet, search_note_ids
+from app.services.transfer import export_lines, gzip_chunks
+from app.services.singleflight import (
+    SingleFlight,
+    claim_generation,
+    renew_generation,
+    release_generation,
+)
 from app.config import settings
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl
+from typing import Awaitable, Callable, Optional, TypeVar
+from uuid import uuid4
+import asyncio
+import base64
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+startup.mark("imports")
 
 
 class NoteRequest(BaseModel):
@@ -16,10 +90,66 @@ class NoteRequest(BaseModel):
     force_refresh: bool = False
 
 
+class BatchRequest(BaseModel):
+    # YouTube URLs or bare video IDs, e.g. a playlist's videos
+    items: list[str] = Field(min_length=1, max_length=200)
+
+
+def warm_up():
+    """
+    Runs in a thread once the app is serving: opens a DB connection,
+    backfills the search index and loads the libraries behind the first
+    generation (openai, youtube_transcript_api, the Markdown renderer), so
+    neither boot nor the first request pays for them.
+    """
+    with startup.phase("warm_db"):
+        with Session(engine) as session:
+            indexed = index_missing_notes(session)
+    if indexed:
+        logger.info(f"Added {indexed} existing notes to the search index")
+    with startup.phase("warm_llm_client"):
+        get_router()
+    with startup.phase("warm_transcript_client"):
+        get_transcript_api()
+    with startup.phase("warm_renderer"):
+        render_markdown("# Warm-up\n\n```python\npass\n```")
+
+
+async def _warm_up_in_background():
+    # Let the server finish starting (bind the port) first
+    await asyncio.sleep(0)
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logger.warning(f"Startup warm-up failed: {e}")
+        return
+    startup.warm = True
+    startup.log_report("Warmed up")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    # One worker at a time, the others wait and find the schema current
+    with startup.phase("schema"), migration_lock():
+        if create_db_and_tables():
+            logger.info("Created missing database tables")
+        if converted := migrate_timestamps():
+            logger.info(f"Converted timestamp columns to timestamptz: {', '.join(converted)}")
+        with Session(engine) as session:
+            if moved := move_inline_bodies(session):
+                logger.info(f"Moved {moved} inline note bodies to NoteContent")
+            if created := ensure_note_indexes(session):
+                logger.info(f"Created missing note indexes: {', '.join(created)}")
+    with startup.phase("stale_jobs"), Session(engine) as session:
+        if failed := fail_stale_jobs(session):
+            logger.warning(f"Marked {failed} stale jobs as failed")
+    startup.mark("ready")
+    startup.ready = True
+    startup.log_report("Ready")
+    warm_up_task = asyncio.create_task(_warm_up_in_background()) if settings.STARTUP_WARM_UP else None
     yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -31,6 +161,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(http_cache.CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
+# Notes are immutable once saved; listings change whenever one is added
+NOTE_CACHE_CONTROL = f"public, max-age={settings.NOTE_CACHE_MAX_AGE_SECONDS}"
+LISTING_CACHE_CONTROL = "no-cache"
 
 
 @app.get("/")
@@ -38,119 +173,834 @@ def read_root():
     return {"message": "YouTube Technical Note-Taker API is running"}
 
 
-@app.post("/notes", response_model=NoteRead)
-async def create_note(
-    request: NoteRequest, req: Request, session: Session = Depends(get_session)
-):
+@app.get("/health")
+async def health():
+    """Liveness check with the startup timing report. Touches no database or client."""
+    return {"status": "ok", **startup.report()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Prometheus scrape endpoint."""
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+def get_client_ip(req: Request) -> str:
     """
-    Creates a new note from a YouTube URL.
-    Checks if note exists first.
-    Enforces a limit of 2 videos per user (IP address).
-    Admin IPs are exempt from this limit.
+    Get real client IP (Cloudflare sends it in headers).
+    Priority: CF-Connecting-IP > X-Forwarded-For > req.client.host
     """
-    # Whitelisted IPs that bypass the 2-video limit
-    # Load from ADMIN_IPS env var (comma-separated) or use defaults
-    ADMIN_IPS = settings.admin_ips_set
-    
-    # Get real client IP (Cloudflare sends it in headers)
-    # Priority: CF-Connecting-IP > X-Forwarded-For > req.client.host
     cf_ip = req.headers.get("cf-connecting-ip")
     forwarded_for = req.headers.get("x-forwarded-for")
-    
+
     if cf_ip:
-        user_ip = cf_ip
-    elif forwarded_for:
+        return cf_ip
+    if forwarded_for:
         # X-Forwarded-For can have multiple IPs, first one is the client
-        user_ip = forwarded_for.split(",")[0].strip()
-    else:
-        user_ip = req.client.host if req.client else "unknown"
-    
-    is_admin = user_ip in ADMIN_IPS
+        return forwarded_for.split(",")[0].strip()
+    return req.client.host if req.client else "unknown"
+
+
+def _raise_limit_reached():
+    raise HTTPException(
+        status_code=429,
+        detail={
+            "message": f"You've reached the limit of {settings.QUOTA_LIMIT} videos.",
+            "note": "This site is in testing. You can still view your existing notes below.",
+            "limit_reached": True
+        }
+    )
 
-    # 1. Extract Video ID
-    video_id = extract_video_id(str(request.url))
 
-    # 2. Check DB
+def prepare_generation(
+    session: Session, video_id: str, force_refresh: bool, user_ip: str
+) -> Optional[Note]:
+    """
+    Checks the DB and the per-IP quota before a generation.
+
+    Returns the existing note when it can be served as-is. Otherwise charges
+    the caller's quota (admin IPs are exempt, refreshing your own note is
+    free), deletes the note being refreshed and returns None, meaning a new
+    generation should run. generate_note_once settles the charge.
+    Sync: call it through AsyncSession.run_sync.
+    """
     statement = select(Note).where(Note.video_id == video_id)
     existing_note = session.exec(statement).first()
 
+    if existing_note and not force_refresh:
+        return existing_note
+
+    is_own_note = existing_note is not None and existing_note.user_ip == user_ip
+    if not is_own_note and not quota.try_charge(session, user_ip):
+        _raise_limit_reached()
+
     if existing_note:
-        if not request.force_refresh:
-            return existing_note
-        else:
-            # Check limit before deleting/recreating
-            user_notes_count_stmt = select(func.count()).select_from(Note).where(Note.user_ip == user_ip)
-            user_notes_count = session.exec(user_notes_count_stmt).one()
-
-            is_own_note = existing_note.user_ip == user_ip
-
-            # If refreshing someone else's note, we are adding to our count
-            if not is_admin and not is_own_note and user_notes_count >= 2:
-                raise HTTPException(
-                    status_code=429,
-                    detail={
-                        "message": "You've reached the limit of 2 videos.",
-                        "note": "This site is in testing. You can still view your existing notes below.",
-                        "limit_reached": True
-                    }
-                )
-
-            session.delete(existing_note)
-            session.commit()
-
-    else:
-        # Check limit for new note
-        user_notes_count_stmt = select(func.count()).select_from(Note).where(Note.user_ip == user_ip)
-        user_notes_count = session.exec(user_notes_count_stmt).one()
-        if not is_admin and user_notes_count >= 2:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "message": "You've reached the limit of 2 videos.",
-                    "note": "This site is in testing. You can still view your existing notes below.",
-                    "limit_reached": True
-                }
-            )
+        if not is_own_note:
+            # The previous owner no longer has this note
+            quota.refund(session, existing_note.user_ip)
+        delete_note(session, existing_note)
+        session.commit()
 
-    # 3. Fetch Transcript
-    transcript_segments = get_raw_transcript(video_id)
+    return None
 
-    # 4. Generate AI Notes (Map-Reduce only)
-    try:
-        content_detailed, cost_stats = await generate_notes_map_reduce(transcript_segments)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI Generation failed: {str(e)}")
 
-    # 5. Save to DB (including cost tracking)
+async def generate_note(
+    video_id: str,
+    url: str,
+    session: AsyncSession,
+    on_progress: ProgressCallback | None = None,
+    on_chunk: Callable[[int, str], None] | None = None,
+    on_token: Callable[[str], None] | None = None,
+) -> Note:
+    """
+    Fetches the transcript, runs Map-Reduce generation and saves the note,
+    not yet attributed to anyone (see claim_note).
+    """
+    with metrics.GENERATIONS_IN_FLIGHT.track_inprogress(), metrics.GENERATION_SECONDS.time():
+        return await _generate_note(video_id, url, session, on_progress, on_chunk, on_token)
+
+
+async def _generate_note(
+    video_id: str,
+    url: str,
+    session: AsyncSession,
+    on_progress: ProgressCallback | None,
+    on_chunk: Callable[[int, str], None] | None,
+    on_token: Callable[[str], None] | None,
+) -> Note:
+    # Fetch Transcript (stored copy first, YouTube off the event loop otherwise)
+    if on_progress:
+        on_progress("transcript", 0, 1)
+    language = settings.TRANSCRIPT_LANGUAGE
+    with metrics.TRANSCRIPT_FETCH_SECONDS.labels(source="store").time():
+        transcript_segments = await session.run_sync(load_transcript, video_id, language)
+    # End the read transaction, so its pooled connection isn't held through
+    # the YouTube fetch and minutes of LLM calls
+    await session.commit()
+    metrics.CACHE_LOOKUPS.labels(
+        cache="transcript", result="miss" if transcript_segments is None else "hit"
+    ).inc()
+    if transcript_segments is None:
+        with metrics.TRANSCRIPT_FETCH_SECONDS.labels(source="youtube").time():
+            transcript_segments = await asyncio.to_thread(get_raw_transcript, video_id)
+        await session.run_sync(save_transcript, video_id, language, transcript_segments)
+
+    # Drop caption noise before it is chunked and paid for (the store keeps the raw transcript)
+    if settings.TRANSCRIPT_NORMALIZE:
+        transcript_segments, normalized = await asyncio.to_thread(normalize_segments, transcript_segments)
+        metrics.TRANSCRIPT_NORMALIZE_REMOVED.labels(unit="chars").inc(normalized.chars_removed)
+        metrics.TRANSCRIPT_NORMALIZE_REMOVED.labels(unit="tokens").inc(max(normalized.tokens_removed, 0))
+        logger.info(f"Normalized transcript of {video_id}: {normalized.describe()}")
+        if not transcript_segments:
+            raise HTTPException(status_code=400, detail="The transcript has no speech to take notes on.")
+
+    # Project the cost and wait for capacity (or get a 413/503) before any LLM call
+    workload = estimate_workload(transcript_segments)
+    logger.info(f"Workload of {video_id}: {workload.describe()}")
+
+    def on_queued():
+        if on_progress:
+            on_progress("queued", 0, 1)
+
+    async with admission_controller.admit(workload, on_queued=on_queued):
+        # Generate AI Notes (Map-Reduce only)
+        try:
+            content_detailed, cost_stats = await generate_notes_map_reduce(
+                transcript_segments,
+                on_progress=on_progress,
+                on_chunk=on_chunk,
+                on_token=on_token,
+                plan=workload.plan,
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"AI Generation failed: {str(e)}")
+
+        # Render once here so viewers get ready HTML (CPU-bound, off the event loop)
+        rendered = await asyncio.to_thread(render_markdown, content_detailed)
+
+    # Save to DB (including cost tracking)
     new_note = Note(
         video_id=video_id,
-        url=str(request.url),
+        url=url,
         title=f"Notes for {video_id}",
-        content_detailed=content_detailed,
         input_tokens=cost_stats.get("input_tokens"),
         output_tokens=cost_stats.get("output_tokens"),
         generation_cost=cost_stats.get("cost"),
-        user_ip=user_ip,
     )
-    session.add(new_note)
-    session.commit()
-    session.refresh(new_note)
+    with metrics.DB_COMMIT_SECONDS.time():
+        await session.run_sync(_save_note, new_note, content_detailed, rendered)
 
     return new_note
 
 
-@app.get("/notes", response_model=list[NoteRead])
-def list_notes(session: Session = Depends(get_session)):
-    """List all notes, ordered by most recent first."""
-    statement = select(Note).order_by(Note.created_at.desc())
-    return session.exec(statement).all()
+def claim_note(session: Session, note_id: int, user_ip: str) -> bool:
+    """
+    Attributes a new note to the first caller that receives it, who keeps
+    the quota charge for it. Returns whether user_ip owns the note.
+    Sync: call it through AsyncSession.run_sync.
+    """
+    session.exec(
+        update(Note).where(Note.id == note_id).where(Note.user_ip.is_(None)).values(user_ip=user_ip)
+    )
+    session.commit()
+    return session.exec(select(Note.user_ip).where(Note.id == note_id)).first() == user_ip
+
+
+def _save_note(session: Session, note: Note, content: str, rendered: RenderedMarkdown):
+    session.add(note)
+    session.flush()  # assigns the id the body row points to
+    save_note_content(session, note, content)
+    save_rendered(session, note, rendered)
+    session.commit()
+    session.refresh(note)
+
+
+# Concurrent requests for the same video inside this worker share one generation
+generation_flight = SingleFlight()
+
+
+async def generate_note_once(
+    video_id: str,
+    url: str,
+    user_ip: str,
+    session: AsyncSession,
+    on_progress: ProgressCallback | None = None,
+    on_chunk: Callable[[int, str], None] | None = None,
+    on_token: Callable[[str], None] | None = None,
+) -> int:
+    """
+    Single-flight wrapper around generate_note, returns the note id.
+
+    Within a process, later callers await the first caller's in-flight
+    generation. Across workers/nodes a DB lock row makes sure only one
+    generation per video runs; the others wait for its note to appear.
+    Only the caller that actually runs the generation gets the callbacks.
+
+    The shared generation uses a session of its own, not the first caller's,
+    which may go away before it is done. The note is charged to and
+    attributed to the first caller that receives it; everyone else is
+    refunded.
+    """
+
+    async def run() -> int:
+        async with _own_session() as own:
+            return await _run_generation(own)
+
+    async def _run_generation(session: AsyncSession) -> int:
+        owner = uuid4().hex
+        ttl = settings.GENERATION_LOCK_TTL_SECONDS
+
+        deadline = time.monotonic() + settings.GENERATION_WAIT_SECONDS
+        while not await session.run_sync(claim_generation, video_id, owner, ttl):
+            # Another worker is generating this video, wait for its note
+            note = (await session.exec(select(Note).where(Note.video_id == video_id))).first()
+            if note:
+                return note.id
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=503, detail="This video is still being generated, please retry later.")
+            await asyncio.sleep(settings.GENERATION_POLL_SECONDS)
+
+        # Renewed on a timer, not on progress: a queued job can wait for
+        # admission longer than the TTL without reporting any
+        renewal = asyncio.create_task(_keep_generation_claimed(session.bind, video_id, owner, ttl))
+        try:
+            # The holder we waited on may have finished between our check and claim
+            note = (await session.exec(select(Note).where(Note.video_id == video_id))).first()
+            if note:
+                return note.id
+
+            note = await generate_note(
+                video_id,
+                url,
+                session,
+                on_progress=on_progress,
+                on_chunk=on_chunk,
+                on_token=on_token,
+            )
+            return note.id
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            await session.run_sync(release_generation, video_id, owner)
+
+    # The caller holds one quota unit from prepare_generation; give it back
+    # unless the caller ends up owning the note
+    try:
+        note_id = await generation_flight.do(video_id, run)
+        owns_note = await session.run_sync(claim_note, note_id, user_ip)
+    except BaseException:
+        await session.run_sync(quota.refund, user_ip)
+        raise
+    if not owns_note:
+        await session.run_sync(quota.refund, user_ip)
+    return note_id
+
+
+def _own_session() -> AsyncSession:
+    """A session for work that outlives the request (streams, background jobs)."""
+    return AsyncSession(async_engine, expire_on_commit=False)
+
+
+async def _keep_generation_claimed(bind: AsyncEngine, video_id: str, owner: str, ttl: int):
+    """
+    Renews a generation lock every third of its TTL until cancelled, with
+    its own session (the generation's is busy generating).
+    """
+    while True:
+        await asyncio.sleep(ttl / 3)
+        try:
+            async with AsyncSession(bind) as session:
+                await session.run_sync(renew_generation, video_id, owner, ttl)
+        except Exception as e:
+            # The next attempt may get through before the lock expires
+            logger.warning(f"Could not renew the generation lock for {video_id}: {e}")
+
+
+@app.post("/notes", response_model=NoteRead)
+async def create_note(
+    request: NoteRequest, req: Request, session: AsyncSession = Depends(get_session)
+):
+    """
+    Creates a new note from a YouTube URL.
+    Checks if note exists first.
+    Enforces the per-user (IP address) quota, 2 videos by default.
+    Admin IPs are exempt from this limit.
+    """
+    user_ip = get_client_ip(req)
+
+    # 1. Extract Video ID
+    video_id = extract_video_id(str(request.url))
+
+    # 2. Check DB and limits
+    existing_note = await session.run_sync(prepare_generation, video_id, request.force_refresh, user_ip)
+    if existing_note:
+        return await session.run_sync(to_note_read, existing_note)
+
+    # 3. Fetch transcript, generate and save (once per video), unless the client leaves first
+    try:
+        note_id = await _cancel_on_disconnect(req, generate_note_once(video_id, str(request.url), user_ip, session))
+    except ClientDisconnected:
+        return Response(status_code=499)  # nobody is left to read it
+    return await session.run_sync(to_note_read, await session.get(Note, note_id))
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def _wait_for_disconnect(req: Request):
+    # The body has been read, so the next message is the disconnect
+    while (await req.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _cancel_on_disconnect(req: Request, work: Awaitable[T]) -> T:
+    """
+    Runs work, cancelling it if the client disconnects first. The shared
+    generation itself only stops if no other request or job waits for it
+    (see SingleFlight).
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(req))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            # Let it settle (quota refund, lock release) while the session is still open
+            await asyncio.gather(task, return_exceptions=True)
+            if watcher.done() and not watcher.cancelled():
+                raise ClientDisconnected()
+    return task.result()
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/notes/stream")
+async def stream_note(
+    request: NoteRequest, req: Request, session: AsyncSession = Depends(get_session)
+):
+    """
+    Server-Sent Events variant of POST /notes.
+
+    Limit errors are returned as normal JSON responses before the stream
+    starts. The stream then emits:
+      progress  {"stage", "done", "total"} as the pipeline advances
+      chunk     {"index", "markdown"} as each map chunk finishes
+      token     {"text"} for the final reduce output as it is generated
+      done      the saved note (same shape as NoteRead)
+      error     {"detail"} if generation failed, plus "retry_after"
+                (seconds) when the service was too busy to admit it
+    """
+    user_ip = get_client_ip(req)
+    video_id = extract_video_id(str(request.url))
+    url = str(request.url)
+
+    existing_note = await session.run_sync(prepare_generation, video_id, request.force_refresh, user_ip)
+    existing = None
+    if existing_note:
+        existing = (await session.run_sync(to_note_read, existing_note)).model_dump(mode="json")
+
+    async def events():
+        if existing:
+            yield _sse("done", existing)
+            return
+
+        queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+        def on_progress(stage: str, done: int, total: int):
+            queue.put_nowait(_sse("progress", {"stage": stage, "done": done, "total": total}))
+
+        def on_chunk(index: int, markdown: str):
+            queue.put_nowait(_sse("chunk", {"index": index, "markdown": markdown}))
+
+        def on_token(text: str):
+            queue.put_nowait(_sse("token", {"text": text}))
+
+        async def run():
+            # Own session: the request session may be closed while we stream
+            try:
+                async with _own_session() as gen_session:
+                    note_id = await generate_note_once(
+                        video_id,
+                        url,
+                        user_ip,
+                        gen_session,
+                        on_progress=on_progress,
+                        on_chunk=on_chunk,
+                        on_token=on_token,
+                    )
+                    note = await gen_session.get(Note, note_id)
+                    note_read = await gen_session.run_sync(to_note_read, note)
+                    queue.put_nowait(_sse("done", note_read.model_dump(mode="json")))
+            except HTTPException as e:
+                error = {"detail": e.detail}
+                if e.headers and "Retry-After" in e.headers:
+                    error["retry_after"] = int(e.headers["Retry-After"])
+                queue.put_nowait(_sse("error", error))
+            except Exception as e:
+                logger.error(f"Streaming generation failed: {e}")
+                queue.put_nowait(_sse("error", {"detail": str(e)}))
+            finally:
+                queue.put_nowait(None)
+
+        # A client going away mid-stream cancels the generation, unless
+        # another request or a job is waiting for the same video
+        task = asyncio.create_task(run())
+        try:
+            while (message := await queue.get()) is not None:
+                yield message
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def encode_cursor(created_at: datetime, note_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{note_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, note_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(note_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/notes", response_model=NotePage)
+async def list_notes(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    List notes, most recent first, one page at a time.
+    Keyset-paginated on (created_at, id) and projected to summary columns,
+    so each page costs the same however many notes exist.
+    Pass next_cursor back as cursor to get the following page.
+    Revalidated on every use; an unchanged page is a 304.
+    """
+    statement = select(
+        Note.id, Note.video_id, Note.url, Note.title, Note.generation_cost, Note.created_at
+    ).order_by(Note.created_at.desc(), Note.id.desc())
+    if cursor:
+        statement = statement.where(tuple_(Note.created_at, Note.id) < decode_cursor(cursor))
+
+    # Fetch one extra row to know whether there is a next page
+    rows = (await session.exec(statement.limit(limit + 1))).all()
+    # Note rows never change, so the ids on the page identify its content
+    etag = http_cache.make_etag("notes", cursor, limit, *(row.id for row in rows))
+    last_modified = max((row.created_at for row in rows), default=None)
+    if not_modified := http_cache.conditional(request, response, etag, last_modified, LISTING_CACHE_CONTROL):
+        return not_modified
+
+    items = [NoteSummary.model_validate(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return NotePage(items=items, next_cursor=next_cursor)
+
+
+@app.get("/notes/search", response_model=NoteSearchPage)
+async def search_notes(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Full-text search over note titles and bodies, best match first.
+    Every word must match (the last one as a prefix); each result carries
+    an HTML-escaped snippet with the matches wrapped in <mark>.
+    """
+    ranked = await session.run_sync(search_note_ids, q, limit)
+    etag = http_cache.make_etag("search", q, *(f"{note_id}:{score}" for note_id, score in ranked))
+    if not_modified := http_cache.conditional(request, response, etag, None, LISTING_CACHE_CONTROL):
+        return not_modified
+    return NoteSearchPage(items=await session.run_sync(_search_results, ranked, q))
+
+
+def _search_results(session: Session, ranked: list[tuple[int, float]], q: str) -> list[NoteSearchResult]:
+    notes = {
+        note.id: note
+        for note in session.exec(select(Note).where(Note.id.in_([note_id for note_id, _ in ranked]))).all()
+    }
+    items = []
+    for note_id, score in ranked:
+        note = notes.get(note_id)
+        if note is None:
+            continue
+        items.append(NoteSearchResult.model_validate(
+            note,
+            update={"snippet": make_snippet(load_note_content(session, note) or "", q), "score": score},
+        ))
+    return items
+
+
+@app.get("/notes/export")
+def export_notes(req: Request, gzip: bool = False):
+    """
+    Every note with its Markdown body as NDJSON (one NoteExport per line),
+    streamed from a server-side cursor in batches; ?gzip=true compresses
+    the stream. Admin IPs only. Load it into another database with
+    `python -m app.services.transfer import`.
+    """
+    if get_client_ip(req) not in settings.admin_ips_set:
+        raise HTTPException(status_code=403, detail="Export is limited to admin clients")
+
+    def lines():
+        # Own session: it has to stay open for the whole stream. A sync one
+        # on purpose: the server-side cursor is iterated in the threadpool
+        with Session(engine) as session:
+            yield from export_lines(session)
+
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(lines()),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="notes.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'},
+    )
 
 
 @app.get("/notes/{note_id}", response_model=NoteRead)
-def read_note(note_id: int, session: Session = Depends(get_session)):
-    note = session.get(Note, note_id)
+async def read_note(
+    note_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_read_session)
+):
+    note = await session.get(Note, note_id)
+    if not note and read_engine is not async_engine:
+        # A note saved moments ago may not have reached the replica yet
+        async with _own_session() as primary:
+            if note := await primary.get(Note, note_id):
+                return await _note_response(primary, note, request, response)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return await _note_response(session, note, request, response)
+
+
+async def _note_response(session: AsyncSession, note: Note, request: Request, response: Response):
+    etag = http_cache.make_etag("note", note.id, note.created_at.isoformat())
+    if not_modified := http_cache.conditional(request, response, etag, note.created_at, NOTE_CACHE_CONTROL):
+        return not_modified
+    return await session.run_sync(to_note_read, note)
+
+
+@app.get("/notes/{note_id}/rendered", response_model=RenderedNoteRead)
+async def read_rendered_note(
+    note_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_session)
+):
+    """
+    The note as sanitized HTML (headings with anchors, highlighted code)
+    plus its table of contents, rendered when the note was saved.
+    """
+    note = await session.get(Note, note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    return note
+    etag = http_cache.make_etag("rendered", RENDER_VERSION, note.id, note.created_at.isoformat())
+    if not_modified := http_cache.conditional(request, response, etag, note.created_at, NOTE_CACHE_CONTROL):
+        return not_modified
+    rendered = await session.run_sync(load_rendered, note)
+    return RenderedNoteRead.model_validate(note, update={"html": rendered.html, "toc": rendered.toc})
+
+
+async def _update_job(job_id: str, **fields):
+    """
+    Writes job status fields in a short-lived session of its own. A failed
+    job stays failed: fail_stale_jobs may already have refunded it.
+    """
+    async with _own_session() as session:
+        job = await session.get(Job, job_id)
+        if not job or job.status == "failed":
+            return
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.updated_at = datetime.now(timezone.utc)
+        session.add(job)
+        await session.commit()
+
+
+async def _write_job_updates(job_id: str, updates: asyncio.Queue):
+    """
+    Applies queued progress updates in order until a None arrives. Without
+    any (e.g. while queued for admission) it still touches the job now and
+    then, so a running job is never taken for a stale one.
+    """
+    while True:
+        try:
+            fields = await asyncio.wait_for(updates.get(), settings.JOB_STALE_SECONDS / 5)
+        except TimeoutError:
+            fields = {}
+        if fields is None:
+            return
+        await _update_job(job_id, **fields)
+
+
+STALE_JOB_ERROR = "The worker running this job stopped before it finished, please retry."
+
+
+def fail_stale_jobs(session: Session, *where) -> int:
+    """
+    Fails unfinished jobs (matching where, all by default) not touched for
+    JOB_STALE_SECONDS. Jobs run in their worker's process, so these were
+    lost with a worker that stopped; each gives its client's generation
+    back. Returns how many were failed.
+    """
+    now = datetime.now(timezone.utc)
+    clients = session.exec(
+        update(Job)
+        .where(Job.status.not_in(("done", "failed")))
+        .where(Job.updated_at < now - timedelta(seconds=settings.JOB_STALE_SECONDS))
+        .where(*where)
+        .values(status="failed", error=STALE_JOB_ERROR, updated_at=now)
+        .returning(Job.user_ip)
+    ).scalars().all()
+    session.commit()
+    for client in clients:
+        quota.refund(session, client)
+    return len(clients)
+
+
+async def run_note_job(
+    job_id: str, video_id: str, url: str, user_ip: str, slots: asyncio.Semaphore | None = None
+):
+    """
+    Background worker for POST /jobs.
+    Runs after the 202 response has been sent, so it opens its own session
+    instead of using the (already closed) request session. With slots, the
+    job waits for one first; it keeps its heartbeat while it waits, and is
+    skipped if it was failed in the meantime.
+    """
+    # Progress callbacks are sync; one writer task keeps their updates in order
+    updates: asyncio.Queue = asyncio.Queue()
+    writer = asyncio.create_task(_write_job_updates(job_id, updates))
+
+    def on_progress(stage: str, done: int, total: int):
+        updates.put_nowait({"status": stage, "progress_done": done, "progress_total": total})
+
+    # Background work waits for admission instead of being turned away
+    token = background_admission.set(True)
+    try:
+        async with slots or nullcontext(), _own_session() as session:
+            if (await session.get(Job, job_id)).status == "failed":
+                return
+            note_id = await generate_note_once(
+                video_id, url, user_ip, session, on_progress=on_progress
+            )
+        final = {"status": "done", "note_id": note_id}
+    except HTTPException as e:
+        logger.error(f"Job {job_id} failed: {e.detail}")
+        final = {"status": "failed", "error": str(e.detail)}
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        final = {"status": "failed", "error": str(e)}
+    finally:
+        background_admission.reset(token)
+        updates.put_nowait(None)
+        await writer
+
+    await _update_job(job_id, **final)
+
+
+@app.post("/jobs", response_model=JobRead, status_code=202)
+async def create_job(
+    request: NoteRequest,
+    req: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Job mode for POST /notes: returns 202 with a job id right away and runs
+    the generation in the background. Poll GET /jobs/{id} for status.
+    Limits are checked up front, so a 429 is still returned synchronously.
+    """
+    user_ip = get_client_ip(req)
+    video_id = extract_video_id(str(request.url))
+
+    existing_note = await session.run_sync(prepare_generation, video_id, request.force_refresh, user_ip)
+
+    job = Job(video_id=video_id, url=str(request.url), user_ip=user_ip)
+    if existing_note:
+        job.status = "done"
+        job.note_id = existing_note.id
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+
+    if not existing_note:
+        background_tasks.add_task(run_note_job, job.id, video_id, str(request.url), user_ip)
+
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobRead)
+async def read_job(job_id: str, session: AsyncSession = Depends(get_session)):
+    await session.run_sync(fail_stale_jobs, Job.id == job_id)
+    job = await session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def run_batch(jobs: list[tuple[str, str, str]], user_ip: str):
+    """
+    Background worker for POST /notes/batch: runs the (job_id, video_id, url)
+    items BATCH_CONCURRENCY at a time. Its LLM calls run at batch priority,
+    so they only use LLM_BATCH_MAX_IN_FLIGHT of the scheduler's slots and
+    interactive requests are not starved by a long playlist.
+    """
+    token = llm_priority.set("batch")
+    slots = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    try:
+        await asyncio.gather(*(run_note_job(*job, user_ip, slots) for job in jobs))
+    finally:
+        llm_priority.reset(token)
+
+
+def _batch_read(session: Session, batch: Batch) -> BatchRead:
+    jobs = session.exec(
+        select(Job).where(Job.batch_id == batch.id).order_by(Job.batch_index)
+    ).all()
+    done = sum(1 for job in jobs if job.status == "done")
+    failed = sum(1 for job in jobs if job.status == "failed")
+    return BatchRead(
+        id=batch.id,
+        created_at=batch.created_at,
+        status="done" if done + failed == len(jobs) else "running",
+        total=len(jobs),
+        done=done,
+        failed=failed,
+        items=[JobRead.model_validate(job) for job in jobs],
+    )
+
+
+@app.post("/notes/batch", response_model=BatchRead, status_code=202)
+async def create_batch(
+    request: BatchRequest,
+    req: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Queues notes for a list of videos (e.g. a course playlist) and returns
+    one batch handle. Items are deduplicated by video ID; videos that already
+    have notes are done immediately, the rest each take one generation from
+    the caller's quota and run in the background as jobs.
+    Poll GET /notes/batch/{id} for per-item status.
+    """
+    user_ip = get_client_ip(req)
+
+    # Dedupe on video ID, keeping request order
+    videos: dict[str, str] = {}
+    invalid = []
+    for item in request.items:
+        url = video_url(item)
+        try:
+            videos.setdefault(extract_video_id(url), url)
+        except HTTPException:
+            invalid.append(item)
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Invalid YouTube URLs or video IDs", "invalid": invalid},
+        )
+
+    existing = dict(
+        (await session.exec(select(Note.video_id, Note.id).where(Note.video_id.in_(videos)))).all()
+    )
+
+    batch = Batch(user_ip=user_ip)
+    jobs = []
+    for index, (video_id, url) in enumerate(videos.items()):
+        job = Job(video_id=video_id, url=url, user_ip=user_ip, batch_id=batch.id, batch_index=index)
+        if video_id in existing:
+            job.status = "done"
+            job.note_id = existing[video_id]
+        elif not await session.run_sync(quota.try_charge, user_ip):
+            job.status = "failed"
+            job.error = f"You've reached the limit of {settings.QUOTA_LIMIT} videos."
+        jobs.append(job)
+
+    session.add(batch)
+    session.add_all(jobs)
+    await session.commit()
+
+    queued = [(job.id, job.video_id, job.url) for job in jobs if job.status == "queued"]
+    if queued:
+        background_tasks.add_task(run_batch, queued, user_ip)
+
+    response.headers["Location"] = f"/notes/batch/{batch.id}"
+    return await session.run_sync(_batch_read, batch)
 
 
+@app.get("/notes/batch/{batch_id}", response_model=BatchRead)
+async def read_batch(batch_id: str, session: AsyncSession = Depends(get_session)):
+    batch = await session.get(Batch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    await session.run_sync(fail_stale_jobs, Job.batch_id == batch_id)
+    return await session.run_sync(_batch_read, batch)
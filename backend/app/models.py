@@ -1,13 +1,38 @@
 from typing import Optional
 from datetime import datetime, timezone
+from uuid import uuid4
+from sqlalchemy import DateTime, Index, TypeDecorator
 from sqlmodel import Field, SQLModel
 
 
+class UTCDateTime(TypeDecorator):
+    """
+    A timestamp with time zone (asyncpg rejects aware datetimes for a plain
+    one), always read back as aware UTC. SQLite keeps no offset, so values
+    are stored converted to UTC; naive ones are taken to be UTC already.
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[datetime], dialect) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    def process_result_value(self, value: Optional[datetime], dialect) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+
 class NoteBase(SQLModel):
-    video_id: str = Field(index=True)
+    video_id: str = Field(index=True, unique=True)
     url: str
     title: Optional[str] = None
-    content_detailed: Optional[str] = None
     # Cost tracking
     input_tokens: Optional[int] = None
     output_tokens: Optional[int] = None
@@ -15,15 +40,158 @@ class NoteBase(SQLModel):
 
 
 class Note(NoteBase, table=True):
+    # Supports keyset pagination of GET /notes on (created_at, id)
+    __table_args__ = (Index("ix_note_created_at_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    user_ip: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+    # Indexed for the quota's first count of a client's notes
+    user_ip: Optional[str] = Field(default=None, index=True)
+    # The body lives compressed in NoteContent so this row stays small. Rows
+    # from before it had a content_detailed column, see move_inline_bodies.
+
+
+class NoteContent(SQLModel, table=True):
+    """Note body, kept out of the hot Note row (see app.services.note_content)."""
+    note_id: int = Field(foreign_key="note.id", primary_key=True)
+    body: bytes  # format version byte + compressed Markdown
 
 
 class NoteCreate(NoteBase):
-    pass
+    content_detailed: Optional[str] = None
 
 
 class NoteRead(NoteBase):
     id: int
     created_at: datetime
+    content_detailed: Optional[str] = None
+
+
+class NoteExport(NoteBase):
+    """One line of the NDJSON export (see app.services.transfer); ids are not kept."""
+    created_at: datetime
+    user_ip: Optional[str] = None
+    content: Optional[str] = None  # Markdown body
+
+
+class NoteSummary(SQLModel):
+    """Listing projection: no content or token fields."""
+    id: int
+    video_id: str
+    url: str
+    title: Optional[str] = None
+    generation_cost: Optional[float] = None
+    created_at: datetime
+
+
+class NotePage(SQLModel):
+    items: list[NoteSummary]
+    next_cursor: Optional[str] = None
+
+
+class NoteRendered(SQLModel, table=True):
+    """Note body rendered at save time, see app.services.render."""
+    note_id: int = Field(foreign_key="note.id", primary_key=True)
+    html: bytes  # encoded like NoteContent.body
+    toc: str  # JSON list of TocEntry
+    version: int  # render.RENDER_VERSION it was made with
+
+
+class TocEntry(SQLModel):
+    level: int
+    text: str
+    anchor: str  # id of the heading in the rendered HTML
+
+
+class RenderedNoteRead(NoteSummary):
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    html: str  # sanitized, code blocks highlighted with inline styles
+    toc: list[TocEntry]
+
+
+class NoteSearchResult(NoteSummary):
+    # HTML-escaped excerpt with matches wrapped in <mark>
+    snippet: str
+    score: float
+
+
+class NoteSearchPage(SQLModel):
+    items: list[NoteSearchResult]
+
+
+class JobBase(SQLModel):
+    video_id: str = Field(index=True)
+    url: str
+    # queued -> transcript -> map -> reduce -> done | failed
+    status: str = "queued"
+    progress_done: int = 0
+    progress_total: int = 0
+    note_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class Job(JobBase, table=True):
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+    user_ip: Optional[str] = Field(default=None)
+    # Set for the items of a POST /notes/batch request, in request order
+    batch_id: Optional[str] = Field(default=None, foreign_key="batch.id", index=True)
+    batch_index: Optional[int] = None
+
+
+class JobRead(JobBase):
+    id: str
+    created_at: datetime
+    updated_at: datetime
+
+
+class Batch(SQLModel, table=True):
+    """A POST /notes/batch request; its items are the Jobs with this batch_id."""
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+    user_ip: Optional[str] = Field(default=None)
+
+
+class BatchRead(SQLModel):
+    id: str
+    created_at: datetime
+    # running until every item is done or failed
+    status: str
+    total: int
+    done: int
+    failed: int
+    items: list[JobRead]
+
+
+class GenerationLock(SQLModel, table=True):
+    """Cross-worker claim: at most one generation per video runs at a time."""
+    video_id: str = Field(primary_key=True)
+    owner: str
+    expires_at: datetime = Field(sa_type=UTCDateTime)
+
+
+class LLMCacheEntry(SQLModel, table=True):
+    """Content-addressed LLM output, see app.services.llm_cache."""
+    key: str = Field(primary_key=True)  # sha256 hex
+    content: str
+    size: int  # bytes, for size-based eviction
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime, index=True)
+    last_used_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime, index=True)
+
+
+class Transcript(SQLModel, table=True):
+    """Fetched YouTube transcript, segments stored as zlib-compressed JSON."""
+    video_id: str = Field(primary_key=True)
+    language: str = Field(primary_key=True)
+    segments: bytes
+    segment_count: int
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+class ClientQuota(SQLModel, table=True):
+    """Generations charged to a client (IP) in its current quota window, see app.services.quota."""
+    client: str = Field(primary_key=True)
+    used: int = 0
+    window_start: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
@@ -0,0 +1,197 @@
+"""
+Admission control for note generations.
+
+The per-IP quota limits how many notes a client gets, not how much work
+runs at once: ten clients (or admins) starting ten 5-hour videos together
+would exhaust the container and the Azure quota for everyone. So right
+after the transcript is fetched, a generation's cost is projected from its
+chunk plan and it has to be admitted before its first LLM call:
+
+- A job projected above ADMISSION_MAX_JOB_TOKENS is refused (413).
+- Transcripts that fit a single LLM call are always admitted, so short
+  interactive requests stay fast under load.
+- Anything else is admitted while the projected tokens in flight stay
+  under ADMISSION_MAX_IN_FLIGHT_TOKENS and waits in a FIFO queue beyond
+  that. Interactive requests wait up to ADMISSION_QUEUE_TIMEOUT_SECONDS,
+  background jobs as long as it takes. A full queue or a timeout is a 503
+  with a Retry-After based on how fast admitted work has been finishing.
+
+Work is tracked per worker process, like the LLM scheduler.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable
+from fastapi import HTTPException
+from app.config import settings
+from app.services import metrics
+from app.services.chunking import ChunkPlan, plan_chunks
+
+# Set to True by background workers (jobs, batches): they queue without a timeout
+background_admission: ContextVar[bool] = ContextVar("background_admission", default=False)
+
+DEFAULT_RETRY_AFTER_SECONDS = 30  # until a finished job gives a throughput to go by
+MAX_RETRY_AFTER_SECONDS = 600
+THROUGHPUT_SMOOTHING = 0.3  # weight of the latest finished job in the moving average
+
+
+@dataclass
+class Workload:
+    """Projected cost of one generation, from its transcript and chunk plan."""
+    segments: int
+    chars: int
+    plan: ChunkPlan
+
+    @property
+    def tokens(self) -> int:
+        return self.plan.expected_tokens
+
+    @property
+    def map_calls(self) -> int:
+        return 0 if self.plan.single_call else self.plan.map_calls
+
+    def describe(self) -> str:
+        return (
+            f"{self.segments} segments, {self.chars} chars, {self.map_calls} map calls, "
+            f"~{self.tokens} projected tokens"
+        )
+
+
+def estimate_workload(segments: list[dict]) -> Workload:
+    plan = plan_chunks(
+        segments,
+        chunk_tokens=settings.LLM_MAP_CHUNK_TOKENS,
+        single_call_tokens=settings.LLM_SINGLE_CALL_TOKENS,
+        reduce_tokens=settings.LLM_REDUCE_INPUT_TOKENS,
+    )
+    chars = sum(len(segment["text"]) + 1 for segment in segments)
+    return Workload(segments=len(segments), chars=chars, plan=plan)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight_tokens: int, max_job_tokens: int, max_queued: int, queue_timeout: float):
+        self.max_in_flight_tokens = max_in_flight_tokens  # 0 = no global ceiling
+        self.max_job_tokens = max_job_tokens  # 0 = no per-job ceiling
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight_tokens = 0
+        self.throughput: float | None = None  # projected tokens per second of finished jobs
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _fits(self, tokens: int) -> bool:
+        # An idle worker takes any job under the per-job ceiling
+        return (
+            not self.max_in_flight_tokens
+            or self.in_flight_tokens == 0
+            or self.in_flight_tokens + tokens <= self.max_in_flight_tokens
+        )
+
+    def _grant(self, tokens: int):
+        self.in_flight_tokens += tokens
+        metrics.ADMISSION_IN_FLIGHT_TOKENS.inc(tokens)
+
+    def _release(self, tokens: int):
+        self.in_flight_tokens -= tokens
+        metrics.ADMISSION_IN_FLIGHT_TOKENS.dec(tokens)
+        self._wake()
+
+    def _wake(self):
+        """Admits queued jobs from the front while they fit."""
+        while self._waiters and self._fits(self._waiters[0][0]):
+            tokens, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._grant(tokens)
+            future.set_result(None)
+
+    def retry_after(self, tokens: int) -> int:
+        """Seconds until enough admitted and queued work should have finished for this job."""
+        if not self.throughput:
+            return DEFAULT_RETRY_AFTER_SECONDS
+        ahead = self.in_flight_tokens + sum(queued for queued, _ in self._waiters)
+        excess = ahead + tokens - self.max_in_flight_tokens
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(excess / self.throughput)))
+
+    def _overloaded(self, tokens: int) -> HTTPException:
+        metrics.ADMISSION_DECISIONS.labels(result="rejected").inc()
+        return HTTPException(
+            status_code=503,
+            detail="The service is busy with other long videos, please retry shortly.",
+            headers={"Retry-After": str(self.retry_after(tokens))},
+        )
+
+    async def _wait(self, tokens: int, timeout: float | None, on_queued: Callable[[], None] | None):
+        if self.max_queued and len(self._waiters) >= self.max_queued:
+            raise self._overloaded(tokens)
+        future = asyncio.get_running_loop().create_future()
+        entry = (tokens, future)
+        self._waiters.append(entry)
+        metrics.ADMISSION_QUEUED.inc()
+        if on_queued:
+            on_queued()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException as e:
+            if future.done():
+                # Admitted just as we gave up: hand the capacity back
+                self._release(tokens)
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                self._wake()  # a smaller job behind us may fit now
+            if isinstance(e, TimeoutError):
+                raise self._overloaded(tokens) from None
+            raise
+        finally:
+            metrics.ADMISSION_QUEUED.dec()
+
+    @asynccontextmanager
+    async def admit(self, workload: Workload, on_queued: Callable[[], None] | None = None):
+        """Holds the workload's projected tokens as in flight for the duration of the block."""
+        tokens = workload.tokens
+        if self.max_job_tokens and tokens > self.max_job_tokens:
+            metrics.ADMISSION_DECISIONS.labels(result="too_large").inc()
+            raise HTTPException(
+                status_code=413,
+                detail=f"This video is too long to take notes on (~{tokens} tokens, the limit is {self.max_job_tokens}).",
+            )
+
+        if workload.plan.single_call or (not self._waiters and self._fits(tokens)):
+            self._grant(tokens)
+            metrics.ADMISSION_DECISIONS.labels(result="admitted").inc()
+        else:
+            timeout = None if background_admission.get() else self.queue_timeout
+            await self._wait(tokens, timeout, on_queued)
+            metrics.ADMISSION_DECISIONS.labels(result="queued").inc()
+
+        started = time.monotonic()
+        try:
+            yield
+            self._record_throughput(tokens, time.monotonic() - started)
+        finally:
+            self._release(tokens)
+
+    def _record_throughput(self, tokens: int, elapsed: float):
+        if elapsed <= 0:
+            return
+        rate = tokens / elapsed
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput = THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * self.throughput
+
+
+admission_controller = AdmissionController(
+    max_in_flight_tokens=settings.ADMISSION_MAX_IN_FLIGHT_TOKENS,
+    max_job_tokens=settings.ADMISSION_MAX_JOB_TOKENS,
+    max_queued=settings.ADMISSION_MAX_QUEUED,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
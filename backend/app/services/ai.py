@@ -1,27 +1,22 @@
-from openai import AsyncAzureOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.config import settings
+from app.db import engine
+from app.services.chunking import ChunkPlan, estimate_tokens, plan_chunks
+from app.services.llm_cache import LLMCache, cache_key
+from app.services.llm_router import STAGES, Deployment, DeploymentConfig, LLMRouter
+from app.services import metrics
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, TypeVar
 import logging
 import asyncio
+import random
+import threading
+import time
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Azure OpenAI Client
-client = AsyncAzureOpenAI(
-    azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-    api_key=settings.AZURE_OPENAI_API_KEY,
-    api_version=settings.AZURE_OPENAI_API_VERSION,
-)
-
-# Shared text splitter to avoid re-instantiation on every request
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=4000,
-    chunk_overlap=400,
-    length_function=len,
-)
-
 MAP_PROMPT = """You are a Senior Technical Writer. Convert the following transcript segment into clean, structured Markdown notes.
 
 Transcript Segment:
@@ -54,25 +49,65 @@ Rules:
 7. Do not summarize the code; keep the full snippets if they are technical examples.
 """
 
+PARTIAL_REDUCE_PROMPT = """You are a Senior Technical Editor. You have been given consecutive Markdown notes generated from adjacent transcript chunks of a video.
+Merge them into one continuous section of notes; it will later be combined with the other sections.
+
+Input Notes:
+{text}
+
+Rules:
+1. Remove redundant explanations across chunks, keep the original order.
+2. Do not add a Title or a Table of Contents.
+3. Maintain all code blocks and formulas found in the notes.
+4. Output pure Markdown.
+5. Do not summarize the code; keep the full snippets if they are technical examples.
+"""
+
+# Appended to PARTIAL_REDUCE_PROMPT for notes that have to shrink before
+# they fit a reduce call together with their neighbours
+CONDENSE_RULE = "6. Keep the result under {words} words: shorten explanations before code.\n"
+
+SINGLE_PASS_PROMPT = """You are a Senior Technical Writer. Convert the following video transcript into a single, cohesive technical document in clean, structured Markdown.
+
+Transcript:
+{text}
+
+Rules:
+1. Output pure Markdown only.
+2. Add a Title at the very top, then a concise Table of Contents.
+3. Use '##'/'###' headers based on topic shifts and keep a logical flow from introduction to conclusion.
+4. Preserve any described code into proper Markdown code blocks with language tags; keep full snippets.
+5. Preserve mathematical expressions as formulas.
+6. Use bullet points for step-by-step processes and bold important terms and concepts.
+7. Remove conversational filler and focus strictly on technical content.
+"""
+
 # GPT-4.1 pricing (Azure OpenAI - Standard/Global, per 1K tokens)
 # Source: https://azure.microsoft.com/en-us/pricing/details/cognitive-services/openai-service/
 COST_PER_1K_INPUT = 0.002    # $2.00 per 1M input tokens
 COST_PER_1K_OUTPUT = 0.008   # $8.00 per 1M output tokens
 
+def call_cost(input_tokens: int, output_tokens: int) -> float:
+    return (input_tokens / 1000) * COST_PER_1K_INPUT + (output_tokens / 1000) * COST_PER_1K_OUTPUT
+
+
 # Track total tokens across a generation run
 class TokenTracker:
     def __init__(self):
         self.total_input = 0
         self.total_output = 0
+        self.calls = 0
+        self.cache_hits = 0
+        # Estimated prompt tokens of calls sent, answered or not
+        self.submitted_input = 0
     
     def add(self, input_tokens: int, output_tokens: int):
+        self.calls += 1
         self.total_input += input_tokens
         self.total_output += output_tokens
     
     def get_cost(self) -> float:
-        input_cost = (self.total_input / 1000) * COST_PER_1K_INPUT
-        output_cost = (self.total_output / 1000) * COST_PER_1K_OUTPUT
-        return input_cost + output_cost
+        return call_cost(self.total_input, self.total_output)
     
     def get_stats(self) -> dict:
         return {
@@ -83,93 +118,740 @@ class TokenTracker:
     
     def log_summary(self):
         cost = self.get_cost()
-        logger.info(f"Token Usage: {self.total_input} input, {self.total_output} output")
+        logger.info(f"Token Usage: {self.total_input} input, {self.total_output} output in {self.calls} calls")
         logger.info(f"Estimated Cost: ${cost:.4f}")
+        if self.cache_hits:
+            logger.info(f"LLM cache hits: {self.cache_hits}")
 
-async def _call_llm(system_prompt: str, user_content: str, tracker: TokenTracker | None = None) -> str:
-    """Helper function to call the Azure OpenAI API."""
-    response = await client.chat.completions.create(
-        model=settings.AZURE_DEPLOYMENT_NAME,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0.2,
-    )
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests larger than
+        the bucket only wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount: float):
+        # May go negative when reconciling with actual usage; that debt
+        # simply delays later admissions.
+        self._refill()
+        self.available = min(self.capacity, self.available - amount)
+
+
+T = TypeVar("T")
+
+# "batch" for background batch ingestion, whose LLM calls get a smaller
+# share of the in-flight slots than interactive ("interactive") requests
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+# The openai SDK takes most of a second to import, so it is only imported
+# once a client is built (first LLM call or the startup warm-up), not at boot.
+
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """Errors worth retrying: quota (429), transient server errors, timeouts/connection drops."""
+    import openai
+    return (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    import openai
+    return isinstance(error, openai.RateLimitError)
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls.
+
+    - Token buckets for requests and tokens per minute (0 disables a bucket),
+      admitted against a pre-call token estimate and reconciled with usage.
+    - A global in-flight cap shared by every concurrent generation.
+    - Jittered exponential backoff on retryable errors, honouring Retry-After.
+      A 429 pauses admission for everyone, since the quota is shared.
+    - Calls made under llm_priority "batch" also need one of
+      max_batch_in_flight slots, so batch ingestion never takes the slots
+      interactive generations need (0 = no separate cap).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_in_flight: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        max_batch_in_flight: int = 0,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_in_flight = max_in_flight
+        self.max_batch_in_flight = max_batch_in_flight or max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self._paused_until = 0.0
+        # asyncio primitives are bound to the loop they are first used on
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._batch_slots: asyncio.Semaphore | None = None
+        self._admission: asyncio.Lock | None = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._batch_slots = asyncio.Semaphore(self.max_batch_in_flight)
+            self._admission = asyncio.Lock()
+
+    def wait_estimate(self, estimated_tokens: int) -> float:
+        """Seconds until a call of this size could be admitted, ignoring queued callers."""
+        wait = max(0.0, self._paused_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(estimated_tokens))
+        return wait
+
+    async def _admit(self, estimated_tokens: int):
+        # One waiter at a time, so admission is FIFO and buckets are not raced
+        async with self._admission:
+            while (wait := self.wait_estimate(estimated_tokens)) > 0:
+                await asyncio.sleep(wait)
+
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real usage is known."""
+        if self.tokens:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Full jitter on top so waiters do not retry in lockstep
+        return delay + random.uniform(0, self.backoff_base)
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        estimated_tokens: int,
+        max_retries: int | None = None,
+    ) -> T:
+        self._bind_loop()
+        batch = llm_priority.get() == "batch"
+        if max_retries is None:
+            max_retries = self.max_retries
+
+        for attempt in range(max_retries + 1):
+            waiting_since = time.monotonic()
+            with metrics.LLM_CALLS_WAITING.track_inprogress():
+                if batch:
+                    await self._batch_slots.acquire()
+                try:
+                    await self._slots.acquire()
+                    try:
+                        await self._admit(estimated_tokens)
+                    except BaseException:
+                        self._slots.release()
+                        raise
+                except BaseException:
+                    if batch:
+                        self._batch_slots.release()
+                    raise
+            metrics.LLM_QUEUE_SECONDS.observe(time.monotonic() - waiting_since)
+
+            self.in_flight += 1
+            metrics.LLM_CALLS_IN_FLIGHT.inc()
+            try:
+                return await fn()
+            except retryable_errors() as e:
+                if attempt == max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                if _is_rate_limit(e):
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                metrics.LLM_RETRIES.labels(error=type(e).__name__).inc()
+                logger.warning(
+                    f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.1f}s"
+                )
+            finally:
+                self.in_flight -= 1
+                metrics.LLM_CALLS_IN_FLIGHT.dec()
+                self._slots.release()
+                if batch:
+                    self._batch_slots.release()
+            # Sleep outside the slot so other admitted calls can use it
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("unreachable")
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    """Reads Retry-After (or Azure's retry-after-ms) from an API error response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _deployment_configs() -> list[DeploymentConfig]:
+    """settings.LLM_DEPLOYMENTS, or the single AZURE_* deployment (plus the map one) when unset."""
+    if settings.LLM_DEPLOYMENTS:
+        return settings.LLM_DEPLOYMENTS
+
+    def config(deployment: str, stages: list[str]) -> DeploymentConfig:
+        return DeploymentConfig(
+            endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            deployment=deployment,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+            stages=stages,
+        )
+
+    if settings.AZURE_MAP_DEPLOYMENT_NAME:
+        return [
+            config(settings.AZURE_DEPLOYMENT_NAME, ["reduce"]),
+            config(settings.AZURE_MAP_DEPLOYMENT_NAME, ["map"]),
+        ]
+    return [config(settings.AZURE_DEPLOYMENT_NAME, list(STAGES))]
+
+
+def build_router(configs: list[DeploymentConfig]) -> LLMRouter:
+    """One client and one scheduler (quota, in-flight cap) per deployment."""
+    from openai import AsyncAzureOpenAI
+
+    deployments = []
+    for config in configs:
+        api_version = config.api_version or settings.AZURE_OPENAI_API_VERSION
+        deployments.append(Deployment(
+            name=config.name or config.deployment,
+            deployment=config.deployment,
+            stages=tuple(config.stages),
+            client=AsyncAzureOpenAI(
+                azure_endpoint=config.endpoint,
+                api_key=config.api_key,
+                api_version=api_version,
+                # Retries are owned by the scheduler and router so they respect the quota
+                max_retries=0,
+            ),
+            scheduler=LLMScheduler(
+                requests_per_minute=config.requests_per_minute,
+                tokens_per_minute=config.tokens_per_minute,
+                max_in_flight=config.max_in_flight,
+                max_retries=settings.LLM_MAX_RETRIES,
+                backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+                backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+                max_batch_in_flight=min(settings.LLM_BATCH_MAX_IN_FLIGHT, config.max_in_flight),
+            ),
+            weight=config.weight,
+            # stream_options (usage in the final stream chunk) needs API version 2024-09-01+
+            stream_include_usage=api_version[:10] >= "2024-09-01",
+        ))
+    return LLMRouter(deployments, cooldown_seconds=settings.LLM_ROUTER_COOLDOWN_SECONDS)
+
+
+router: LLMRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """The process-wide deployment router, built on first use."""
+    global router
+    if router is None:
+        with _router_lock:
+            if router is None:
+                router = build_router(_deployment_configs())
+    return router
+
+
+llm_cache = LLMCache(
+    engine,
+    max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+    max_age_seconds=settings.LLM_CACHE_MAX_AGE_DAYS * 86400,
+)
+
+async def _cache_call(fn, *args):
+    """Runs a blocking cache operation off the event loop; cache errors never fail a call."""
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except Exception as e:
+        logger.warning(f"LLM cache unavailable: {e}")
+        return None
+
+
+TEMPERATURE = 0.2
+
+
+async def _route(
+    stage: str,
+    fn: Callable[[Deployment], Awaitable[T]],
+    estimated_tokens: int,
+) -> tuple[Deployment, T]:
+    """
+    Runs fn on the best deployment for the stage (see LLMRouter.pick).
+    While other deployments remain, a retryable error fails over to the
+    next one right away; the last candidate retries through its scheduler.
+    """
+    router = get_router()
+    tried: list[Deployment] = []
+    while True:
+        deployment = router.pick(stage, estimated_tokens, exclude=tried)
+        tried.append(deployment)
+        last = router.pick(stage, estimated_tokens, exclude=tried) is None
+
+        async def timed():
+            started = time.monotonic()
+            result = await fn(deployment)
+            router.observe(deployment, time.monotonic() - started)
+            return result
+
+        try:
+            result = await deployment.scheduler.run(
+                timed, estimated_tokens, max_retries=None if last else 0
+            )
+            return deployment, result
+        except retryable_errors() as e:
+            router.mark_failed(deployment, _retry_after_seconds(e))
+            if last:
+                raise
+            logger.warning(f"LLM deployment {deployment.name} failed ({type(e).__name__}), failing over")
+
+
+# Latencies of recent map calls, for the hedging threshold
+map_latencies: deque[float] = deque(maxlen=settings.LLM_HEDGE_WINDOW)
+
+
+def hedge_delay() -> float | None:
+    """
+    Seconds after which a map call gets a duplicate request: the
+    LLM_HEDGE_PERCENTILE of recent map latencies, or None while hedging is
+    off or too few calls have been seen.
+    """
+    if not settings.LLM_HEDGE_PERCENTILE or len(map_latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(map_latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * settings.LLM_HEDGE_PERCENTILE / 100))]
+
+
+async def _hedged(
+    primary_call: Callable[[], Awaitable[T]],
+    hedge_call: Callable[[], Awaitable[T]],
+    delay: float,
+    estimated_tokens: int,
+) -> T:
+    """
+    Runs primary_call; if it has not finished after delay seconds, runs
+    hedge_call alongside and returns the first successful result, cancelling
+    the other request. Fails only if both do.
+    """
+    primary = asyncio.ensure_future(primary_call())
+    hedge = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        hedge = asyncio.ensure_future(hedge_call())
+        metrics.LLM_HEDGE_TOKENS.inc(estimated_tokens)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    metrics.LLM_HEDGES.labels(result="won" if task is hedge else "lost").inc()
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in (primary, hedge):
+            if task and not task.done():
+                task.cancel()
+
+
+async def _call_llm(
+    system_prompt: str,
+    user_content: str,
+    tracker: TokenTracker | None = None,
+    on_token: Callable[[str], None] | None = None,
+    stage: str = "llm",
+) -> str:
+    """
+    Helper function to call the Azure OpenAI API through the deployment router.
+    With on_token the completion is streamed and each text delta is passed to
+    it as it arrives; the full text is still returned. stage (map, single,
+    reduce_1, reduce, ...) picks the deployment pool, map or reduce, and
+    labels the call's latency metric.
+
+    Results are served from / stored in the persistent LLM cache, so a
+    refresh or retry only pays for calls whose inputs changed.
+    """
+    route = "map" if stage == "map" else "reduce"
+    key = None
+    if settings.LLM_CACHE_ENABLED:
+        key = cache_key(get_router().cache_model(route), TEMPERATURE, system_prompt, user_content)
+        cached = await _cache_call(llm_cache.get, key)
+        metrics.CACHE_LOOKUPS.labels(cache="llm", result="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            if tracker:
+                tracker.cache_hits += 1
+            if on_token:
+                on_token(cached)
+            return cached
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_content)
+    estimated = prompt_tokens + settings.LLM_OUTPUT_TOKENS_ESTIMATE
+    if tracker:
+        tracker.submitted_input += prompt_tokens
+
+    async def request(deployment: Deployment):
+        response = await deployment.client.chat.completions.create(
+            model=deployment.deployment,
+            messages=messages,
+            temperature=TEMPERATURE,
+        )
+        usage = response.usage
+        return response.choices[0].message.content or "", usage
+
+    async def stream_request(deployment: Deployment):
+        extra = {"stream_options": {"include_usage": True}} if deployment.stream_include_usage else {}
+        stream = await deployment.client.chat.completions.create(
+            model=deployment.deployment,
+            messages=messages,
+            temperature=TEMPERATURE,
+            stream=True,
+            **extra,
+        )
+        parts: list[str] = []
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    on_token(chunk.choices[0].delta.content)
+        except retryable_errors() as e:
+            if parts:
+                # Tokens already reached the caller, a retry would duplicate them
+                raise RuntimeError(f"LLM stream interrupted: {e}") from e
+            raise
+        return "".join(parts), usage
+
+    def call():
+        return _route(route, stream_request if on_token else request, estimated)
+
+    async def first_call():
+        # Only first attempts that complete feed the hedging threshold: a
+        # hedge's time, or a winning hedge's, would pull it down with each use
+        call_started = time.monotonic()
+        result = await call()
+        if stage == "map":
+            map_latencies.append(time.monotonic() - call_started)
+        return result
+
+    started = time.monotonic()
+    if stage == "map" and not on_token and (delay := hedge_delay()) is not None:
+        deployment, (content, usage) = await _hedged(first_call, call, delay, estimated)
+    else:
+        deployment, (content, usage) = await first_call()
+    elapsed = time.monotonic() - started
+    metrics.LLM_CALL_SECONDS.labels(deployment=deployment.name, stage=stage).observe(elapsed)
     
     # Track tokens
-    if response.usage and tracker:
-        tracker.add(response.usage.prompt_tokens, response.usage.completion_tokens)
+    if usage:
+        deployment.scheduler.record_usage(estimated, usage.prompt_tokens + usage.completion_tokens)
+        input_tokens, output_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        # Older API versions send no usage on streams, fall back to estimates
+        input_tokens = prompt_tokens
+        output_tokens = estimate_tokens(content)
+    if tracker and (usage or on_token):
+        tracker.add(input_tokens, output_tokens)
+    metrics.LLM_TOKENS.labels(deployment=deployment.name, kind="input").inc(input_tokens)
+    metrics.LLM_TOKENS.labels(deployment=deployment.name, kind="output").inc(output_tokens)
+    metrics.LLM_COST_DOLLARS.labels(deployment=deployment.name).inc(call_cost(input_tokens, output_tokens))
+
+    if key and content:
+        await _cache_call(llm_cache.put, key, content)
     
-    return response.choices[0].message.content or ""
+    return content
+
+
+# Progress callback: (stage, done, total), e.g. ("map", 3, 12)
+ProgressCallback = Callable[[str, int, int], None]
+
+NOTES_SEPARATOR = "\n\n---\n\n"
+# Condensing normally converges in a level or two; past this the model is
+# not shortening its notes and reducing further would not terminate
+MAX_REDUCE_DEPTH = 8
+
+
+def _split_to_budget(text: str, budget: int) -> list[str]:
+    """Consecutive pieces of text of at most budget estimated tokens, cut between lines where possible."""
+    max_chars = (budget - 1) * 4  # estimate_tokens is len // 4 + 1
+    pieces: list[str] = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _resolved(text: str) -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(text)
+    return future
+
+
+async def _tree_reduce(
+    level: list[asyncio.Future],
+    tracker: TokenTracker,
+    report: ProgressCallback,
+    on_token: Callable[[str], None] | None = None,
+    depth: int = 1,
+) -> str:
+    """
+    Streaming tree reduce over ordered, still-running note tasks.
 
+    As soon as adjacent outputs (in document order) are ready and fill the
+    LLM_REDUCE_INPUT_TOKENS budget, they are packed into a partial reduce,
+    without waiting for stragglers elsewhere in the video. The partial
+    results form the next level, reduced the same way, until one level fits
+    the budget and gets the final (streamed) REDUCE_PROMPT call. Depth
+    therefore follows from the budget rather than a fixed fan-in.
 
-async def generate_notes_map_reduce(transcript_segments: list[dict]) -> tuple[str, dict]:
+    No call gets more than the budget: an output too large for a call on
+    its own is condensed in pieces, and a level where no two outputs fit
+    together has each of them condensed to half the budget.
+    """
+    budget = settings.LLM_REDUCE_INPUT_TOKENS
+    if depth > MAX_REDUCE_DEPTH:
+        raise RuntimeError(f"Notes still exceed the reduce budget after {MAX_REDUCE_DEPTH} levels")
+    results: list[str | None] = [None] * len(level)
+    position = {task: i for i, task in enumerate(level)}
+    batches: list[asyncio.Future] = []
+    start = 0  # first output not yet packed into a batch
+    merged = False  # at least one batch combines several outputs
+    pending = set(level)
+    partial_done = 0
+
+    def on_partial_done(_):
+        nonlocal partial_done
+        partial_done += 1
+        if not pending:
+            report("reduce", partial_done, len(batches) + 1)
+
+    def partial_reduce(texts: list[str], condense: bool = False) -> asyncio.Future:
+        prompt = PARTIAL_REDUCE_PROMPT.format(text=NOTES_SEPARATOR.join(texts))
+        if condense:
+            prompt += CONDENSE_RULE.format(words=budget // 2 * 3 // 4)
+        task = asyncio.ensure_future(_call_llm(
+            "You are a Senior Technical Editor.", prompt, tracker, stage=f"reduce_{depth}"
+        ))
+        task.add_done_callback(on_partial_done)
+        return task
+
+    def next_batch_end(level_done: bool) -> int | None:
+        """End index of a ready, budget-packed batch starting at `start`."""
+        tokens = 0
+        for end in range(start, len(level)):
+            if results[end] is None:
+                return None  # keep document order: wait for this output
+            size = estimate_tokens(results[end])
+            if end == start and size > budget:
+                return end + 1  # too large for any call, see below
+            if end > start and tokens + size > budget:
+                return end
+            tokens += size
+        # All remaining outputs fit; they are the tail batch only if this
+        # level already had to be split, otherwise they feed the final reduce
+        if level_done and batches and start < len(level):
+            return len(level)
+        return None
+
+    try:
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                results[position[task]] = task.result()
+
+            while (end := next_batch_end(level_done=not pending)) is not None:
+                if end - start > 1:
+                    batches.append(partial_reduce(results[start:end]))
+                    merged = True
+                elif estimate_tokens(results[start]) > budget:
+                    # Over the budget on its own: condense it piece by piece
+                    pieces = _split_to_budget(results[start], budget)
+                    batches.extend(partial_reduce([piece], condense=True) for piece in pieces)
+                    merged = True
+                else:
+                    # Nothing to merge it with here, carry it up as-is
+                    batches.append(_resolved(results[start]))
+                start = end
+
+        if batches and not merged:
+            # No two outputs fit one call together; condensed to half the
+            # budget each, they pair up on the next level
+            batches = [partial_reduce([text], condense=True) for text in results]
+            merged = True
+    except BaseException:
+        for task in [*pending, *batches]:
+            task.cancel()
+        raise
+
+    if batches and merged:
+        logger.info(f"Reduce: {len(level)} notes packed into {len(batches)} partial reduces")
+        return await _tree_reduce(batches, tracker, report, on_token, depth + 1)
+
+    # This level fits one call (or cannot be merged further): final document
+    report("reduce", partial_done, partial_done + 1)
+    return await _call_llm(
+        "You are a Senior Technical Editor.",
+        REDUCE_PROMPT.format(text=NOTES_SEPARATOR.join(results)),
+        tracker,
+        on_token=on_token,
+        stage="reduce",
+    )
+
+
+async def generate_notes_map_reduce(
+    transcript_segments: list[dict],
+    on_progress: ProgressCallback | None = None,
+    on_chunk: Callable[[int, str], None] | None = None,
+    on_token: Callable[[str], None] | None = None,
+    plan: ChunkPlan | None = None,
+) -> tuple[str, dict]:
     """
     Map-Reduce generation for high-fidelity notes.
     
-    1. Chunks the transcript.
+    1. Plans token-sized chunks on segment boundaries (see plan_chunks).
+       Transcripts that fit one call skip map-reduce entirely.
     2. MAP: Processes each chunk independently.
     3. REDUCE: Synthesizes all chunk notes into a final document.
+
+    If on_progress is given it is called as each stage advances, so callers
+    (e.g. background jobs) can report "map 3/12" style status. on_chunk
+    receives (index, markdown) as each map chunk finishes and on_token
+    receives the final reduce output as it streams. A plan already made
+    for these segments (e.g. by admission control) is reused.
     
     Returns:
         tuple: (content_markdown, cost_stats)
         cost_stats = {"input_tokens": int, "output_tokens": int, "cost": float}
+
+    An LLM failure (after retries and failover) is raised, never returned as
+    content, so it cannot be saved as a note.
     """
     tracker = TokenTracker()
+
+    def report(stage: str, done: int, total: int):
+        if on_progress:
+            on_progress(stage, done, total)
     
     try:
-        # 1. Prepare full text from segments
-        full_text = " ".join([s["text"] for s in transcript_segments])
-        
-        # 2. Chunk the text using shared splitter
-        chunks = text_splitter.split_text(full_text)
-        
+        # 1. Plan chunks by token budget
+        if plan is None:
+            plan = plan_chunks(
+                transcript_segments,
+                chunk_tokens=settings.LLM_MAP_CHUNK_TOKENS,
+                single_call_tokens=settings.LLM_SINGLE_CALL_TOKENS,
+                reduce_tokens=settings.LLM_REDUCE_INPUT_TOKENS,
+            )
+        logger.info(f"Chunk plan: {plan.describe()}")
+
+        # 2. Short transcripts: one call straight to the final document
+        if plan.single_call:
+            report("reduce", 0, 1)
+            prompt = SINGLE_PASS_PROMPT.format(text=plan.chunks[0].text)
+            result = await _call_llm(
+                "You are a Senior Technical Writer.", prompt, tracker, on_token=on_token, stage="single"
+            )
+            tracker.log_summary()
+            return result, tracker.get_stats()
+
+        chunks = [chunk.text for chunk in plan.chunks]
         logger.info(f"Map-Reduce: Processing {len(chunks)} chunks")
         
         # 3. MAP Phase: Process all chunks concurrently
+        mapped_count = 0
+        report("map", 0, len(chunks))
+
         async def process_chunk(chunk_text: str, index: int) -> str:
+            nonlocal mapped_count
             logger.info(f"Processing chunk {index + 1}/{len(chunks)}")
             prompt = MAP_PROMPT.format(text=chunk_text)
-            return await _call_llm("You are a Senior Technical Writer.", prompt, tracker)
-        
-        map_tasks = [process_chunk(chunk, i) for i, chunk in enumerate(chunks)]
-        mapped_notes = await asyncio.gather(*map_tasks)
-        
-        # 4. REDUCE Phase: Combine all notes into final document
-        # If too many chunks, we may need to reduce in batches
-        combined_notes = "\n\n---\n\n".join(mapped_notes)
-        
-        # Check if combined notes are too long for a single reduce call
-        if len(combined_notes) > 100000:
-            # Do iterative reduction in batches of ~5 chunks at a time
-            logger.info("Combined notes too long, doing iterative reduction")
-            batch_size = 5
-            while len(mapped_notes) > 1:
-                reduce_tasks = []
-                for i in range(0, len(mapped_notes), batch_size):
-                    batch = mapped_notes[i:i+batch_size]
-                    batch_text = "\n\n---\n\n".join(batch)
-                    reduce_prompt = REDUCE_PROMPT.format(text=batch_text)
-                    reduce_tasks.append(_call_llm(
-                        "You are a Senior Technical Editor.", 
-                        reduce_prompt,
-                        tracker
-                    ))
-                mapped_notes = await asyncio.gather(*reduce_tasks)
-            tracker.log_summary()
-            return mapped_notes[0], tracker.get_stats()
-        else:
-            # Single reduce pass
-            reduce_prompt = REDUCE_PROMPT.format(text=combined_notes)
-            result = await _call_llm(
-                "You are a Senior Technical Editor.", 
-                reduce_prompt,
-                tracker
-            )
-            tracker.log_summary()
-            return result, tracker.get_stats()
+            result = await _call_llm("You are a Senior Technical Writer.", prompt, tracker, stage="map")
+            mapped_count += 1
+            report("map", mapped_count, len(chunks))
+            if on_chunk:
+                on_chunk(index, result)
+            return result
         
+        map_tasks = [asyncio.ensure_future(process_chunk(chunk, i)) for i, chunk in enumerate(chunks)]
+
+        # 4. REDUCE Phase: pipelined tree reduce, starts while maps still run
+        result = await _tree_reduce(map_tasks, tracker, report, on_token)
+        tracker.log_summary()
+        return result, tracker.get_stats()
+
+    except asyncio.CancelledError:
+        # Nobody waits for the note any more (see SingleFlight); calls not
+        # yet sent never will be. Calls already sent are billed even though
+        # they were cancelled with it, so only the rest counts as saved
+        saved = max(0, plan.expected_tokens - tracker.submitted_input) if plan else 0
+        metrics.GENERATIONS_CANCELLED.inc()
+        metrics.LLM_TOKENS_SAVED.inc(saved)
+        logger.info(f"Generation cancelled after {tracker.calls} calls, ~{saved} prompt tokens saved")
+        raise
     except Exception as e:
         logger.error(f"Error generating map-reduce notes: {e}")
-        return f"Error: {str(e)}", {"input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+        raise
@@ -0,0 +1,124 @@
+import math
+import re
+from dataclasses import dataclass, field
+
+# Auto-captions rarely have punctuation; this still catches the ones that do
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*$")
+
+# Once a chunk is this full, cut at the next sentence end instead of packing on
+SOFT_LIMIT = 0.85
+
+# Map notes come out at roughly this fraction of the chunk they were made from
+MAP_OUTPUT_RATIO = 0.5
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap pre-call token estimate (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: float  # timestamp (seconds) of the first segment in the chunk
+    tokens: int  # estimated
+
+
+@dataclass
+class ChunkPlan:
+    chunks: list[Chunk] = field(default_factory=list)
+    # The whole transcript fits one call: no map-reduce at all
+    single_call: bool = False
+    input_tokens: int = 0
+    map_calls: int = 0
+    reduce_calls: int = 0
+    # Estimated prompt tokens across every call (excluding prompt templates)
+    expected_tokens: int = 0
+
+    @property
+    def expected_calls(self) -> int:
+        return self.map_calls + self.reduce_calls
+
+    def describe(self) -> str:
+        if self.single_call:
+            return f"single call, ~{self.input_tokens} input tokens"
+        return (
+            f"{len(self.chunks)} chunks, {self.map_calls} map + ~{self.reduce_calls} reduce calls, "
+            f"~{self.expected_tokens} prompt tokens"
+        )
+
+
+def _estimate_reduce_calls(map_output_tokens: int, reduce_tokens: int) -> tuple[int, int]:
+    """(calls, prompt tokens) for reducing map output under a per-call budget."""
+    calls = 0
+    tokens = 0
+    level = map_output_tokens
+    while True:
+        batches = max(1, math.ceil(level / reduce_tokens))
+        calls += batches
+        tokens += level
+        if batches == 1:
+            return calls, tokens
+        level = int(level * MAP_OUTPUT_RATIO)
+
+
+def plan_chunks(
+    segments: list[dict],
+    chunk_tokens: int,
+    single_call_tokens: int,
+    reduce_tokens: int,
+) -> ChunkPlan:
+    """
+    Splits transcript segments into map chunks sized by estimated tokens.
+
+    Chunks only break between segments (never mid-caption), preferring a
+    sentence end once a chunk is SOFT_LIMIT full, so no overlap is needed.
+    If the whole transcript fits in single_call_tokens the plan is a single
+    call and map-reduce is skipped.
+    """
+    full_tokens = sum(estimate_tokens(s["text"]) for s in segments)
+    plan = ChunkPlan(input_tokens=full_tokens)
+
+    if full_tokens <= single_call_tokens:
+        text = " ".join(s["text"] for s in segments)
+        start = segments[0]["start"] if segments else 0.0
+        plan.chunks = [Chunk(text=text, start=start, tokens=full_tokens)]
+        plan.single_call = True
+        plan.map_calls = 1
+        plan.expected_tokens = full_tokens
+        return plan
+
+    parts: list[str] = []
+    part_tokens = 0
+    part_start = 0.0
+
+    def flush():
+        nonlocal parts, part_tokens
+        if parts:
+            plan.chunks.append(Chunk(text=" ".join(parts), start=part_start, tokens=part_tokens))
+        parts = []
+        part_tokens = 0
+
+    for segment in segments:
+        text = segment["text"].strip()
+        if not text:
+            continue
+        tokens = estimate_tokens(text)
+
+        if parts and part_tokens + tokens > chunk_tokens:
+            flush()
+        if not parts:
+            part_start = segment.get("start", 0.0)
+
+        parts.append(text)
+        part_tokens += tokens
+
+        if part_tokens >= chunk_tokens * SOFT_LIMIT and SENTENCE_END.search(text):
+            flush()
+    flush()
+
+    plan.map_calls = len(plan.chunks)
+    map_output = int(full_tokens * MAP_OUTPUT_RATIO)
+    plan.reduce_calls, reduce_input = _estimate_reduce_calls(map_output, reduce_tokens)
+    plan.expected_tokens = full_tokens + reduce_input
+    return plan
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, delete, select
+from app.models import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(deployment: str, temperature: float, system_prompt: str, user_content: str) -> str:
+    """
+    Content address of an LLM call. user_content is the formatted prompt
+    template, so a change to MAP_PROMPT/REDUCE_PROMPT or to the input text
+    both produce a new key.
+    """
+    h = hashlib.sha256()
+    for part in (deployment, repr(temperature), system_prompt, user_content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent cache of LLM outputs keyed by cache_key().
+
+    Entries older than max_age_seconds are ignored and evicted; when the
+    total size exceeds max_bytes the least recently used entries go first.
+    Methods are blocking, call them from a thread in async code. Hit and
+    miss counts are in the cache_lookups metric.
+    """
+
+    # Run eviction every N writes rather than on every one
+    EVICT_EVERY = 50
+    # A hit only records last_used_at once the stored one is this old, so
+    # reads stay reads; LRU eviction only needs it to about this precision
+    TOUCH_AFTER = timedelta(hours=1)
+
+    def __init__(self, engine: Engine, max_bytes: int, max_age_seconds: int):
+        self.engine = engine
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._writes = 0
+
+    @staticmethod
+    def _as_utc(value: datetime) -> datetime:
+        if value.tzinfo is None:  # SQLite drops the timezone
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+    def _is_expired(self, entry: LLMCacheEntry, now: datetime) -> bool:
+        return now - self._as_utc(entry.created_at) > timedelta(seconds=self.max_age_seconds)
+
+    def get(self, key: str) -> str | None:
+        now = datetime.now(timezone.utc)
+        with Session(self.engine) as session:
+            entry = session.get(LLMCacheEntry, key)
+            if entry is None or self._is_expired(entry, now):
+                return None
+            if now - self._as_utc(entry.last_used_at) > self.TOUCH_AFTER:
+                entry.last_used_at = now
+                session.add(entry)
+                session.commit()
+            return entry.content
+
+    def put(self, key: str, content: str):
+        now = datetime.now(timezone.utc)
+        with Session(self.engine) as session:
+            entry = LLMCacheEntry(
+                key=key,
+                content=content,
+                size=len(content.encode("utf-8")),
+                created_at=now,
+                last_used_at=now,
+            )
+            session.merge(entry)
+            session.commit()
+
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drops expired entries, then LRU entries beyond max_bytes. Returns count removed."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.max_age_seconds)
+        with Session(self.engine) as session:
+            removed = session.exec(
+                delete(LLMCacheEntry).where(LLMCacheEntry.created_at < cutoff)
+            ).rowcount
+
+            rows = session.exec(
+                select(LLMCacheEntry.key, LLMCacheEntry.size).order_by(LLMCacheEntry.last_used_at.desc())
+            ).all()
+            total = 0
+            over_budget = []
+            for key, size in rows:
+                total += size
+                if total > self.max_bytes:
+                    over_budget.append(key)
+            if over_budget:
+                removed += session.exec(
+                    delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(over_budget))
+                ).rowcount
+            session.commit()
+
+        if removed:
+            logger.info(f"LLM cache: evicted {removed} entries")
+        return removed
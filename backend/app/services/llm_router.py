@@ -0,0 +1,93 @@
+"""
+Routing of LLM calls across several Azure OpenAI deployments.
+
+Each Deployment has its own client and LLMScheduler, i.e. its own quota
+and in-flight cap. For every call the router picks, among the deployments
+serving the call's stage, the one with the lowest expected time: quota
+wait plus observed latency scaled by how busy it is, divided by its
+weight. A deployment that fails sits out a cooldown (or its Retry-After),
+so the next attempt fails over to another one.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any
+from pydantic import BaseModel
+
+STAGES = ("map", "reduce")
+
+# Weight of the newest observation in the latency moving average
+LATENCY_ALPHA = 0.2
+MAX_COOLDOWN_SECONDS = 300.0
+
+
+class DeploymentConfig(BaseModel):
+    """One entry of settings.LLM_DEPLOYMENTS."""
+    endpoint: str
+    api_key: str
+    deployment: str  # Azure deployment name
+    name: str = ""  # label in logs/metrics, defaults to the deployment name
+    api_version: str = ""  # defaults to AZURE_OPENAI_API_VERSION
+    weight: float = 1.0
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    max_in_flight: int = 8
+    stages: list[str] = list(STAGES)
+
+
+@dataclass(eq=False)
+class Deployment:
+    name: str
+    deployment: str
+    stages: tuple[str, ...]
+    client: Any  # AsyncAzureOpenAI
+    scheduler: Any  # LLMScheduler
+    weight: float = 1.0
+    stream_include_usage: bool = False
+    latency: float | None = None  # moving average of call seconds, None until measured
+    failures: int = 0  # consecutive
+    down_until: float = 0.0  # time.monotonic()
+
+
+class LLMRouter:
+    def __init__(self, deployments: list[Deployment], cooldown_seconds: float):
+        self.deployments = deployments
+        self.cooldown_seconds = cooldown_seconds
+
+    def candidates(self, stage: str) -> list[Deployment]:
+        """Deployments serving a stage; every deployment if none is assigned to it."""
+        return [d for d in self.deployments if stage in d.stages] or list(self.deployments)
+
+    def cache_model(self, stage: str) -> str:
+        """Cache key component: the deployment names a stage may be answered by."""
+        return "|".join(sorted({d.deployment for d in self.candidates(stage)}))
+
+    def pick(self, stage: str, estimated_tokens: int, exclude=()) -> Deployment | None:
+        """Best deployment for a call, or None when every candidate was excluded."""
+        pool = [d for d in self.candidates(stage) if d not in exclude]
+        now = time.monotonic()
+        measured = [d.latency for d in pool if d.latency is not None]
+        # Unmeasured deployments look as fast as the best one, so they get tried
+        default_latency = min(measured) if measured else 1.0
+
+        def expected_seconds(d: Deployment) -> float:
+            latency = d.latency if d.latency is not None else default_latency
+            busy = d.scheduler.in_flight / d.scheduler.max_in_flight
+            wait = max(d.down_until - now, d.scheduler.wait_estimate(estimated_tokens))
+            return (wait + latency * (1 + busy)) / d.weight
+
+        return min(pool, key=expected_seconds, default=None)
+
+    def observe(self, deployment: Deployment, seconds: float):
+        if deployment.latency is None:
+            deployment.latency = seconds
+        else:
+            deployment.latency += LATENCY_ALPHA * (seconds - deployment.latency)
+        deployment.failures = 0
+        deployment.down_until = 0.0
+
+    def mark_failed(self, deployment: Deployment, retry_after: float | None = None):
+        """Takes a deployment out of rotation for Retry-After or an exponential cooldown."""
+        deployment.failures += 1
+        if retry_after is None:
+            retry_after = min(MAX_COOLDOWN_SECONDS, self.cooldown_seconds * 2 ** (deployment.failures - 1))
+        deployment.down_until = time.monotonic() + retry_after
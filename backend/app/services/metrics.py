@@ -0,0 +1,151 @@
+"""
+Prometheus metrics for the generation pipeline, served at GET /metrics.
+
+Updating a metric is a lock and a float add, cheap enough to leave on in
+production. With several gunicorn workers set PROMETHEUS_MULTIPROC_DIR to
+an empty directory so /metrics aggregates every worker.
+"""
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# LLM calls and generations run from seconds to minutes
+LLM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+GENERATION_BUCKETS = (5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+TRANSCRIPT_FETCH_SECONDS = Histogram(
+    "transcript_fetch_seconds",
+    "Time to get a transcript, from the transcript store or from YouTube.",
+    ["source"],
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds",
+    "LLM call latency including scheduler queueing and retries. Stage is map, "
+    "single, reduce_<level> for partial reduces or reduce for the final one.",
+    ["deployment", "stage"],
+    buckets=LLM_BUCKETS,
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "llm_queue_seconds",
+    "Time an LLM call waited for an in-flight slot and RPM/TPM admission.",
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+GENERATION_SECONDS = Histogram(
+    "generation_seconds",
+    "End-to-end time of a note generation (transcript, LLM and save).",
+    buckets=GENERATION_BUCKETS,
+)
+DB_COMMIT_SECONDS = Histogram(
+    "db_commit_seconds",
+    "Time to write and commit a generated note.",
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time a request waited for a database connection (pool wait, plus connect "
+    "and pre-ping when one is opened), by database (primary, replica).",
+    ["database"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Tokens used by LLM calls.",
+    ["deployment", "kind"],
+)
+LLM_COST_DOLLARS = Counter(
+    "llm_cost_dollars",
+    "Estimated LLM spend in USD.",
+    ["deployment"],
+)
+LLM_RETRIES = Counter(
+    "llm_retries",
+    "LLM calls retried after a retryable error.",
+    ["error"],
+)
+TRANSCRIPT_NORMALIZE_REMOVED = Counter(
+    "transcript_normalize_removed",
+    "Transcript characters and estimated tokens removed by normalisation before "
+    "chunking (rolling-caption repeats, non-speech markers, hesitations).",
+    ["unit"],
+)
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions",
+    "Admission decisions for generations: admitted (right away), queued (admitted "
+    "after waiting), rejected (503, overloaded) or too_large (413).",
+    ["result"],
+)
+GENERATIONS_CANCELLED = Counter(
+    "generations_cancelled",
+    "Generations cancelled because every client waiting for them disconnected.",
+)
+LLM_TOKENS_SAVED = Counter(
+    "llm_tokens_saved",
+    "Projected prompt tokens not spent because their generation was cancelled.",
+)
+LLM_HEDGES = Counter(
+    "llm_hedges",
+    "Map calls that ran past the hedging percentile and got a duplicate request, "
+    "by which one answered first: won (the duplicate) or lost (the original).",
+    ["result"],
+)
+LLM_HEDGE_TOKENS = Counter(
+    "llm_hedge_tokens",
+    "Estimated tokens sent in hedging duplicates, the extra cost of hedging.",
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups",
+    "Cache lookups by cache (llm, transcript) and result (hit, miss). "
+    "Hit ratio: rate(cache_lookups_total{result=\"hit\"}) / rate(cache_lookups_total).",
+    ["cache", "result"],
+)
+
+GENERATIONS_IN_FLIGHT = Gauge(
+    "generations_in_flight",
+    "Note generations currently running.",
+    multiprocess_mode="livesum",
+)
+LLM_CALLS_IN_FLIGHT = Gauge(
+    "llm_calls_in_flight",
+    "LLM requests currently sent to the API.",
+    multiprocess_mode="livesum",
+)
+DB_CONNECTIONS = Gauge(
+    "db_connections",
+    "Database connections by database (primary, replica) and state: open "
+    "(held by the pool, busy or idle) or checked_out (in use by a session).",
+    ["database", "state"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT_TOKENS = Gauge(
+    "admission_in_flight_tokens",
+    "Projected prompt tokens of the generations currently admitted.",
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued",
+    "Generations waiting for admission.",
+    multiprocess_mode="livesum",
+)
+LLM_CALLS_WAITING = Gauge(
+    "llm_calls_waiting",
+    "LLM calls waiting for scheduler admission.",
+    multiprocess_mode="livesum",
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,137 @@
+"""
+Transcript normalisation, run between fetching a transcript and chunking it.
+
+YouTube auto-captions repeat each line as it rolls up the screen, carry
+non-speech markers ([Music], [Applause], >> speaker changes) and every
+"um" and "uh" that was said. All of it is paid for as input tokens in
+every map chunk. normalize_segments strips it in one pass of precompiled
+regexes per segment and merges the remaining captions into sentences, each
+keeping the start timestamp of its first caption.
+
+The stored transcript stays raw, so improving these rules applies to
+stored videos on their next generation too.
+"""
+import re
+from dataclasses import dataclass
+from app.services.chunking import SENTENCE_END, estimate_tokens
+
+# Known caption markers only: [Music], [Applause], [Laughter], [ __ ]
+# (censored word), ♪ lyrics ♪, and >> for a speaker change at the start of
+# a caption. Other brackets and >> are content, e.g. arr[i] or x >> 2.
+NON_SPEECH = re.compile(
+    r"\[\s*(?:music|applause|laughter|laughs|cheering|inaudible|silence|__+)\s*\]"
+    r"|\((?:music|applause|laughter|laughs|inaudible)\)|♪+|^\s*>>+",
+    re.IGNORECASE,
+)
+# Hesitations only: words like "like" or "you know" often carry meaning, and
+# "mm" is a unit
+FILLER = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+|m+h+m+)\b,?", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+# Punctuation left stranded by a removal, e.g. "so , the" or "well ,"
+SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([,.!?;:])")
+LEADING_PUNCTUATION = re.compile(r"^[\s,;:]+")
+
+# Rolling captions repeat at most the previous line or two
+MAX_OVERLAP_WORDS = 24
+# A single repeated word at a caption boundary is usually real speech ("that that")
+MIN_OVERLAP_WORDS = 2
+# Auto-captions rarely punctuate; cap merged sentences at about 100 tokens
+MAX_SENTENCE_CHARS = 400
+
+
+@dataclass
+class NormalizeStats:
+    segments_before: int = 0
+    segments_after: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+    tokens_before: int = 0  # estimated, like chunk planning
+    tokens_after: int = 0
+
+    @property
+    def chars_removed(self) -> int:
+        return self.chars_before - self.chars_after
+
+    @property
+    def tokens_removed(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def describe(self) -> str:
+        share = self.chars_removed / self.chars_before if self.chars_before else 0.0
+        return (
+            f"{self.segments_before} -> {self.segments_after} segments, "
+            f"{self.chars_removed} chars ({share:.0%}) / ~{self.tokens_removed} tokens removed"
+        )
+
+
+def clean_text(text: str) -> str:
+    """One caption without non-speech markers, hesitations and extra whitespace."""
+    text = NON_SPEECH.sub(" ", text)
+    text = FILLER.sub(" ", text)
+    text = WHITESPACE.sub(" ", text)
+    text = SPACE_BEFORE_PUNCTUATION.sub(r"\1", text)
+    return LEADING_PUNCTUATION.sub("", text).strip()
+
+
+def _overlap(previous: list[str], words: list[str]) -> int:
+    """How many leading words of a caption (at least MIN_OVERLAP_WORDS) repeat the end of the text before it."""
+    for size in range(min(len(previous), len(words), MAX_OVERLAP_WORDS), MIN_OVERLAP_WORDS - 1, -1):
+        if previous[-size:] == words[:size]:
+            return size
+    return 0
+
+
+def _comparable(word: str) -> str:
+    return word.casefold().strip(",.!?;:\"'")
+
+
+def normalize_segments(segments: list[dict]) -> tuple[list[dict], NormalizeStats]:
+    """
+    Cleaned transcript in the same {'text', 'start', 'duration'} shape, plus
+    what was removed. Captions are cleaned, the part of each caption that
+    repeats the previous one is dropped, and the rest is merged into
+    sentences (cut at MAX_SENTENCE_CHARS when captions have no punctuation).
+    """
+    stats = NormalizeStats(segments_before=len(segments))
+    merged: list[dict] = []
+    parts: list[str] = []
+    part_chars = 0
+    part_start = 0.0
+    part_end = 0.0
+    recent: list[str] = []  # comparable form of the last words kept
+
+    def flush():
+        nonlocal parts, part_chars
+        if parts:
+            merged.append({"text": " ".join(parts), "start": part_start, "duration": round(part_end - part_start, 3)})
+        parts = []
+        part_chars = 0
+
+    for segment in segments:
+        words = clean_text(segment["text"]).split()
+        comparable = [_comparable(word) for word in words]
+        skip = _overlap(recent, comparable)
+        words = words[skip:]
+        if not words:
+            continue
+        recent = (recent + comparable[skip:])[-MAX_OVERLAP_WORDS:]
+
+        start = segment.get("start", 0.0)
+        if not parts:
+            part_start = start
+        text = " ".join(words)
+        parts.append(text)
+        part_chars += len(text) + 1
+        part_end = start + segment.get("duration", 0.0)
+
+        if SENTENCE_END.search(text) or part_chars >= MAX_SENTENCE_CHARS:
+            flush()
+    flush()
+
+    # Measured on the text as chunks join it, with a space between segments
+    before = " ".join(segment["text"] for segment in segments)
+    after = " ".join(segment["text"] for segment in merged)
+    stats.segments_after = len(merged)
+    stats.chars_before, stats.chars_after = len(before), len(after)
+    stats.tokens_before, stats.tokens_after = estimate_tokens(before), estimate_tokens(after)
+    return merged, stats
@@ -0,0 +1,125 @@
+import zlib
+from sqlalchemy import func, inspect, text
+from sqlmodel import Session, delete, select
+from app.models import Note, NoteContent, NoteRead, NoteRendered
+from app.services.search import index_note, unindex_note, unindexed_notes
+
+# First byte of every stored body says how the rest is encoded, so the
+# codec can change later without rewriting existing rows.
+FORMAT_ZLIB = 1
+
+
+def compress_body(text: str) -> bytes:
+    return bytes([FORMAT_ZLIB]) + zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_body(data: bytes) -> str:
+    version, payload = data[0], data[1:]
+    if version == FORMAT_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown note body format: {version}")
+
+
+def save_note_content(session: Session, note: Note, text: str):
+    """
+    Stores the Markdown body for a new note and adds it to the search index
+    (the note must already have an id).
+    """
+    session.merge(NoteContent(note_id=note.id, body=compress_body(text)))
+    index_note(session, note, text)
+
+
+def load_note_content(session: Session, note: Note) -> str | None:
+    """Reads and decompresses a note body."""
+    content = session.get(NoteContent, note.id)
+    if content is None:
+        return None
+    return decompress_body(content.body)
+
+
+def delete_note(session: Session, note: Note):
+    """Deletes a note together with its body, render and search entry (caller commits)."""
+    unindex_note(session, note, load_note_content(session, note) or "")
+    session.exec(delete(NoteContent).where(NoteContent.note_id == note.id))
+    session.exec(delete(NoteRendered).where(NoteRendered.note_id == note.id))
+    session.delete(note)
+
+
+def to_note_read(session: Session, note: Note) -> NoteRead:
+    """Full single-note view, the only place bodies are decompressed."""
+    return NoteRead.model_validate(
+        note, update={"content_detailed": load_note_content(session, note)}
+    )
+
+
+def move_inline_bodies(session: Session, batch_size: int = 500) -> int:
+    """
+    Moves the bodies of notes saved before NoteContent existed out of the
+    legacy note.content_detailed column, then drops the column. Returns how
+    many were moved; once the column is gone this is one catalog query.
+    Run it under app.db.migration_lock.
+    """
+    columns = {column["name"] for column in inspect(session.connection()).get_columns("note")}
+    if "content_detailed" not in columns:
+        return 0
+    moved = 0
+    select_legacy = text("SELECT id, content_detailed FROM note WHERE content_detailed IS NOT NULL LIMIT :limit")
+    while rows := session.execute(select_legacy, {"limit": batch_size}).all():
+        for note_id, body in rows:
+            session.merge(NoteContent(note_id=note_id, body=compress_body(body)))
+            session.execute(text("UPDATE note SET content_detailed = NULL WHERE id = :id"), {"id": note_id})
+        session.commit()
+        moved += len(rows)
+    # IF EXISTS on Postgres; SQLite has no such clause, but runs this under
+    # migration_lock like every other startup migration
+    if_exists = "IF EXISTS " if session.get_bind().dialect.name == "postgresql" else ""
+    session.execute(text(f"ALTER TABLE note DROP COLUMN {if_exists}content_detailed"))
+    session.commit()
+    return moved
+
+
+def ensure_note_indexes(session: Session) -> list[str]:
+    """
+    Creates the Note indexes a database made by an older version lacks:
+    create_all only adds indexes along with their table, and is skipped
+    altogether once every table exists. Duplicate notes of a video, from
+    before generations were deduplicated, are deleted (the oldest is kept)
+    so the unique video_id index can be built. Returns the indexes created;
+    on an up-to-date database this is one catalog query. Run it under
+    app.db.migration_lock, so two workers never delete the same duplicates.
+    """
+    existing = {index["name"]: index for index in inspect(session.connection()).get_indexes("note")}
+    created = []
+    for index in Note.__table__.indexes:
+        current = existing.get(index.name)
+        if current is not None and bool(current["unique"]) == bool(index.unique):
+            continue
+        if index.unique:
+            _delete_duplicate_notes(session)
+        if current is not None:
+            session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        columns = ", ".join(column.name for column in index.columns)
+        unique = "UNIQUE " if index.unique else ""
+        # IF NOT EXISTS: another worker may be running this too
+        session.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {index.name} ON note ({columns})"))
+        session.commit()
+        created.append(index.name)
+    return created
+
+
+def _delete_duplicate_notes(session: Session):
+    keep = select(func.min(Note.id)).group_by(Note.video_id)
+    for note in session.exec(select(Note).where(Note.id.not_in(keep))).all():
+        delete_note(session, note)
+    session.commit()
+
+
+def index_missing_notes(session: Session, batch_size: int = 500) -> int:
+    """Adds notes saved before the search index existed to it. Returns how many."""
+    added = 0
+    while notes := unindexed_notes(session, batch_size):
+        for note in notes:
+            index_note(session, note, load_note_content(session, note) or "")
+        session.commit()
+        added += len(notes)
+    return added
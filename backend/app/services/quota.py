@@ -0,0 +1,86 @@
+"""
+Per-client generation quota.
+
+Each client (IP) has one ClientQuota row. Charging it is a single
+conditional UPDATE (used = used + 1 WHERE used < limit), so the check is a
+primary-key lookup instead of a COUNT over the notes table, and concurrent
+requests from one client cannot both take the last slot. Admin IPs are
+answered from settings.admin_ips_set without touching the database.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, select, update
+from app.config import settings
+from app.models import ClientQuota, Note
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def is_exempt(client: str) -> bool:
+    return settings.QUOTA_LIMIT <= 0 or client in settings.admin_ips_set
+
+
+def _ensure_row(session: Session, client: str, now: datetime):
+    """Creates the client's row on its first generation, seeded from the notes it already owns."""
+    if session.get(ClientQuota, client) is not None:
+        return
+
+    count = select(func.count()).select_from(Note).where(Note.user_ip == client)
+    if settings.QUOTA_WINDOW_SECONDS > 0:
+        count = count.where(Note.created_at > now - timedelta(seconds=settings.QUOTA_WINDOW_SECONDS))
+    used = session.exec(count).one()
+
+    session.add(ClientQuota(client=client, used=used, window_start=now))
+    try:
+        session.commit()
+    except IntegrityError:
+        # A concurrent request created it first
+        session.rollback()
+
+
+def try_charge(session: Session, client: str) -> bool:
+    """Takes one generation from the client's quota. Returns False if it is used up."""
+    if is_exempt(client):
+        return True
+
+    now = _utcnow()
+    _ensure_row(session, client, now)
+
+    if settings.QUOTA_WINDOW_SECONDS > 0:
+        # Window over: start a new one with this generation as its first
+        statement = (
+            update(ClientQuota)
+            .where(ClientQuota.client == client)
+            .where(ClientQuota.window_start <= now - timedelta(seconds=settings.QUOTA_WINDOW_SECONDS))
+            .values(used=1, window_start=now)
+        )
+        result = session.exec(statement)
+        session.commit()
+        if result.rowcount == 1:
+            return True
+
+    statement = (
+        update(ClientQuota)
+        .where(ClientQuota.client == client)
+        .where(ClientQuota.used < settings.QUOTA_LIMIT)
+        .values(used=ClientQuota.used + 1)
+    )
+    result = session.exec(statement)
+    session.commit()
+    return result.rowcount == 1
+
+
+def refund(session: Session, client: str | None):
+    """Gives a generation back, e.g. when it failed or the client's note was replaced."""
+    if not client or is_exempt(client):
+        return
+    statement = (
+        update(ClientQuota)
+        .where(ClientQuota.client == client)
+        .where(ClientQuota.used > 0)
+        .values(used=ClientQuota.used - 1)
+    )
+    session.exec(statement)
+    session.commit()
@@ -0,0 +1,161 @@
+"""
+Server-side rendering of note Markdown.
+
+Each note is rendered once when it is saved: sanitized HTML with
+syntax-highlighted code blocks and heading anchors, plus a structured
+table of contents. Clients display the stored result as-is.
+"""
+import html
+import json
+import re
+from dataclasses import dataclass, field
+from functools import cache
+from sqlmodel import Session
+from app.models import Note, NoteRendered, TocEntry
+from app.services.note_content import compress_body, decompress_body, load_note_content
+
+# Bump when the output changes; older stored renders are redone on read
+RENDER_VERSION = 1
+
+TOC_MAX_LEVEL = 3
+CODE_STYLE = "github-dark"
+
+
+ALLOWED_TAGS = {
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "br", "hr", "blockquote",
+    "ul", "ol", "li", "strong", "em", "s", "del", "code", "pre", "span", "div",
+    "a", "img", "table", "thead", "tbody", "tr", "th", "td", "button",
+}
+ALLOWED_ATTRIBUTES = {
+    "*": {"class", "id"},
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title"},
+    "span": {"style"},
+    "pre": {"style"},
+    "th": {"style"},
+    "td": {"style"},
+    "ol": {"start"},
+    "button": {"type"},
+}
+ALLOWED_STYLES = {"color", "background-color", "font-weight", "font-style", "text-decoration", "text-align"}
+
+
+@dataclass
+class RenderedMarkdown:
+    html: str
+    toc: list[TocEntry] = field(default_factory=list)
+
+
+def slugify(text: str) -> str:
+    """Heading anchor, same rules the frontend used for in-page links."""
+    text = re.sub(r"[^\w\s-]", "", text.lower())
+    return re.sub(r"\s+", "-", text.strip())
+
+
+@cache
+def _formatter():
+    from pygments.formatters import HtmlFormatter
+
+    # Inline styles, so the HTML needs no stylesheet from the client
+    return HtmlFormatter(style=CODE_STYLE, noclasses=True, nowrap=True)
+
+
+def _render_fence(self, tokens, idx, options, env) -> str:
+    """Code block with a language label and a copy button, highlighted by Pygments."""
+    from pygments import highlight
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    token = tokens[idx]
+    language = token.info.strip().split(maxsplit=1)[0] if token.info.strip() else ""
+    formatter = _formatter()
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        body = html.escape(token.content)
+    else:
+        body = highlight(token.content, lexer, formatter)
+    label = f'<span class="code-language">{html.escape(language)}</span>' if language else ""
+    return (
+        f'<div class="code-block">{label}<button type="button" class="copy-code">Copy</button>'
+        f'<pre style="background-color: {formatter.style.background_color}"><code>{body}</code></pre></div>\n'
+    )
+
+
+@cache
+def get_markdown():
+    """
+    The Markdown parser, built on first use: markdown-it, Pygments and nh3
+    are only imported once a note is rendered, not at boot.
+    """
+    from markdown_it import MarkdownIt
+
+    # Raw HTML in the Markdown is escaped, not passed through
+    markdown = MarkdownIt("commonmark", {"html": False}).enable(["table", "strikethrough"])
+    markdown.add_render_rule("fence", _render_fence)
+    return markdown
+
+
+def render_markdown(text: str) -> RenderedMarkdown:
+    """Markdown to sanitized HTML, with ids on every heading and a TOC of levels 1-3."""
+    import nh3
+
+    markdown = get_markdown()
+    tokens = markdown.parse(text)
+    toc = []
+    seen: dict[str, int] = {}
+    for i, token in enumerate(tokens):
+        if token.type != "heading_open":
+            continue
+        title = "".join(
+            child.content for child in tokens[i + 1].children or [] if child.type in ("text", "code_inline")
+        ).strip()
+        anchor = slugify(title) or "section"
+        # Repeated headings get -1, -2, ... like GitHub
+        if anchor in seen:
+            seen[anchor] += 1
+            anchor = f"{anchor}-{seen[anchor]}"
+        else:
+            seen[anchor] = 0
+        token.attrSet("id", anchor)
+        level = int(token.tag[1])
+        if level <= TOC_MAX_LEVEL:
+            toc.append(TocEntry(level=level, text=title, anchor=anchor))
+
+    rendered = markdown.renderer.render(tokens, markdown.options, {})
+    clean = nh3.clean(
+        rendered,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        filter_style_properties=ALLOWED_STYLES,
+        url_schemes={"http", "https", "mailto"},
+        link_rel="noopener noreferrer nofollow",
+    )
+    return RenderedMarkdown(html=clean, toc=toc)
+
+
+def save_rendered(session: Session, note: Note, rendered: RenderedMarkdown):
+    """Stores a note's rendered HTML and TOC (caller commits)."""
+    session.merge(NoteRendered(
+        note_id=note.id,
+        html=compress_body(rendered.html),
+        toc=json.dumps([entry.model_dump() for entry in rendered.toc]),
+        version=RENDER_VERSION,
+    ))
+
+
+def load_rendered(session: Session, note: Note) -> RenderedMarkdown:
+    """
+    The note's stored render. Notes saved before rendering existed, or with
+    an older RENDER_VERSION, are rendered now and stored for next time.
+    """
+    stored = session.get(NoteRendered, note.id)
+    if stored is not None and stored.version == RENDER_VERSION:
+        toc = [TocEntry.model_validate(entry) for entry in json.loads(stored.toc)]
+        return RenderedMarkdown(html=decompress_body(stored.html), toc=toc)
+
+    rendered = render_markdown(load_note_content(session, note) or "")
+    save_rendered(session, note, rendered)
+    session.commit()
+    return rendered
+
@@ -0,0 +1,178 @@
+"""
+Full-text search over notes.
+
+The index lives next to the notes: an FTS5 table on SQLite, a tsvector
+column with a GIN index on Postgres. Both are contentless (bodies are only
+stored compressed in NoteContent), so note_content updates the index
+whenever a note is saved or deleted, and snippets are cut in Python from
+the decompressed bodies of the few notes on the result page.
+"""
+import html
+import re
+from sqlalchemy import DDL, event, literal_column, table, text
+from sqlmodel import Session, SQLModel, select
+from app.models import Note
+
+# SQLite: contentless FTS5 keyed by note id (rowid), title ranked above body
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS note_search USING fts5("
+        "title, body, content='', tokenize='porter unicode61')"
+    ).execute_if(dialect="sqlite"),
+)
+
+# Postgres: weighted tsvector per note with a GIN index
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS note_search ("
+        "note_id INTEGER PRIMARY KEY REFERENCES note(id) ON DELETE CASCADE, "
+        "document tsvector NOT NULL)"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_note_search_document ON note_search USING GIN (document)"
+    ).execute_if(dialect="postgresql"),
+)
+
+event.listen(SQLModel.metadata, "before_drop", DDL("DROP TABLE IF EXISTS note_search"))
+
+TERM = re.compile(r"\w+", re.UNICODE)
+SNIPPET_CHARS = 240
+
+
+def _terms(query: str) -> list[str]:
+    return [t.lower() for t in TERM.findall(query)]
+
+
+def _dialect(session: Session) -> str:
+    return session.get_bind().dialect.name
+
+
+def _is_indexed(session: Session, note_id: int) -> bool:
+    column = "rowid" if _dialect(session) == "sqlite" else "note_id"
+    statement = text(f"SELECT 1 FROM note_search WHERE {column} = :id")
+    return session.execute(statement, {"id": note_id}).first() is not None
+
+
+def index_note(session: Session, note: Note, body: str):
+    """Adds a note to the search index (caller commits)."""
+    index_notes(session, [(note, body)])
+
+
+def index_notes(session: Session, notes: list[tuple[Note, str]]):
+    """Adds (note, body) pairs to the search index in one executemany (caller commits)."""
+    if not notes:
+        return
+    if _dialect(session) == "sqlite":
+        statement = text("INSERT INTO note_search (rowid, title, body) VALUES (:id, :title, :body)")
+    else:
+        statement = text(
+            "INSERT INTO note_search (note_id, document) VALUES (:id, "
+            "setweight(to_tsvector('english', :title), 'A') || "
+            "setweight(to_tsvector('english', :body), 'B')) "
+            "ON CONFLICT (note_id) DO UPDATE SET document = EXCLUDED.document"
+        )
+    session.execute(
+        statement, [{"id": note.id, "title": note.title or "", "body": body} for note, body in notes]
+    )
+
+
+def unindex_note(session: Session, note: Note, body: str):
+    """
+    Removes a note from the search index (caller commits). A contentless
+    FTS5 table can only delete a row given the exact text it indexed, so
+    the body has to be passed in.
+    """
+    if _dialect(session) != "sqlite":
+        session.execute(text("DELETE FROM note_search WHERE note_id = :id"), {"id": note.id})
+        return
+    if not _is_indexed(session, note.id):
+        return
+    statement = text(
+        "INSERT INTO note_search (note_search, rowid, title, body) VALUES ('delete', :id, :title, :body)"
+    )
+    session.execute(statement, {"id": note.id, "title": note.title or "", "body": body})
+
+
+def search_note_ids(session: Session, query: str, limit: int) -> list[tuple[int, float]]:
+    """(note id, score) of the best matches, best first. Every term must match."""
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    if _dialect(session) == "sqlite":
+        # Quoted terms so user input is never parsed as FTS5 syntax; the last
+        # one is a prefix so results show up while typing
+        match = " ".join(f'"{t}"' for t in terms) + "*"
+        statement = text(
+            "SELECT rowid, bm25(note_search, 5.0, 1.0) AS score FROM note_search "
+            "WHERE note_search MATCH :match ORDER BY score LIMIT :limit"
+        )
+        rows = session.execute(statement, {"match": match, "limit": limit}).all()
+        # bm25 is lower-is-better and negative, flip it so higher is better
+        return [(row[0], -row[1]) for row in rows]
+
+    statement = text(
+        "SELECT note_id, ts_rank(document, query) AS score "
+        "FROM note_search, to_tsquery('english', :query) query "
+        "WHERE document @@ query ORDER BY score DESC LIMIT :limit"
+    )
+    rows = session.execute(statement, {"query": tsquery(terms), "limit": limit}).all()
+    return [(row[0], row[1]) for row in rows]
+
+
+def tsquery(terms: list[str]) -> str:
+    """
+    to_tsquery input matching like the FTS5 query: every term, the last one
+    as a prefix. Terms are word characters only, quoted so none is read as
+    tsquery syntax.
+    """
+    return " & ".join(f"'{t}'" for t in terms) + ":*"
+
+
+def make_snippet(body: str, query: str) -> str:
+    """
+    HTML-escaped excerpt of the body around the first query match, with
+    matches wrapped in <mark>. Terms are matched by prefix so stemmed index
+    hits (e.g. "caching" for "cache") are still highlighted.
+    """
+    flat = " ".join(body.split())
+    stems = sorted({t[: max(3, len(t) - 2)] for t in _terms(query)}, key=len, reverse=True)
+    if not stems:
+        return html.escape(flat[:SNIPPET_CHARS])
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(s) for s in stems) + r")\w*", re.IGNORECASE)
+
+    first = pattern.search(flat)
+    center = first.start() if first else 0
+    start = max(0, center - SNIPPET_CHARS // 3)
+    end = min(len(flat), start + SNIPPET_CHARS)
+    # Cut on word boundaries
+    if start > 0 and (space := flat.find(" ", start, center)) != -1:
+        start = space + 1
+    if end < len(flat) and (space := flat.rfind(" ", start, end)) > center:
+        end = space
+
+    excerpt = flat[start:end]
+    parts = []
+    position = 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(html.escape(excerpt[position:]))
+
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(flat) else "")
+
+
+def unindexed_notes(session: Session, limit: int) -> list[Note]:
+    """Notes missing from the index, e.g. saved before it existed."""
+    column = literal_column("rowid" if _dialect(session) == "sqlite" else "note_id")
+    indexed = select(column).select_from(table("note_search"))
+    return session.exec(select(Note).where(Note.id.not_in(indexed)).limit(limit)).all()
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, update
+from app.models import GenerationLock
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    In-process single-flight: concurrent callers with the same key share one
+    execution. The first caller starts the work; later callers await the same
+    task instead of starting their own.
+
+    Callers are counted: one going away (e.g. its client disconnected) does
+    not cancel the shared work, but when the last one does nobody needs the
+    result and the work is cancelled.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+
+    def is_inflight(self, key: str) -> bool:
+        return key in self._inflight
+
+    def waiters(self, key: str) -> int:
+        return self._waiters.get(key, 0)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None or task.cancelling():
+            # (a task being cancelled for lack of waiters cannot be joined)
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield: one caller being cancelled must not cancel the shared work
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    task.cancel()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def claim_generation(session: Session, video_id: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Tries to take the DB-backed generation lock for a video, so only one
+    worker/node generates it at a time. Expired locks (a crashed holder)
+    are taken over. Returns True if the caller now holds the lock.
+    """
+    now = _utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    session.add(GenerationLock(video_id=video_id, owner=owner, expires_at=expires_at))
+    try:
+        session.commit()
+        return True
+    except IntegrityError:
+        session.rollback()
+
+    statement = (
+        update(GenerationLock)
+        .where(GenerationLock.video_id == video_id)
+        .where(GenerationLock.expires_at < now)
+        .values(owner=owner, expires_at=expires_at)
+    )
+    result = session.exec(statement)
+    session.commit()
+    return result.rowcount == 1
+
+
+def renew_generation(session: Session, video_id: str, owner: str, ttl_seconds: int):
+    """Pushes the lock expiry forward while the holder is still working."""
+    statement = (
+        update(GenerationLock)
+        .where(GenerationLock.video_id == video_id)
+        .where(GenerationLock.owner == owner)
+        .values(expires_at=_utcnow() + timedelta(seconds=ttl_seconds))
+    )
+    session.exec(statement)
+    session.commit()
+
+
+def release_generation(session: Session, video_id: str, owner: str):
+    statement = (
+        delete(GenerationLock)
+        .where(GenerationLock.video_id == video_id)
+        .where(GenerationLock.owner == owner)
+    )
+    session.exec(statement)
+    session.commit()
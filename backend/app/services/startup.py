@@ -0,0 +1,48 @@
+"""
+Cold-start timing.
+
+Records how long each phase of a boot took, from the first import of the
+app to the end of the background warm-up, so the cost of a cold start
+(the free plan sleeps idle instances) is visible in the logs and on
+GET /health.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Imported first thing by app.main, so this is when the app started loading
+_started = time.perf_counter()
+
+phases: dict[str, float] = {}
+ready = False  # set once the lifespan startup is done and requests are served
+warm = False  # set once the background warm-up has finished
+
+
+def since_start() -> float:
+    return round(time.perf_counter() - _started, 3)
+
+
+def mark(name: str):
+    """Records a phase as ending now, measured from the start of the app."""
+    phases[name] = since_start()
+
+
+@contextmanager
+def phase(name: str):
+    """Times a block as a phase of its own."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = round(time.perf_counter() - started, 3)
+
+
+def report() -> dict:
+    return {"ready": ready, "warm": warm, "uptime_seconds": since_start(), "phases": dict(phases)}
+
+
+def log_report(label: str):
+    timings = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in phases.items())
+    logger.info(f"{label} in {since_start():.3f}s ({timings})")
@@ -1,10 +1,11 @@
 import re
-from youtube_transcript_api import (
-    YouTubeTranscriptApi,
-    TranscriptsDisabled,
-    NoTranscriptFound,
-)
+import json
+import zlib
+import threading
 from fastapi import HTTPException
+from sqlmodel import Session
+from app.config import settings
+from app.models import Transcript
 
 
 VIDEO_ID_REGEX = re.compile(r"(?:v=|\/live\/|\/shorts\/|\/embed\/|\/v\/|youtu\.be\/)([0-9A-Za-z_-]{11})")
@@ -21,14 +22,57 @@ def extract_video_id(url: str) -> str:
     return match.group(1)
 
 
+BARE_VIDEO_ID_REGEX = re.compile(r"[0-9A-Za-z_-]{11}")
+
+
+def video_url(item: str) -> str:
+    """Turns a bare 11-character video ID into a watch URL; anything else is returned as-is."""
+    item = item.strip()
+    if BARE_VIDEO_ID_REGEX.fullmatch(item):
+        return f"https://www.youtube.com/watch?v={item}"
+    return item
+
+
+def _build_api():
+    """One API client per process over a pooled HTTP session (keep-alive to YouTube)."""
+    # Imported here rather than at boot: requests and youtube_transcript_api
+    # are only needed once a transcript is actually fetched
+    from requests import Session as HTTPSession
+    from requests.adapters import HTTPAdapter
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    http_client = HTTPSession()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.TRANSCRIPT_HTTP_POOL_SIZE)
+    http_client.mount("https://", adapter)
+    http_client.mount("http://", adapter)
+    return YouTubeTranscriptApi(http_client=http_client)
+
+
+# Shared client to avoid re-instantiation (and new connections) on every request
+transcript_api = None
+_transcript_api_lock = threading.Lock()
+
+
+def get_transcript_api():
+    """The shared transcript client, built on first use."""
+    global transcript_api
+    if transcript_api is None:
+        with _transcript_api_lock:
+            if transcript_api is None:
+                transcript_api = _build_api()
+    return transcript_api
+
+
 def get_raw_transcript(video_id: str) -> list[dict]:
     """
     Fetches the transcript for a given video ID and returns the raw list of segments.
     Each segment is a dict: {'text': '...', 'start': ..., 'duration': ...}
+    This does network I/O; call it from a thread in async code.
     """
+    from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
+
     try:
-        api = YouTubeTranscriptApi()
-        transcript_list = api.fetch(video_id)
+        transcript_list = get_transcript_api().fetch(video_id, languages=[settings.TRANSCRIPT_LANGUAGE])
         # Convert FetchedTranscriptSnippet objects to dicts
         return [{"text": item.text, "start": item.start, "duration": item.duration} for item in transcript_list]
     except TranscriptsDisabled:
@@ -43,3 +87,23 @@ def get_raw_transcript(video_id: str) -> list[dict]:
         raise HTTPException(
             status_code=500, detail=f"Error fetching transcript: {str(e)}"
         )
+
+
+def load_transcript(session: Session, video_id: str, language: str) -> list[dict] | None:
+    """Returns stored segments for (video_id, language), or None if not stored yet."""
+    stored = session.get(Transcript, (video_id, language))
+    if stored is None:
+        return None
+    return json.loads(zlib.decompress(stored.segments))
+
+
+def save_transcript(session: Session, video_id: str, language: str, segments: list[dict]):
+    """Stores segments as zlib-compressed JSON so repeat requests skip YouTube."""
+    data = zlib.compress(json.dumps(segments, separators=(",", ":")).encode("utf-8"))
+    session.merge(Transcript(
+        video_id=video_id,
+        language=language,
+        segments=data,
+        segment_count=len(segments),
+    ))
+    session.commit()
@@ -0,0 +1,154 @@
+"""
+Bulk export and import of the notes corpus as NDJSON, one NoteExport per line.
+
+Export reads plain rows through a server-side cursor (yield_per, a named
+cursor on Postgres) one batch at a time, so memory stays flat however many
+notes there are. Import inserts in batched transactions and skips video_ids
+that are already stored, so it can be re-run after an interruption.
+
+Also a command line tool, e.g. to move notes from SQLite to Postgres:
+
+    DATABASE_URL=sqlite:///./notes.db python -m app.services.transfer export notes.ndjson.gz
+    DATABASE_URL=postgresql://... python -m app.services.transfer import notes.ndjson.gz
+"""
+import argparse
+import gzip
+import sys
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlmodel import Session, select
+from app.models import Note, NoteContent, NoteExport
+from app.services.note_content import compress_body, decompress_body
+from app.services.search import index_notes
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+
+
+def export_lines(session: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Every note as NDJSON, oldest first, one chunk of batch_size lines at a time."""
+    statement = (
+        select(
+            Note.video_id, Note.url, Note.title, Note.input_tokens, Note.output_tokens,
+            Note.generation_cost, Note.created_at, Note.user_ip, NoteContent.body,
+        )
+        .outerjoin(NoteContent, NoteContent.note_id == Note.id)
+        .order_by(Note.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in session.exec(statement).partitions():
+        lines = []
+        for row in rows:
+            note = NoteExport(
+                video_id=row.video_id,
+                url=row.url,
+                title=row.title,
+                input_tokens=row.input_tokens,
+                output_tokens=row.output_tokens,
+                generation_cost=row.generation_cost,
+                created_at=row.created_at,
+                user_ip=row.user_ip,
+                content=decompress_body(row.body) if row.body is not None else None,
+            )
+            lines.append(note.model_dump_json())
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compresses a stream of chunks into one gzip stream as it goes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    skipped: int = 0  # video_id already stored, or repeated in the input
+
+
+def _import_batch(session: Session, items: dict[str, NoteExport], result: ImportResult):
+    existing = set(session.exec(select(Note.video_id).where(Note.video_id.in_(list(items)))).all())
+    notes = [
+        (Note.model_validate(item.model_dump(exclude={"content"})), item.content)
+        for video_id, item in items.items()
+        if video_id not in existing
+    ]
+    # One flush inserts the notes and returns their ids (multi-row INSERT ... RETURNING)
+    session.add_all(note for note, _ in notes)
+    session.flush()
+    session.add_all(
+        NoteContent(note_id=note.id, body=compress_body(content)) for note, content in notes if content is not None
+    )
+    index_notes(session, [(note, content or "") for note, content in notes])
+    session.commit()
+    # Nothing from a finished batch is needed again
+    session.expunge_all()
+    result.inserted += len(notes)
+    result.skipped += len(existing)
+
+
+def import_lines(
+    session: Session, lines: Iterable[bytes | str], batch_size: int = IMPORT_BATCH_SIZE
+) -> ImportResult:
+    """
+    Inserts the notes of an NDJSON export, batch_size per transaction.
+    Notes whose video_id is already stored are skipped. Raises ValueError
+    on a malformed line; batches before it stay committed.
+    """
+    result = ImportResult()
+    batch: dict[str, NoteExport] = {}
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = NoteExport.model_validate_json(line)
+        except ValidationError as e:
+            raise ValueError(f"Line {number}: {e}") from e
+        if item.video_id in batch:
+            result.skipped += 1
+            continue
+        batch[item.video_id] = item
+        if len(batch) >= batch_size:
+            _import_batch(session, batch, result)
+            batch = {}
+    if batch:
+        _import_batch(session, batch, result)
+    return result
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        return sys.stdout.buffer if "w" in mode else sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6)
+    return open(path, mode)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Export or import notes as NDJSON (gzip if the file ends in .gz).")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="file to write or read, - for stdout/stdin")
+    parser.add_argument("--batch-size", type=int, help="notes per cursor fetch / import transaction")
+    args = parser.parse_args(argv)
+
+    from app.db import create_db_and_tables, engine
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        if args.command == "export":
+            with _open(args.path, "wb") as out:
+                for chunk in export_lines(session, args.batch_size or EXPORT_BATCH_SIZE):
+                    out.write(chunk)
+        else:
+            with _open(args.path, "rb") as source:
+                result = import_lines(session, source, args.batch_size or IMPORT_BATCH_SIZE)
+            print(f"Imported {result.inserted} notes, skipped {result.skipped} already present", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Fake Azure OpenAI chat completions server for offline benchmarks.
+
+Serves POST /openai/deployments/{deployment}/chat/completions (the path
+AsyncAzureOpenAI calls) with configurable latency, output speed and
+RPM/TPM quotas that answer 429 + Retry-After like Azure does.
+
+Run standalone:  python -m benchmarks.fake_openai --port 8001 --rpm 300
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeServerConfig:
+    # Time to first token: "fixed", "uniform" (0..2x median) or "lognormal"
+    latency: str = "lognormal"
+    latency_median: float = 1.0  # seconds
+    latency_sigma: float = 0.5  # lognormal shape, larger = longer tail
+    tokens_per_second: float = 80.0  # output generation speed
+    output_ratio: float = 0.5  # completion tokens per prompt token
+    max_output_tokens: int = 4096
+    rpm: int = 0  # 0 = unlimited
+    tpm: int = 0
+    seed: int = 0
+
+
+@dataclass
+class FakeServerStats:
+    requests: int = 0
+    rate_limited: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # (timestamp, tokens) of admitted requests in the last minute
+    window: deque = field(default_factory=deque)
+
+
+def _count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def create_app(config: FakeServerConfig) -> FastAPI:
+    app = FastAPI()
+    app.state.config = config
+    app.state.stats = FakeServerStats()
+    rng = random.Random(config.seed)
+
+    def first_token_delay() -> float:
+        if config.latency == "fixed":
+            return config.latency_median
+        if config.latency == "uniform":
+            return rng.uniform(0, 2 * config.latency_median)
+        return rng.lognormvariate(math.log(config.latency_median), config.latency_sigma)
+
+    def admit(tokens: int) -> float | None:
+        """Applies the quota; returns Retry-After seconds when over it."""
+        stats = app.state.stats
+        now = time.monotonic()
+        while stats.window and now - stats.window[0][0] >= 60:
+            stats.window.popleft()
+        used_requests = len(stats.window)
+        used_tokens = sum(t for _, t in stats.window)
+        over = (config.rpm and used_requests >= config.rpm) or (
+            config.tpm and used_tokens + tokens > config.tpm
+        )
+        if over:
+            oldest = stats.window[0][0] if stats.window else now
+            return max(1.0, math.ceil(60 - (now - oldest)))
+        stats.window.append((now, tokens))
+        return None
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        stats = app.state.stats
+        stats.requests += 1
+
+        prompt = "".join(m.get("content") or "" for m in body.get("messages", []))
+        prompt_tokens = _count_tokens(prompt)
+        completion_tokens = min(config.max_output_tokens, max(1, int(prompt_tokens * config.output_ratio)))
+
+        retry_after = admit(prompt_tokens + completion_tokens)
+        if retry_after is not None:
+            stats.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(int(retry_after))},
+                content={"error": {"code": "429", "message": "Rate limit is exceeded."}},
+            )
+
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        content = ("### Notes\n" + "- **term** explained in detail\n" * completion_tokens)[: completion_tokens * 4]
+        base = {"id": f"chatcmpl-{stats.requests}", "created": int(time.time()), "model": deployment}
+
+        await asyncio.sleep(first_token_delay())
+
+        if not body.get("stream"):
+            await asyncio.sleep(completion_tokens / config.tokens_per_second)
+            return {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        async def events():
+            piece = 80  # characters (~20 tokens) per chunk
+            for i in range(0, len(content), piece):
+                await asyncio.sleep((piece / 4) / config.tokens_per_second)
+                chunk = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + piece]}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            if include_usage:
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def read_stats():
+        stats = app.state.stats
+        return {
+            "requests": stats.requests,
+            "rate_limited": stats.rate_limited,
+            "prompt_tokens": stats.prompt_tokens,
+            "completion_tokens": stats.completion_tokens,
+        }
+
+    return app
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeServerConfig()
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default=defaults.latency)
+    parser.add_argument("--latency-median", type=float, default=defaults.latency_median)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--output-ratio", type=float, default=defaults.output_ratio)
+    parser.add_argument("--rpm", type=int, default=defaults.rpm)
+    parser.add_argument("--tpm", type=int, default=defaults.tpm)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_arguments(args: argparse.Namespace) -> FakeServerConfig:
+    return FakeServerConfig(
+        latency=args.latency,
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        output_ratio=args.output_ratio,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_arguments(args)), host="127.0.0.1", port=args.port)
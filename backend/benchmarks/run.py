@@ -0,0 +1,218 @@
+"""
+Offline benchmark for the note generation pipeline.
+
+Starts the fake Azure OpenAI server in-process, points the app's client
+at it and runs generate_notes_map_reduce over synthetic transcripts.
+Results are printed as JSON (or written with --output) so runs can be
+diffed when changing chunking, concurrency or reduce strategy.
+
+    python -m benchmarks.run --durations 5,60,180,600 --rpm 300 --tpm 150000
+
+Pipeline settings (LLM_MAP_CHUNK_TOKENS, LLM_MAX_IN_FLIGHT, ...) are read
+from the environment like the app does, e.g.
+    LLM_MAP_CHUNK_TOKENS=3000 python -m benchmarks.run
+    LLM_HEDGE_PERCENTILE=90 python -m benchmarks.run --latency-sigma 1.0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+# The app builds its Azure client and cache at import; give it harmless
+# values before importing anything from app.
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import uvicorn
+from prometheus_client import REGISTRY
+from app.config import settings
+from app.services import ai
+from app.services.chunking import plan_chunks
+from app.services.normalize import NormalizeStats, normalize_segments
+from benchmarks.fake_openai import add_server_arguments, config_from_arguments, create_app
+from benchmarks.transcripts import auto_captions, synthetic_transcript
+
+
+def hedges(result: str) -> int:
+    return int(REGISTRY.get_sample_value("llm_hedges_total", {"result": result}) or 0)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+async def start_server(args) -> tuple[uvicorn.Server, asyncio.Task, str]:
+    fake_app = create_app(config_from_arguments(args))
+    server = uvicorn.Server(uvicorn.Config(fake_app, host="127.0.0.1", port=args.port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def run_benchmark(args) -> dict:
+    server, server_task, base_url = await start_server(args)
+    fake_stats = server.config.app.state.stats
+
+    # Every configured deployment (LLM_DEPLOYMENTS, AZURE_MAP_DEPLOYMENT_NAME, ...) points at the fake server
+    ai.router = ai.build_router([
+        config.model_copy(update={"endpoint": base_url, "api_key": "benchmark"})
+        for config in ai._deployment_configs()
+    ])
+
+    # Client-side latency of every LLM call, including scheduler queueing and retries
+    latencies: list[float] = []
+    call_llm = ai._call_llm
+
+    async def timed_call_llm(*call_args, **call_kwargs):
+        started = time.perf_counter()
+        try:
+            return await call_llm(*call_args, **call_kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    ai._call_llm = timed_call_llm
+
+    results = []
+    tracemalloc.start()
+    try:
+        for minutes in args.durations:
+            transcripts = [synthetic_transcript(minutes, seed=args.seed + i) for i in range(args.concurrency)]
+            if args.auto_captions:
+                transcripts = [auto_captions(t, seed=args.seed + i) for i, t in enumerate(transcripts)]
+            raw_chars = sum(len(s["text"]) + 1 for s in transcripts[0])
+            # The app normalises between fetching and chunking; so does the benchmark
+            normalized = NormalizeStats()
+            if settings.TRANSCRIPT_NORMALIZE:
+                transcripts, all_stats = zip(*(normalize_segments(t) for t in transcripts))
+                normalized = all_stats[0]
+            plan = plan_chunks(
+                transcripts[0],
+                chunk_tokens=settings.LLM_MAP_CHUNK_TOKENS,
+                single_call_tokens=settings.LLM_SINGLE_CALL_TOKENS,
+                reduce_tokens=settings.LLM_REDUCE_INPUT_TOKENS,
+            )
+
+            latencies.clear()
+            requests_before = fake_stats.requests
+            limited_before = fake_stats.rate_limited
+            hedges_before = {result: hedges(result) for result in ("won", "lost")}
+            tracemalloc.reset_peak()
+
+            started = time.perf_counter()
+            results_or_errors = await asyncio.gather(
+                *[ai.generate_notes_map_reduce(t) for t in transcripts], return_exceptions=True
+            )
+            outputs = [r for r in results_or_errors if not isinstance(r, BaseException)]
+            wall = time.perf_counter() - started
+
+            _, peak = tracemalloc.get_traced_memory()
+            stats = [cost for _, cost in outputs]
+            record = {
+                "duration_minutes": minutes,
+                "concurrency": args.concurrency,
+                "segments": len(transcripts[0]),
+                "transcript_chars": raw_chars,
+                "normalized_chars_removed": normalized.chars_removed,
+                "normalized_tokens_removed": normalized.tokens_removed,
+                "planned_calls": plan.expected_calls * args.concurrency,
+                "planned_prompt_tokens": plan.expected_tokens * args.concurrency,
+                "wall_seconds": round(wall, 3),
+                "llm_calls": len(latencies),
+                "server_requests": fake_stats.requests - requests_before,
+                "rate_limited": fake_stats.rate_limited - limited_before,
+                "hedges": sum(hedges(result) - hedges_before[result] for result in ("won", "lost")),
+                "hedges_won": hedges("won") - hedges_before["won"],
+                "input_tokens": sum(s["input_tokens"] for s in stats),
+                "output_tokens": sum(s["output_tokens"] for s in stats),
+                "cost": round(sum(s["cost"] for s in stats), 6),
+                "errors": len(results_or_errors) - len(outputs),
+                "peak_memory_mb": round(peak / 1024 / 1024, 2),
+                "latency_p50": round(percentile(latencies, 50), 3),
+                "latency_p99": round(percentile(latencies, 99), 3),
+            }
+            results.append(record)
+            print(
+                f"{minutes:>6} min x{args.concurrency}: {record['wall_seconds']}s, "
+                f"{record['llm_calls']} calls, {record['rate_limited']} x 429, "
+                f"p50 {record['latency_p50']}s p99 {record['latency_p99']}s",
+                file=sys.stderr,
+            )
+    finally:
+        tracemalloc.stop()
+        ai._call_llm = call_llm
+        server.should_exit = True
+        await server_task
+
+    return {
+        "server": vars(config_from_arguments(args)),
+        "pipeline": {
+            name: getattr(settings, name)
+            for name in (
+                "LLM_MAP_CHUNK_TOKENS",
+                "LLM_SINGLE_CALL_TOKENS",
+                "LLM_REDUCE_INPUT_TOKENS",
+                "LLM_MAX_IN_FLIGHT",
+                "LLM_REQUESTS_PER_MINUTE",
+                "LLM_TOKENS_PER_MINUTE",
+                "LLM_MAX_RETRIES",
+                "TRANSCRIPT_NORMALIZE",
+                "LLM_HEDGE_PERCENTILE",
+            )
+        },
+        "deployments": [
+            {"name": d.name, "deployment": d.deployment, "stages": d.stages, "latency": d.latency}
+            for d in ai.router.deployments
+        ],
+        "results": results,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--durations",
+        type=lambda value: [float(v) for v in value.split(",")],
+        default=[5, 30, 60, 180, 600],
+        help="comma-separated transcript lengths in minutes (default 5,30,60,180,600)",
+    )
+    parser.add_argument("--concurrency", type=int, default=1, help="generations run at once per duration")
+    parser.add_argument(
+        "--auto-captions",
+        action="store_true",
+        help="use rolling auto-caption style transcripts (repeats, fillers, [Music]) to measure normalisation",
+    )
+    parser.add_argument("--port", type=int, default=0, help="fake server port (0 = any free port)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's and httpx's INFO logs")
+    add_server_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
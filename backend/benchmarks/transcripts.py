@@ -0,0 +1,55 @@
+import random
+
+# Small technical vocabulary so chunks look like lecture captions
+WORDS = (
+    "so the function takes a list and returns the index of the first element "
+    "we then iterate over each item in the array and compare it with the target "
+    "this gives us linear time complexity but we can do better with binary search "
+    "the tree is balanced which means every lookup is logarithmic in the number of nodes "
+    "here the cache stores the result keyed by the input so repeated calls are cheap "
+    "the database query uses an index on the created at column to avoid a full scan"
+).split()
+
+SEGMENT_SECONDS = 3.0
+WORDS_PER_SEGMENT = (6, 10)  # ~150 spoken words per minute
+FILLERS = ("um", "uh", "hmm")
+MARKERS = ("[Music]", "[Applause]", "[Laughter]")
+
+
+def synthetic_transcript(minutes: float, seed: int = 0) -> list[dict]:
+    """
+    Deterministic fake YouTube transcript of the given length, in the same
+    {'text', 'start', 'duration'} shape get_raw_transcript returns.
+    Some segments end a sentence, most do not (like auto-captions).
+    """
+    rng = random.Random(seed)
+    segments = []
+    start = 0.0
+    while start < minutes * 60:
+        count = rng.randint(*WORDS_PER_SEGMENT)
+        text = " ".join(rng.choice(WORDS) for _ in range(count))
+        if rng.random() < 0.2:
+            text += "."
+        segments.append({"text": text, "start": round(start, 2), "duration": SEGMENT_SECONDS})
+        start += SEGMENT_SECONDS
+    return segments
+
+
+def auto_captions(segments: list[dict], seed: int = 0) -> list[dict]:
+    """
+    The same speech as YouTube auto-captions deliver it: each caption
+    repeats the tail of the one before (rolling lines), with hesitations
+    and the occasional non-speech marker mixed in.
+    """
+    rng = random.Random(seed)
+    captions = []
+    previous: list[str] = []
+    for segment in segments:
+        words = segment["text"].split()
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(FILLERS))
+        if rng.random() < 0.05:
+            words.append(rng.choice(MARKERS))
+        captions.append({**segment, "text": " ".join(previous[-rng.randint(3, 6):] + words)})
+        previous = words
+    return captions
@@ -0,0 +1,44 @@
+from unittest.mock import patch
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.main import app, get_read_session, get_session
+import pytest
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
+    """
+    A fresh SQLite file per test. Not shared-cache memory: there, concurrent
+    writers (background jobs, the job status writer) fail with "table is
+    locked" instead of waiting.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+    """
+    A session to seed and check the test database through, with the app
+    pointed at the same database: requests and background work (jobs, the
+    stream, the export) read and write it through their usual engines.
+    """
+    # NullPool: an aiosqlite connection is bound to the event loop that opened it
+    async_engine = create_async_engine(engine.url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+
+    async def get_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_session] = get_session_override
+    try:
+        with patch("app.main.engine", engine), patch("app.main.async_engine", async_engine):
+            with Session(engine) as session:
+                yield session
+    finally:
+        app.dependency_overrides.clear()
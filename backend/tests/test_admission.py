@@ -0,0 +1,149 @@
+import asyncio
+from unittest.mock import patch
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from app.config import settings
+from app.main import _own_session, app, generate_note_once
+from app.models import ClientQuota, Note
+from app.services.admission import AdmissionController, Workload, background_admission, estimate_workload
+from app.services.chunking import ChunkPlan
+from app.services.singleflight import claim_generation
+
+client = TestClient(app)
+
+def make_controller(**overrides) -> AdmissionController:
+    options = dict(max_in_flight_tokens=100, max_job_tokens=200, max_queued=10, queue_timeout=5.0)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+def workload(tokens: int, single_call: bool = False) -> Workload:
+    return Workload(segments=1, chars=tokens * 4, plan=ChunkPlan(single_call=single_call, expected_tokens=tokens))
+
+def test_estimate_workload_projects_calls_and_tokens():
+    segments = [{"text": "we add the item to the list and return it", "start": i * 2.0} for i in range(2000)]
+    estimate = estimate_workload(segments)
+    assert estimate.segments == 2000
+    assert estimate.chars == sum(len(s["text"]) + 1 for s in segments)
+    assert estimate.map_calls == estimate.plan.map_calls > 1
+    assert estimate.tokens == estimate.plan.expected_tokens > estimate.plan.input_tokens
+
+def test_jobs_over_the_ceiling_are_refused():
+    async def run():
+        with pytest.raises(HTTPException) as error:
+            async with make_controller().admit(workload(500)):
+                pass
+        return error.value
+    assert asyncio.run(run()).status_code == 413
+
+def test_queues_fifo_and_admits_as_work_finishes():
+    async def run():
+        controller = make_controller()
+        order = []
+        release = asyncio.Event()
+
+        async def job(name: str, tokens: int):
+            async with controller.admit(workload(tokens)):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(job("first", 80))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(job("second", 50)), asyncio.create_task(job("third", 10))]
+        await asyncio.sleep(0.01)
+        # The small third job fits, but does not jump the queue
+        assert order == ["first"] and controller.queued == 2
+
+        release.set()
+        await asyncio.gather(first, *waiting)
+        assert order == ["first", "second", "third"]
+        assert controller.in_flight_tokens == 0 and controller.queued == 0
+    asyncio.run(run())
+
+def test_single_call_jobs_skip_the_queue():
+    async def run():
+        controller = make_controller()
+        async with controller.admit(workload(90)):
+            async with controller.admit(workload(50, single_call=True)):
+                assert controller.in_flight_tokens == 140
+    asyncio.run(run())
+
+def test_interactive_requests_time_out_with_retry_after():
+    async def run():
+        controller = make_controller(queue_timeout=0.01)
+        async with controller.admit(workload(90)):
+            with pytest.raises(HTTPException) as error:
+                async with controller.admit(workload(50)):
+                    pass
+            assert controller.queued == 0
+            # Background work keeps waiting instead
+            background_admission.set(True)
+            waiter = asyncio.create_task(controller.admit(workload(50)).__aenter__())
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+        await waiter
+        return error.value
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) > 0
+
+def test_full_queue_is_rejected_right_away():
+    async def run():
+        controller = make_controller(max_queued=1)
+        async with controller.admit(workload(90)):
+            waiter = asyncio.create_task(controller.admit(workload(50)).__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as error:
+                async with controller.admit(workload(50)):
+                    pass
+            waiter.cancel()
+        return error.value
+    assert asyncio.run(run()).status_code == 503
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_rejected_generation_returns_503_and_refunds_quota(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": f"line {i} about the topic", "start": i, "duration": 1} for i in range(5000)]
+    busy = make_controller(max_in_flight_tokens=1000, max_job_tokens=0, queue_timeout=0.01)
+    busy.in_flight_tokens = 1000  # another long video is running
+
+    with patch("app.main.admission_controller", busy), patch.object(settings, "QUOTA_LIMIT", 1):
+        response = client.post("/notes", json={"url": "http://youtube.com/vid1"})
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+        mock_generate.assert_not_called()
+        # Turned away work is not charged
+        assert session.exec(select(ClientQuota)).one().used == 0
+
+        busy.max_job_tokens = 1000
+        assert client.post("/notes", json={"url": "http://youtube.com/vid1"}).status_code == 413
+
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_generation_lock_is_kept_while_queued_for_admission(mock_generate, mock_transcript, session):
+    mock_transcript.return_value = [{"text": f"line {i} about the topic", "start": i, "duration": 1} for i in range(5000)]
+    mock_generate.return_value = ("Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50})
+    busy = make_controller(max_in_flight_tokens=1000, max_job_tokens=0, queue_timeout=0.01)
+    busy.in_flight_tokens = 1000  # another long video is running
+
+    async def run():
+        token = background_admission.set(True)
+        try:
+            async with _own_session() as own:
+                task = asyncio.create_task(generate_note_once("vid1", "http://youtube.com/vid1", "1.2.3.4", own))
+                # Queued well past the lock TTL, with no progress to report
+                await asyncio.sleep(2.5)
+                assert not task.done()
+                assert not claim_generation(session, "vid1", "other-worker", ttl_seconds=60)
+                busy._release(1000)
+                return await task
+        finally:
+            background_admission.reset(token)
+
+    with patch("app.main.admission_controller", busy), patch.object(settings, "GENERATION_LOCK_TTL_SECONDS", 1):
+        note_id = asyncio.run(run())
+    assert session.get(Note, note_id).video_id == "vid1"
+    mock_generate.assert_called_once()
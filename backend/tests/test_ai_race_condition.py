@@ -1,19 +1,9 @@
-import sys
-import os
 import asyncio
-import pytest
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
-
-# Ensure backend is in path
-sys.path.append(os.path.abspath("backend"))
-
-# Mock dependencies that are missing in the environment
-sys.modules['openai'] = MagicMock()
-sys.modules['langchain_text_splitters'] = MagicMock()
-sys.modules['pydantic_settings'] = MagicMock()
-sys.modules['app.config'] = MagicMock()
-
 from app.services import ai
+from app.services.chunking import Chunk, ChunkPlan
+from app.services.llm_router import Deployment, LLMRouter
 
 def test_race_condition():
     """
@@ -30,13 +20,27 @@ async def _run_async_test():
         mock_response.choices = [MagicMock(message=MagicMock(content="Mocked response"))]
         return mock_response
 
-    # Patch the client instance method used in ai.py
-    ai.client.chat.completions.create.side_effect = delayed_response
-
-    # Patch RecursiveCharacterTextSplitter
-    with patch('app.services.ai.RecursiveCharacterTextSplitter') as MockSplitter:
-        instance = MockSplitter.return_value
-        instance.split_text.return_value = ["chunk1", "chunk2"]
+    # A single deployment whose client answers every call after a delay
+    deployment = Deployment(
+        name="test",
+        deployment="test",
+        stages=("map", "reduce"),
+        client=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=delayed_response))),
+        scheduler=ai.LLMScheduler(
+            requests_per_minute=0, tokens_per_minute=0, max_in_flight=8,
+            max_retries=0, backoff_base=0.0, backoff_max=0.0,
+        ),
+    )
+
+    # Patch the chunk planner to force two map chunks (2 map + 1 reduce call)
+    plan = ChunkPlan(
+        chunks=[Chunk(text="chunk1", start=0.0, tokens=2), Chunk(text="chunk2", start=5.0, tokens=2)],
+        map_calls=2,
+        reduce_calls=1,
+    )
+    with patch('app.services.ai.plan_chunks', return_value=plan), \
+            patch.object(ai, "router", LLMRouter([deployment], cooldown_seconds=0)), \
+            patch.object(ai.settings, "LLM_CACHE_ENABLED", False):
 
         # Run 2 concurrent requests
         segments = [{"text": "video content"}]
@@ -0,0 +1,137 @@
+import asyncio
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.config import settings
+from sqlmodel import Session, select
+from app.main import app, fail_stale_jobs, run_batch
+from app.models import Batch, Job, Note
+from app.services import ai
+
+client = TestClient(app)
+
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_batch_dedupes_skips_stored_and_runs_the_rest(mock_generate, mock_transcript, session):
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+    priorities = []
+
+    async def fake_generate(segments, on_progress=None, **callbacks):
+        priorities.append(ai.llm_priority.get())
+        return "Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50}
+
+    mock_generate.side_effect = fake_generate
+    session.add(Note(video_id="aaaaaaaaaaa", url="https://youtu.be/aaaaaaaaaaa"))
+    session.commit()
+
+    items = [
+        "https://www.youtube.com/watch?v=aaaaaaaaaaa",
+        "bbbbbbbbbbb",
+        "https://youtu.be/bbbbbbbbbbb",
+        "https://www.youtube.com/watch?v=ccccccccccc&list=PL123",
+    ]
+    with patch.object(settings, "QUOTA_LIMIT", 0):
+        response = client.post("/notes/batch", json={"items": items})
+    assert response.status_code == 202
+    batch = response.json()
+    assert response.headers["location"] == f"/notes/batch/{batch['id']}"
+    assert [item["video_id"] for item in batch["items"]] == ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"]
+    assert [item["status"] for item in batch["items"]] == ["done", "queued", "queued"]
+
+    # TestClient runs background tasks before returning, so the batch is finished
+    batch = client.get(f"/notes/batch/{batch['id']}").json()
+    assert batch["status"] == "done"
+    assert (batch["total"], batch["done"], batch["failed"]) == (3, 3, 0)
+    assert all(item["note_id"] for item in batch["items"])
+    assert mock_generate.call_count == 2
+    assert priorities == ["batch", "batch"]
+
+@patch("app.main.generate_notes_map_reduce")
+def test_batch_items_over_quota_fail(mock_generate, session):
+    mock_generate.return_value = ("Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50})
+
+    with patch.object(settings, "QUOTA_LIMIT", 1), patch("app.main.run_batch") as mock_run:
+        response = client.post("/notes/batch", json={"items": ["aaaaaaaaaaa", "bbbbbbbbbbb"]})
+    statuses = [(item["status"], item["error"]) for item in response.json()["items"]]
+    assert statuses[0] == ("queued", None)
+    assert statuses[1][0] == "failed" and "limit" in statuses[1][1]
+    assert len(mock_run.call_args.args[0]) == 1
+
+def test_batch_rejects_invalid_items(session):
+    response = client.post("/notes/batch", json={"items": ["bbbbbbbbbbb", "not a video"]})
+    assert response.status_code == 400
+    assert response.json()["detail"]["invalid"] == ["not a video"]
+
+def test_batch_calls_only_use_their_share_of_slots():
+    scheduler = ai.LLMScheduler(
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_in_flight=4,
+        max_retries=0,
+        backoff_base=0.001,
+        backoff_max=0.01,
+        max_batch_in_flight=1,
+    )
+    peak = {"batch": 0, "interactive": 0}
+    running = {"batch": 0, "interactive": 0}
+
+    async def call():
+        kind = ai.llm_priority.get()
+        running[kind] += 1
+        peak[kind] = max(peak[kind], running[kind])
+        await asyncio.sleep(0.01)
+        running[kind] -= 1
+
+    async def batch_call():
+        ai.llm_priority.set("batch")
+        await scheduler.run(call, estimated_tokens=10)
+
+    async def run_many():
+        await asyncio.gather(
+            *[batch_call() for _ in range(4)],
+            *[scheduler.run(call, estimated_tokens=10) for _ in range(4)],
+        )
+
+    asyncio.run(run_many())
+    assert peak == {"batch": 1, "interactive": 3}
+
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_items_waiting_for_a_slot_are_not_taken_for_stale(mock_generate, mock_transcript, session):
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+
+    async def slow_generate(segments, **callbacks):
+        await asyncio.sleep(0.6)
+        return "Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50}
+
+    mock_generate.side_effect = slow_generate
+    batch = Batch()
+    jobs = [
+        Job(video_id=f"vid{i}", url=f"https://youtu.be/vid{i}", batch_id=batch.id, batch_index=i)
+        for i in range(3)
+    ]
+    # Failed (e.g. taken for stale) before its turn came
+    jobs.append(Job(video_id="vid3", url="https://youtu.be/vid3", batch_id=batch.id, batch_index=3, status="failed"))
+    session.add(batch)
+    session.add_all(jobs)
+    session.commit()
+
+    def poll() -> int:
+        with Session(session.bind) as own:
+            return fail_stale_jobs(own, Job.batch_id == batch.id)
+
+    async def run():
+        task = asyncio.create_task(run_batch([(job.id, job.video_id, job.url) for job in jobs], "1.2.3.4"))
+        # Poll like GET /notes/batch/{id} does while the items run one by one
+        while not task.done():
+            # In a thread, so the event loop keeps running the batch meanwhile
+            assert await asyncio.to_thread(poll) == 0
+            await asyncio.sleep(0.1)
+        await task
+
+    with patch.object(settings, "BATCH_CONCURRENCY", 1), patch.object(settings, "JOB_STALE_SECONDS", 1):
+        asyncio.run(run())
+
+    session.expire_all()
+    statuses = session.exec(select(Job.status).where(Job.batch_id == batch.id).order_by(Job.batch_index)).all()
+    assert statuses == ["done", "done", "done", "failed"]
+    assert mock_generate.call_count == 3
@@ -0,0 +1,48 @@
+from app.services.chunking import estimate_tokens, plan_chunks
+
+
+def make_segments(count: int, text: str = "we add the item to the list and return it") -> list[dict]:
+    return [{"text": text, "start": i * 2.0, "duration": 2.0} for i in range(count)]
+
+
+def test_short_transcript_is_a_single_call():
+    segments = make_segments(10)
+    plan = plan_chunks(segments, chunk_tokens=200, single_call_tokens=1000, reduce_tokens=500)
+
+    assert plan.single_call
+    assert plan.expected_calls == 1
+    assert len(plan.chunks) == 1
+    assert plan.chunks[0].text.startswith("we add the item")
+
+
+def test_chunks_respect_budget_and_segment_boundaries():
+    segments = make_segments(200)
+    plan = plan_chunks(segments, chunk_tokens=200, single_call_tokens=1000, reduce_tokens=500)
+
+    assert not plan.single_call
+    assert all(chunk.tokens <= 200 for chunk in plan.chunks)
+    # Every segment lands in exactly one chunk: no overlap, nothing cut mid-caption
+    joined = " ".join(chunk.text for chunk in plan.chunks)
+    assert joined == " ".join(s["text"] for s in segments)
+    assert plan.map_calls == len(plan.chunks)
+    assert plan.reduce_calls >= 1
+    assert plan.expected_calls == plan.map_calls + plan.reduce_calls
+
+
+def test_chunks_keep_start_timestamps():
+    segments = make_segments(200)
+    plan = plan_chunks(segments, chunk_tokens=200, single_call_tokens=1000, reduce_tokens=500)
+
+    assert plan.chunks[0].start == 0.0
+    starts = [chunk.start for chunk in plan.chunks]
+    assert starts == sorted(starts)
+    assert all(start in {s["start"] for s in segments} for start in starts)
+
+
+def test_prefers_sentence_end_once_nearly_full():
+    segments = make_segments(30, "filler words here without an ending")
+    segments[20]["text"] = "and that is the end of the idea."
+    budget = sum(estimate_tokens(s["text"]) for s in segments[:22])
+    plan = plan_chunks(segments, chunk_tokens=budget, single_call_tokens=10, reduce_tokens=500)
+
+    assert plan.chunks[0].text.endswith("end of the idea.")
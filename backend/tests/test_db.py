@@ -0,0 +1,78 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from sqlalchemy import Column, MetaData, QueuePool, Table, create_engine, select, text
+from app import db
+from app.config import settings
+from app.db import async_database_url, count_connections, migrate_timestamps, migration_lock, pool_options
+from app.models import UTCDateTime
+
+def test_async_database_url_picks_async_drivers():
+    assert async_database_url("sqlite:///./notes.db").drivername == "sqlite+aiosqlite"
+
+    url = async_database_url("postgresql://user:pw@host/db?sslmode=require&channel_binding=require")
+    assert url.drivername == "postgresql+asyncpg"
+    assert dict(url.query) == {"ssl": "require"}
+    assert url.database == "db" and url.host == "host"
+
+def test_pool_options_only_size_server_databases():
+    assert pool_options("sqlite:///./notes.db", 3, 2) == {}
+    with patch.object(settings, "DB_POOL_RECYCLE_SECONDS", 60):
+        options = pool_options("postgresql://user:pw@host/db", 3, 2)
+    assert options["pool_size"] == 3 and options["max_overflow"] == 2 and options["pool_recycle"] == 60
+    assert options["pool_pre_ping"] is True
+
+def test_sync_engine_has_a_connection_for_every_llm_call():
+    assert db.sync_pool_size + db.sync_max_overflow >= settings.LLM_MAX_IN_FLIGHT
+
+def test_connection_gauges_follow_the_pool():
+    engine = create_engine("sqlite://", poolclass=QueuePool)
+    count_connections(engine, "test")
+
+    def gauge(state):
+        return REGISTRY.get_sample_value("db_connections", {"database": "test", "state": state})
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert (gauge("open"), gauge("checked_out")) == (1, 1)
+    # Back in the pool, still open
+    assert (gauge("open"), gauge("checked_out")) == (1, 0)
+    engine.dispose()
+    assert gauge("open") == 0
+
+def test_timestamps_are_read_back_as_aware_utc():
+    engine = create_engine("sqlite://")
+    table = Table("stamps", MetaData(), Column("at", UTCDateTime()))
+    table.create(engine)
+    paris = timezone(timedelta(hours=2))
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [
+            {"at": datetime(2025, 6, 1, 14, 0, tzinfo=paris)},
+            {"at": datetime(2025, 6, 1, 12, 0)},  # naive values are taken as UTC
+        ])
+        values = connection.execute(select(table.c.at)).scalars().all()
+    assert values == [datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)] * 2
+    # Only Postgres has columns to convert
+    assert migrate_timestamps() == []
+
+def test_migration_lock_lets_one_worker_migrate_at_a_time(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'notes.db'}")
+    inside = []
+    overlapped = False
+
+    def migrate():
+        nonlocal overlapped
+        with patch("app.db.engine", engine), migration_lock():
+            overlapped = overlapped or bool(inside)
+            inside.append(True)
+            time.sleep(0.05)
+            inside.pop()
+
+    workers = [threading.Thread(target=migrate) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert not overlapped
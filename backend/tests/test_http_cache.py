@@ -0,0 +1,77 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+import brotli
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from app.main import app
+from app.models import Note
+from app.services.http_cache import http_date
+from app.services.note_content import save_note_content
+
+client = TestClient(app)
+
+def add_note(session: Session, video_id: str, body: str = "# Notes\n\n" + "Some content. " * 200) -> Note:
+    note = Note(video_id=video_id, url=f"https://youtu.be/{video_id}", title=video_id)
+    session.add(note)
+    session.flush()
+    save_note_content(session, note, body)
+    session.commit()
+    return note
+
+def test_note_revalidates_without_loading_the_body(session):
+    note = add_note(session, "vid1")
+
+    response = client.get(f"/notes/{note.id}", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert response.headers["last-modified"] == http_date(note.created_at)
+
+    with patch("app.main.to_note_read") as mock_read:
+        response = client.get(f"/notes/{note.id}", headers={"If-None-Match": etag})
+    mock_read.assert_not_called()
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # If-Modified-Since alone works too
+    later = http_date(datetime.now(timezone.utc) + timedelta(minutes=1))
+    assert client.get(f"/notes/{note.id}", headers={"If-Modified-Since": later}).status_code == 304
+    assert client.get(f"/notes/{note.id}", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+def test_listing_etag_changes_with_new_notes(session):
+    add_note(session, "vid1")
+    response = client.get("/notes")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+    assert client.get("/notes", headers={"If-None-Match": etag}).status_code == 304
+
+    add_note(session, "vid2")
+    response = client.get("/notes", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [item["video_id"] for item in response.json()["items"]] == ["vid2", "vid1"]
+
+def test_rendered_and_search_support_etags(session):
+    note = add_note(session, "vid1", "# Heaps\n\nA binary heap.")
+    for url in (f"/notes/{note.id}/rendered", "/notes/search?q=heap"):
+        etag = client.get(url).headers["etag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+def test_large_bodies_are_compressed(session):
+    note = add_note(session, "vid1")
+    for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+        with client.stream("GET", f"/notes/{note.id}", headers={"Accept-Encoding": f"{encoding}, deflate"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["vary"]
+        # The compressed bytes are a different representation
+        assert response.headers["etag"].startswith('W/"')
+        assert int(response.headers["content-length"]) < len(decompress(raw)) // 5
+
+    etag = client.get(f"/notes/{note.id}", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    assert client.get(f"/notes/{note.id}", headers={"If-None-Match": etag}).status_code == 304
+
+    # Small bodies are not worth it
+    response = client.get("/notes/999", headers={"Accept-Encoding": "br"})
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from app.config import settings
+from app.main import app, fail_stale_jobs
+from app.models import ClientQuota, Job, Note
+from app.services.note_content import load_note_content
+
+client = TestClient(app)
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_job_runs_to_completion(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+
+    async def fake_generate(segments, on_progress=None, **callbacks):
+        on_progress("map", 0, 2)
+        on_progress("map", 2, 2)
+        on_progress("reduce", 0, 1)
+        return "Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50}
+
+    mock_generate.side_effect = fake_generate
+
+    response = client.post("/jobs", json={"url": "http://youtube.com/vid1"})
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["location"] == f"/jobs/{job['id']}"
+
+    # TestClient runs background tasks before returning, so the job is finished
+    response = client.get(f"/jobs/{job['id']}")
+    assert response.status_code == 200
+    job = response.json()
+    assert job["status"] == "done"
+    assert job["progress_done"] == 0 and job["progress_total"] == 1
+
+    note = session.get(Note, job["note_id"])
+    assert load_note_content(session, note) == "Detailed content"
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_job_reuses_existing_note(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    session.add(Note(video_id="vid1", url="http://youtube.com/vid1"))
+    session.commit()
+
+    response = client.post("/jobs", json={"url": "http://youtube.com/vid1"})
+    assert response.status_code == 202
+    assert response.json()["status"] == "done"
+    mock_generate.assert_not_called()
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_job_failure_is_reported(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+    mock_generate.side_effect = RuntimeError("boom")
+
+    response = client.post("/jobs", json={"url": "http://youtube.com/vid1"})
+    job = client.get(f"/jobs/{response.json()['id']}").json()
+    assert job["status"] == "failed"
+    assert "boom" in job["error"]
+
+def test_unknown_job_returns_404(session):
+    response = client.get("/jobs/does-not-exist")
+    assert response.status_code == 404
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.services.ai._call_llm")
+def test_llm_failure_fails_the_job_and_refunds_the_quota(mock_call, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+    mock_call.side_effect = RuntimeError("deployment unavailable")
+
+    response = client.post("/jobs", json={"url": "http://youtube.com/vid1"})
+    job = client.get(f"/jobs/{response.json()['id']}").json()
+    assert job["status"] == "failed"
+    assert "deployment unavailable" in job["error"]
+    # Nothing was saved for the video and the client was not charged
+    assert session.exec(select(Note)).all() == []
+    assert session.get(ClientQuota, "testclient").used == 0
+
+def test_jobs_left_behind_by_a_stopped_worker_fail(session):
+    stale = datetime.now(timezone.utc) - timedelta(seconds=settings.JOB_STALE_SECONDS + 1)
+    session.add(Job(id="lost", video_id="vid1", url="http://youtube.com/vid1", status="map", updated_at=stale, user_ip="1.2.3.4"))
+    session.add(ClientQuota(client="1.2.3.4", used=1))
+    session.add(Job(id="running", video_id="vid2", url="http://youtube.com/vid2", status="map"))
+    session.add(Job(id="finished", video_id="vid3", url="http://youtube.com/vid3", status="done", updated_at=stale))
+    session.commit()
+
+    assert fail_stale_jobs(session) == 1
+    # The lost job's generation is given back
+    assert session.get(ClientQuota, "1.2.3.4").used == 0
+    assert client.get("/jobs/lost").json()["status"] == "failed"
+    assert client.get("/jobs/running").json()["status"] == "map"
+    assert client.get("/jobs/finished").json()["status"] == "done"
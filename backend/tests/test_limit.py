@@ -1,38 +1,10 @@
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
-from app.main import app, get_session
-from app.models import Note
-import pytest
-import os
-
-# Use an in-memory SQLite database for testing with StaticPool to share data
-DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
-
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
-def get_session_override():
-    with Session(engine) as session:
-        yield session
-
-app.dependency_overrides[get_session] = get_session_override
+from app.config import settings
+from app.main import app
 
 client = TestClient(app)
 
-@pytest.fixture(name="session")
-def session_fixture():
-    create_db_and_tables()
-    with Session(engine) as session:
-        yield session
-    SQLModel.metadata.drop_all(engine)
-
 @patch("app.main.extract_video_id")
 @patch("app.main.get_raw_transcript")
 @patch("app.main.generate_notes_map_reduce")
@@ -64,6 +36,8 @@ def test_limit_enforcement(mock_generate, mock_transcript, mock_extract, session
 @patch("app.main.extract_video_id")
 @patch("app.main.get_raw_transcript")
 @patch("app.main.generate_notes_map_reduce")
+# admin_ips_set is a cached_property, i.e. stored in the instance dict
+@patch.dict(settings.__dict__, {"admin_ips_set": {"10.0.0.1"}})
 def test_admin_bypass(mock_generate, mock_transcript, mock_extract, session):
     # Mock return values
     mock_extract.side_effect = lambda url: url.split("/")[-1]
@@ -72,7 +46,6 @@ def test_admin_bypass(mock_generate, mock_transcript, mock_extract, session):
 
     # Admin IP
     admin_ip = "10.0.0.1"
-    os.environ["ADMIN_IPS"] = admin_ip
 
     # Simulate headers for IP
     headers = {"X-Forwarded-For": admin_ip}
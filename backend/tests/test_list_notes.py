@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Note
+
+client = TestClient(app)
+
+def add_notes(session, count):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        session.add(Note(
+            video_id=f"vid{i}",
+            url=f"http://youtube.com/vid{i}",
+            title=f"Notes for vid{i}",
+            # Two notes per timestamp, so the id tie-breaker matters
+            created_at=start + timedelta(minutes=i // 2),
+        ))
+    session.commit()
+
+def test_pages_cover_all_notes_newest_first(session):
+    add_notes(session, 7)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/notes", params=params).json()
+        seen.extend(item["video_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [f"vid{i}" for i in reversed(range(7))]
+
+def test_summary_leaves_out_content(session):
+    add_notes(session, 1)
+    item = client.get("/notes").json()["items"][0]
+    assert "content_detailed" not in item
+    assert "input_tokens" not in item
+    assert item["title"] == "Notes for vid0"
+
+def test_invalid_cursor_is_rejected(session):
+    response = client.get("/notes", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+from app.models import LLMCacheEntry
+from app.services.llm_cache import LLMCache, cache_key
+import pytest
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+
+@pytest.fixture(name="cache")
+def cache_fixture():
+    SQLModel.metadata.create_all(engine)
+    yield LLMCache(engine, max_bytes=1024, max_age_seconds=3600)
+    SQLModel.metadata.drop_all(engine)
+
+def test_cache_key_depends_on_every_input():
+    base = cache_key("gpt-4o", 0.2, "system", "prompt")
+    assert base == cache_key("gpt-4o", 0.2, "system", "prompt")
+    assert base != cache_key("gpt-4o-mini", 0.2, "system", "prompt")
+    assert base != cache_key("gpt-4o", 0.3, "system", "prompt")
+    assert base != cache_key("gpt-4o", 0.2, "system", "prompt changed")
+
+def test_get_and_put(cache):
+    assert cache.get("k1") is None
+    cache.put("k1", "### Notes")
+    assert cache.get("k1") == "### Notes"
+
+def test_hits_only_record_use_once_an_hour(cache):
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        session.add(LLMCacheEntry(key="recent", content="x", size=1, created_at=now, last_used_at=now - timedelta(minutes=10)))
+        session.add(LLMCacheEntry(key="stale", content="x", size=1, created_at=now, last_used_at=now - timedelta(hours=2)))
+        session.commit()
+
+    assert cache.get("recent") == cache.get("stale") == "x"
+    with Session(engine) as session:
+        assert now - session.get(LLMCacheEntry, "recent").last_used_at.replace(tzinfo=timezone.utc) > timedelta(minutes=9)
+        assert now - session.get(LLMCacheEntry, "stale").last_used_at.replace(tzinfo=timezone.utc) < timedelta(minutes=1)
+
+def test_expired_entries_are_misses_and_evicted(cache):
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    with Session(engine) as session:
+        session.add(LLMCacheEntry(key="old", content="x", size=1, created_at=old, last_used_at=old))
+        session.commit()
+
+    assert cache.get("old") is None
+    assert cache.evict() == 1
+
+def test_size_eviction_keeps_most_recently_used(cache):
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        session.add(LLMCacheEntry(key="a", content="a" * 600, size=600, created_at=now, last_used_at=now - timedelta(hours=3)))
+        session.add(LLMCacheEntry(key="b", content="b" * 600, size=600, created_at=now, last_used_at=now - timedelta(hours=2)))
+        session.commit()
+    cache.get("a")  # a is now the most recently used
+
+    cache.evict()
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
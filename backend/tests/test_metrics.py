@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app.main import app
+from app.services import ai
+import pytest
+
+client = TestClient(app)
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_generation_is_timed_per_stage(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+    mock_generate.return_value = ("Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50})
+
+    youtube_before = sample("transcript_fetch_seconds_count", source="youtube")
+    misses_before = sample("cache_lookups_total", cache="transcript", result="miss")
+    generations_before = sample("generation_seconds_count")
+    commits_before = sample("db_commit_seconds_count")
+
+    response = client.post("/notes", json={"url": "http://youtube.com/vid1"})
+    assert response.status_code == 200
+
+    assert sample("transcript_fetch_seconds_count", source="youtube") == youtube_before + 1
+    assert sample("cache_lookups_total", cache="transcript", result="miss") == misses_before + 1
+    assert sample("generation_seconds_count") == generations_before + 1
+    assert sample("db_commit_seconds_count") == commits_before + 1
+    assert sample("generations_in_flight") == 0
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "generation_seconds_bucket" in response.text
+    assert 'transcript_fetch_seconds_count{source="youtube"}' in response.text
+
+def test_llm_call_records_latency_tokens_and_cost():
+    usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=500)
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="### Notes"))], usage=usage
+    )
+    deployment = ai.get_router().deployments[0].name
+    calls_before = sample("llm_call_seconds_count", deployment=deployment, stage="map")
+    input_before = sample("llm_tokens_total", deployment=deployment, kind="input")
+    output_before = sample("llm_tokens_total", deployment=deployment, kind="output")
+    cost_before = sample("llm_cost_dollars_total", deployment=deployment)
+
+    with patch.object(ai.settings, "LLM_CACHE_ENABLED", False), \
+            patch.object(ai.get_router().deployments[0].client.chat.completions, "create", AsyncMock(return_value=response)):
+        assert asyncio.run(ai._call_llm("system", "prompt", stage="map")) == "### Notes"
+
+    assert sample("llm_call_seconds_count", deployment=deployment, stage="map") == calls_before + 1
+    assert sample("llm_tokens_total", deployment=deployment, kind="input") == input_before + 1000
+    assert sample("llm_tokens_total", deployment=deployment, kind="output") == output_before + 500
+    assert sample("llm_cost_dollars_total", deployment=deployment) == pytest.approx(
+        cost_before + ai.call_cost(1000, 500)
+    )
+    assert sample("llm_calls_in_flight") == 0
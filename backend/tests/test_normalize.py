@@ -0,0 +1,79 @@
+from app.services.chunking import plan_chunks
+from app.services.normalize import clean_text, normalize_segments
+
+
+def caption(text: str, start: float) -> dict:
+    return {"text": text, "start": start, "duration": 2.0}
+
+
+def test_clean_text_drops_markers_and_hesitations():
+    assert clean_text("[Music] so um the heap, uh, stays balanced [Applause]") == "so the heap, stays balanced"
+    assert clean_text(">> Hmm, what about [ __ ] this") == "what about this"
+    assert clean_text("ummm") == ""
+    # Words that merely contain a filler are kept
+    assert clean_text("the umbrella and hummus") == "the umbrella and hummus"
+
+
+def test_rolling_captions_are_deduped_and_merged_into_sentences():
+    segments = [
+        caption("[Music]", 0.0),
+        caption("today we're going to", 2.0),
+        caption("today we're going to talk about", 4.0),
+        caption("talk about binary heaps.", 6.0),
+        caption("A heap is a tree", 8.0),
+        caption("a heap is a tree", 10.0),
+    ]
+    normalized, stats = normalize_segments(segments)
+
+    assert [s["text"] for s in normalized] == [
+        "today we're going to talk about binary heaps.",
+        "A heap is a tree",
+    ]
+    # Each sentence starts where its first caption did
+    assert [s["start"] for s in normalized] == [2.0, 8.0]
+    assert normalized[0]["duration"] == 6.0
+    assert stats.segments_before == 6 and stats.segments_after == 2
+    assert stats.chars_removed == stats.chars_before - len(" ".join(s["text"] for s in normalized))
+    assert stats.tokens_removed > 0
+
+
+def test_technical_content_is_kept():
+    for text in [
+        "set it to 5 mm.",
+        "then arr[i] = arr[j]",
+        "dp[i][j] is the best cost",
+        "shift it, x >> 2, and [1, 2, 3] stays",
+        "read the docs [link in the description]",
+    ]:
+        assert clean_text(text) == text
+    # >> only marks a speaker change at the start of a caption
+    assert clean_text(">> so x >> 2") == "so x >> 2"
+
+
+def test_single_repeated_word_is_kept():
+    normalized, _ = normalize_segments([caption("we need that", 0.0), caption("that list", 2.0)])
+    assert normalized[0]["text"] == "we need that that list"
+    normalized, _ = normalize_segments([caption("we need that", 0.0), caption("that", 2.0)])
+    assert normalized[0]["text"] == "we need that that"
+
+
+def test_unpunctuated_captions_are_cut_into_bounded_sentences():
+    segments = [caption(f"word{i} and more words without any end", i * 2.0) for i in range(100)]
+    normalized, stats = normalize_segments(segments)
+    assert 1 < len(normalized) < 100
+    assert all(len(s["text"]) <= 450 for s in normalized)
+    assert stats.chars_removed == 0
+
+
+def test_normalizing_reduces_planned_input():
+    rolling = []
+    for i in range(400):
+        line = f"point {i} about the cache"
+        rolling += [caption(f"um {line}", i * 4.0), caption(f"{line} [Music]", i * 4.0 + 2)]
+    normalized, _ = normalize_segments(rolling)
+
+    def plan(segments):
+        return plan_chunks(segments, chunk_tokens=500, single_call_tokens=100, reduce_tokens=2000)
+
+    assert plan(normalized).input_tokens < plan(rolling).input_tokens / 2
+    assert plan(normalized).map_calls < plan(rolling).map_calls
@@ -0,0 +1,92 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+from app.models import Note, NoteContent
+from app.services.note_content import (
+    compress_body,
+    decompress_body,
+    delete_note,
+    ensure_note_indexes,
+    load_note_content,
+    move_inline_bodies,
+    save_note_content,
+    to_note_read,
+)
+import pytest
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+
+MARKDOWN = "# Title\n\n```python\nmy_list = [1, 2, 3]\n```\n" * 50
+
+@pytest.fixture(name="session")
+def session_fixture():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    SQLModel.metadata.drop_all(engine)
+
+def test_body_roundtrip_and_compression():
+    data = compress_body(MARKDOWN)
+    assert data[0] == 1  # format version byte
+    assert len(data) < len(MARKDOWN) / 4
+    assert decompress_body(data) == MARKDOWN
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        decompress_body(b"\x09garbage")
+
+def test_body_is_stored_outside_note_row(session):
+    note = Note(video_id="vid1", url="http://youtube.com/vid1")
+    session.add(note)
+    session.flush()
+    save_note_content(session, note, MARKDOWN)
+    session.commit()
+
+    assert load_note_content(session, note) == MARKDOWN
+    assert to_note_read(session, note).content_detailed == MARKDOWN
+
+    delete_note(session, note)
+    session.commit()
+    assert session.get(NoteContent, note.id) is None
+
+def test_legacy_inline_bodies_are_moved_out_of_the_note_row(session):
+    # A database from before NoteContent, bodies inline in the note row
+    session.execute(text("ALTER TABLE note ADD COLUMN content_detailed TEXT"))
+    session.execute(text(
+        "INSERT INTO note (video_id, url, created_at, content_detailed) "
+        "VALUES ('vid1', 'http://youtube.com/vid1', '2025-01-01 00:00:00', 'legacy'), "
+        "('vid2', 'http://youtube.com/vid2', '2025-01-01 00:00:00', NULL)"
+    ))
+    session.commit()
+
+    assert move_inline_bodies(session, batch_size=1) == 1
+    assert "content_detailed" not in {column["name"] for column in inspect(engine).get_columns("note")}
+    note = session.exec(select(Note).where(Note.video_id == "vid1")).one()
+    assert load_note_content(session, note) == "legacy"
+    assert move_inline_bodies(session) == 0
+
+def test_missing_note_indexes_are_created(session):
+    # A database from before video_id was unique and the other indexes existed
+    session.execute(text("DROP INDEX ix_note_video_id"))
+    session.execute(text("DROP INDEX ix_note_created_at_id"))
+    session.execute(text("DROP INDEX ix_note_user_ip"))
+    session.execute(text("CREATE INDEX ix_note_video_id ON note (video_id)"))
+    session.commit()
+    notes = [Note(video_id="vid1", url="http://youtube.com/vid1") for _ in range(2)]
+    session.add_all(notes)
+    session.flush()
+    for note in notes:
+        save_note_content(session, note, MARKDOWN)
+    session.commit()
+
+    assert sorted(ensure_note_indexes(session)) == ["ix_note_created_at_id", "ix_note_user_ip", "ix_note_video_id"]
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("note")}
+    assert indexes["ix_note_video_id"]["unique"]
+    # The oldest note of the video is kept
+    assert [note.id for note in session.exec(select(Note)).all()] == [notes[0].id]
+    assert session.get(NoteContent, notes[1].id) is None
+    assert ensure_note_indexes(session) == []
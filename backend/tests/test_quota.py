@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import _own_session, app, generate_note_once
+from app.models import ClientQuota, Note
+from app.services import quota
+from app.services.singleflight import claim_generation
+import pytest
+
+client = TestClient(app)
+
+def test_charges_up_to_the_limit_and_refunds(session):
+    with patch.object(settings, "QUOTA_LIMIT", 2):
+        assert quota.try_charge(session, "1.2.3.4")
+        assert quota.try_charge(session, "1.2.3.4")
+        assert not quota.try_charge(session, "1.2.3.4")
+        # Other clients have their own counter
+        assert quota.try_charge(session, "5.6.7.8")
+
+        quota.refund(session, "1.2.3.4")
+        assert quota.try_charge(session, "1.2.3.4")
+
+def test_first_charge_counts_existing_notes(session):
+    session.add(Note(video_id="vid1", url="http://youtube.com/vid1", user_ip="1.2.3.4"))
+    session.commit()
+
+    with patch.object(settings, "QUOTA_LIMIT", 2):
+        assert quota.try_charge(session, "1.2.3.4")
+        assert not quota.try_charge(session, "1.2.3.4")
+
+def test_window_resets_the_counter(session):
+    with patch.object(settings, "QUOTA_LIMIT", 1), patch.object(settings, "QUOTA_WINDOW_SECONDS", 3600):
+        assert quota.try_charge(session, "1.2.3.4")
+        assert not quota.try_charge(session, "1.2.3.4")
+
+        row = session.get(ClientQuota, "1.2.3.4")
+        row.window_start = datetime.now(timezone.utc) - timedelta(hours=2)
+        session.add(row)
+        session.commit()
+
+        assert quota.try_charge(session, "1.2.3.4")
+        assert not quota.try_charge(session, "1.2.3.4")
+
+def test_admin_ips_skip_the_database(session):
+    with patch.dict(settings.__dict__, {"admin_ips_set": {"10.0.0.1"}}):
+        for _ in range(5):
+            assert quota.try_charge(session, "10.0.0.1")
+    assert session.get(ClientQuota, "10.0.0.1") is None
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_failed_generation_is_refunded(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.side_effect = RuntimeError("no transcript")
+    headers = {"X-Forwarded-For": "1.2.3.4"}
+
+    with patch.object(settings, "QUOTA_LIMIT", 1):
+        with pytest.raises(RuntimeError):
+            client.post("/notes", json={"url": "http://youtube.com/vid1"}, headers=headers)
+        assert session.get(ClientQuota, "1.2.3.4").used == 0
+
+        mock_transcript.side_effect = None
+        mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+        mock_generate.return_value = ("Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50})
+        response = client.post("/notes", json={"url": "http://youtube.com/vid1"}, headers=headers)
+        assert response.status_code == 200
+
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_shared_generation_goes_to_a_caller_that_receives_it(mock_generate, mock_transcript, session):
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+    release = asyncio.Event()
+
+    async def slow_generate(*args, **kwargs):
+        await release.wait()
+        return ("Detailed content", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50})
+
+    mock_generate.side_effect = slow_generate
+
+    async def caller(user_ip):
+        async with _own_session() as own:
+            await own.run_sync(quota.try_charge, user_ip)
+            return await generate_note_once("vid1", "http://youtube.com/vid1", user_ip, own)
+
+    async def run():
+        first = asyncio.create_task(caller("1.2.3.4"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(caller("5.6.7.8"))
+        await asyncio.sleep(0.05)
+        # The caller that started the generation leaves before it is done
+        first.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        return await second
+
+    note_id = asyncio.run(run())
+    session.expire_all()
+    assert session.get(Note, note_id).user_ip == "5.6.7.8"
+    assert session.get(ClientQuota, "1.2.3.4").used == 0
+    assert session.get(ClientQuota, "5.6.7.8").used == 1
+
+def test_waiting_on_another_workers_generation_times_out(session):
+    # Another worker holds the video's generation lock and never finishes
+    assert claim_generation(session, "vid1", "other-worker", ttl_seconds=60)
+
+    async def run():
+        async with _own_session() as own:
+            await own.run_sync(quota.try_charge, "1.2.3.4")
+            with pytest.raises(HTTPException) as error:
+                await generate_note_once("vid1", "http://youtube.com/vid1", "1.2.3.4", own)
+        return error.value
+
+    with patch.object(settings, "GENERATION_WAIT_SECONDS", 0), patch.object(settings, "GENERATION_POLL_SECONDS", 0.01):
+        assert asyncio.run(run()).status_code == 503
+    assert session.get(ClientQuota, "1.2.3.4").used == 0
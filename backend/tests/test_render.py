@@ -0,0 +1,93 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Note, NoteRendered
+from app.services.note_content import delete_note, save_note_content
+from app.services.render import render_markdown
+
+client = TestClient(app)
+
+NOTE = """# Sorting
+
+## Table of Contents
+- [Quick Sort](#quick-sort)
+
+## Quick Sort
+Pick a pivot.
+
+```python
+def swap(a, i, j):
+    a[i], a[j] = a[j], a[i]
+```
+
+### Quick Sort
+"""
+
+def test_headings_get_anchors_and_toc():
+    rendered = render_markdown(NOTE)
+    assert '<h2 id="quick-sort">Quick Sort</h2>' in rendered.html
+    assert '<h3 id="quick-sort-1">Quick Sort</h3>' in rendered.html
+    assert '<a href="#quick-sort"' in rendered.html
+    assert [(e.level, e.anchor) for e in rendered.toc] == [
+        (1, "sorting"), (2, "table-of-contents"), (2, "quick-sort"), (3, "quick-sort-1"),
+    ]
+
+def test_code_is_highlighted_inline():
+    html = render_markdown(NOTE).html
+    assert '<span class="code-language">python</span>' in html
+    assert 'class="copy-code"' in html
+    # Pygments output with inline styles, no stylesheet needed
+    assert '<span style="color:' in html and ">def</span>" in html
+
+def test_untrusted_markup_is_removed():
+    html = render_markdown(
+        'Hi <script>alert(1)</script> <img src=x onerror="alert(1)">\n\n'
+        "[bad](javascript:alert(1)) [good](https://example.com)"
+    ).html
+    # Escaped to text, never live tags
+    assert "<script" not in html and "<img" not in html
+    assert "&lt;script&gt;" in html
+    assert 'href="javascript' not in html
+    assert '<a href="https://example.com" rel="noopener noreferrer nofollow">good</a>' in html
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_rendered_at_save_time(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+    mock_generate.return_value = (NOTE, {"cost": 0.01, "input_tokens": 100, "output_tokens": 50})
+
+    note_id = client.post("/notes", json={"url": "http://youtube.com/vid1"}).json()["id"]
+    assert session.get(NoteRendered, note_id) is not None
+
+    with patch("app.services.render.render_markdown") as mock_render:
+        response = client.get(f"/notes/{note_id}/rendered")
+    mock_render.assert_not_called()
+    assert response.status_code == 200
+    data = response.json()
+    assert data["video_id"] == "vid1"
+    assert data["input_tokens"] == 100
+    assert "content_detailed" not in data
+    assert '<h1 id="sorting">Sorting</h1>' in data["html"]
+    assert data["toc"][2] == {"level": 2, "text": "Quick Sort", "anchor": "quick-sort"}
+
+    assert client.get("/notes/999/rendered").status_code == 404
+
+def test_legacy_notes_are_rendered_on_first_read(session):
+    note = Note(video_id="vid1", url="https://youtu.be/vid1", title="Old")
+    session.add(note)
+    session.flush()
+    save_note_content(session, note, "# Legacy")
+    session.commit()
+    assert session.get(NoteRendered, note.id) is None
+
+    response = client.get(f"/notes/{note.id}/rendered")
+    assert response.status_code == 200
+    assert response.json()["html"].startswith('<h1 id="legacy">Legacy</h1>')
+    session.expire_all()
+    assert session.get(NoteRendered, note.id) is not None
+
+    delete_note(session, note)
+    session.commit()
+    assert session.get(NoteRendered, note.id) is None
@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+import httpx
+import openai
+import pytest
+from app.services import ai
+from app.services.chunking import Chunk, ChunkPlan, estimate_tokens
+from app.services.llm_router import Deployment, LLMRouter
+
+
+def make_deployment(name: str, stages=("map", "reduce"), create=None, tokens_per_minute=0) -> Deployment:
+    completions = SimpleNamespace(create=create or AsyncMock(return_value=completion(name)))
+    return Deployment(
+        name=name,
+        deployment=name,
+        stages=tuple(stages),
+        client=SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+        scheduler=ai.LLMScheduler(
+            requests_per_minute=0,
+            tokens_per_minute=tokens_per_minute,
+            max_in_flight=4,
+            max_retries=1,
+            backoff_base=0.001,
+            backoff_max=0.01,
+        ),
+    )
+
+
+def completion(content: str):
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def call(router: LLMRouter, stage: str) -> str:
+    with patch.object(ai, "router", router), patch.object(ai.settings, "LLM_CACHE_ENABLED", False):
+        return asyncio.run(ai._call_llm("system", "prompt", stage=stage))
+
+
+def test_stages_use_their_own_deployments():
+    router = LLMRouter([make_deployment("big", ["reduce"]), make_deployment("small", ["map"])], cooldown_seconds=1)
+    assert call(router, "map") == "small"
+    assert call(router, "reduce_1") == "big"
+    assert call(router, "reduce") == "big"
+
+
+def test_prefers_lower_latency_and_free_quota():
+    fast, slow = make_deployment("fast"), make_deployment("slow")
+    router = LLMRouter([slow, fast], cooldown_seconds=1)
+    router.observe(fast, 1.0)
+    router.observe(slow, 4.0)
+    assert router.pick("map", 100) is fast
+
+    # fast's TPM bucket is spent, slow has quota right away
+    fast.scheduler = make_deployment("x", tokens_per_minute=600).scheduler
+    fast.scheduler.tokens.consume(600)
+    assert router.pick("map", 100) is slow
+
+
+def test_fails_over_and_cools_down_failed_deployment():
+    request = httpx.Request("POST", "https://example.openai.azure.com")
+    error = openai.InternalServerError("boom", response=httpx.Response(500, request=request), body=None)
+    broken = make_deployment("broken", create=AsyncMock(side_effect=error))
+    healthy = make_deployment("healthy")
+    router = LLMRouter([broken, healthy], cooldown_seconds=60)
+    router.observe(broken, 0.1)  # looks fastest
+    router.observe(healthy, 1.0)
+
+    assert call(router, "map") == "healthy"
+    assert broken.client.chat.completions.create.await_count == 1
+    assert broken.failures == 1
+    # Out of rotation for the cooldown
+    assert router.pick("map", 100) is healthy
+
+
+def test_slow_map_call_is_hedged_and_the_loser_cancelled():
+    calls = 0
+    cancelled = []
+
+    async def create(**kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            try:
+                await asyncio.sleep(5)  # a tail-latency request
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return completion("slow")
+        return completion("hedge")
+
+    router = LLMRouter([make_deployment("one", create=create)], cooldown_seconds=1)
+    won = ai.metrics.LLM_HEDGES.labels(result="won")._value.get()
+    latencies = ai.deque([0.01] * 20, maxlen=50)
+    with patch.object(ai.settings, "LLM_HEDGE_PERCENTILE", 95), patch.object(ai, "map_latencies", latencies):
+        assert call(router, "map") == "hedge"
+        # Neither the abandoned first attempt nor the hedge is sampled
+        assert list(latencies) == [0.01] * 20
+        assert call(router, "map") == "hedge"
+        assert len(latencies) == 21
+
+    assert calls == 3 and cancelled == [True]
+    assert ai.metrics.LLM_HEDGES.labels(result="won")._value.get() == won + 1
+
+
+def test_hedging_waits_for_enough_samples():
+    with patch.object(ai.settings, "LLM_HEDGE_PERCENTILE", 95), \
+            patch.object(ai, "map_latencies", ai.deque([0.5] * 5, maxlen=50)):
+        assert ai.hedge_delay() is None
+    with patch.object(ai, "map_latencies", ai.deque([0.5] * 50, maxlen=50)):
+        assert ai.hedge_delay() is None  # off by default
+
+
+def test_cancelled_generation_counts_only_unsent_calls_as_saved():
+    sent = asyncio.Event()
+    calls = 0
+
+    async def create(**kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            sent.set()
+        await asyncio.sleep(5)
+
+    text = "word " * 2000
+    plan = ChunkPlan(chunks=[Chunk(text, 0, 0), Chunk(text, 60, 0)], map_calls=2, reduce_calls=1, expected_tokens=8000)
+    router = LLMRouter([make_deployment("one", create=create)], cooldown_seconds=1)
+
+    async def run():
+        task = asyncio.ensure_future(ai.generate_notes_map_reduce([], plan=plan))
+        await sent.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    saved = ai.metrics.LLM_TOKENS_SAVED._value.get()
+    with patch.object(ai, "router", router), patch.object(ai.settings, "LLM_CACHE_ENABLED", False):
+        asyncio.run(run())
+
+    # Both map calls were sent and billed; only the reduce call was saved
+    prompt = estimate_tokens("You are a Senior Technical Writer.") + estimate_tokens(ai.MAP_PROMPT.format(text=text))
+    assert ai.metrics.LLM_TOKENS_SAVED._value.get() - saved == 8000 - 2 * prompt
@@ -0,0 +1,76 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from app.services.ai import LLMScheduler, TokenBucket
+
+
+def make_scheduler(**overrides) -> LLMScheduler:
+    options = dict(
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_in_flight=8,
+        max_retries=3,
+        backoff_base=0.001,
+        backoff_max=0.01,
+    )
+    options.update(overrides)
+    return LLMScheduler(**options)
+
+
+def rate_limit_error(retry_after: str) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://example.openai.azure.com")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return openai.RateLimitError("Too Many Requests", response=response, body=None)
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=60)  # 1 unit per second
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    # Requests bigger than the bucket only wait for a full bucket
+    assert bucket.wait_time(600) == pytest.approx(60.0, abs=0.05)
+
+
+def test_retries_rate_limit_and_honours_retry_after():
+    scheduler = make_scheduler()
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise rate_limit_error("0")
+        return "ok"
+
+    assert asyncio.run(scheduler.run(flaky, estimated_tokens=10)) == "ok"
+    assert attempts == 3
+
+
+def test_gives_up_after_max_retries():
+    scheduler = make_scheduler(max_retries=1)
+
+    async def always_limited():
+        raise rate_limit_error("0")
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(scheduler.run(always_limited, estimated_tokens=10))
+
+
+def test_in_flight_cap_is_shared():
+    scheduler = make_scheduler(max_in_flight=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        peak = max(peak, scheduler.in_flight)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def run_many():
+        return await asyncio.gather(*[scheduler.run(call, estimated_tokens=10) for _ in range(6)])
+
+    assert asyncio.run(run_many()) == ["ok"] * 6
+    assert peak == 2
+    assert scheduler.in_flight == 0
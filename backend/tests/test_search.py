@@ -0,0 +1,69 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from app.main import app
+from app.models import Note, NoteContent
+from app.services.note_content import compress_body, delete_note, index_missing_notes, save_note_content
+from app.services.search import _terms, make_snippet, search_note_ids, tsquery
+
+client = TestClient(app)
+
+def add_note(session: Session, video_id: str, title: str, body: str) -> Note:
+    note = Note(video_id=video_id, url=f"https://youtu.be/{video_id}", title=title)
+    session.add(note)
+    session.flush()
+    save_note_content(session, note, body)
+    session.commit()
+    return note
+
+def test_search_ranks_and_highlights(session):
+    add_note(session, "vid1", "Binary search trees", "A tree where every lookup is logarithmic.")
+    add_note(session, "vid2", "Caching", "We cache results so repeated binary search calls are cheap.")
+    add_note(session, "vid3", "Databases", "Indexes on the created at column.")
+
+    response = client.get("/notes/search", params={"q": "binary search"})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    # Title matches rank above body-only matches
+    assert [item["video_id"] for item in items] == ["vid1", "vid2"]
+    assert "<mark>binary</mark> <mark>search</mark>" in items[1]["snippet"]
+    assert "content_detailed" not in items[0]
+
+def test_search_matches_stems_and_prefixes(session):
+    add_note(session, "vid1", "Notes", "Caching the responses of slow services.")
+
+    assert [note_id for note_id, _ in search_note_ids(session, "cached", 10)] != []
+    assert [note_id for note_id, _ in search_note_ids(session, "respo", 10)] != []
+    # Query syntax characters are treated as plain words
+    assert search_note_ids(session, 'caching OR "(', 10) == []
+
+def test_deleted_notes_leave_the_index(session):
+    note = add_note(session, "vid1", "Graphs", "Breadth first search over a graph.")
+    assert search_note_ids(session, "breadth", 10)
+
+    delete_note(session, note)
+    session.commit()
+    assert search_note_ids(session, "breadth", 10) == []
+
+def test_existing_notes_are_backfilled(session):
+    # Saved before the index existed: a body but no index entry
+    note = Note(video_id="vid1", url="https://youtu.be/vid1", title="Old")
+    session.add(note)
+    session.flush()
+    session.add(NoteContent(note_id=note.id, body=compress_body("Legacy heap sort notes")))
+    session.commit()
+    assert search_note_ids(session, "heap", 10) == []
+
+    assert index_missing_notes(session) == 1
+    assert len(search_note_ids(session, "heap", 10)) == 1
+    assert index_missing_notes(session) == 0
+
+def test_postgres_query_matches_the_last_term_by_prefix():
+    # Query syntax typed by the user is dropped with the rest of the punctuation
+    assert tsquery(_terms("Heap & so:*")) == "'heap' & 'so':*"
+
+def test_snippet_is_escaped_and_trimmed():
+    body = "intro " * 100 + "the <b>quicksort</b> partition step " + "outro " * 100
+    snippet = make_snippet(body, "quicksort")
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "&lt;b&gt;<mark>quicksort</mark>&lt;/b&gt;" in snippet
+    assert len(snippet) < 400
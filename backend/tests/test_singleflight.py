@@ -0,0 +1,89 @@
+import asyncio
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+from app.services.singleflight import (
+    SingleFlight,
+    claim_generation,
+    release_generation,
+)
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+
+def test_concurrent_callers_share_one_execution():
+    asyncio.run(_run_single_flight())
+
+async def _run_single_flight():
+    flight = SingleFlight()
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+    results = await asyncio.gather(*[flight.do("vid1", generate) for _ in range(5)])
+
+    assert results == [42] * 5
+    assert calls == 1
+    assert not flight.is_inflight("vid1")
+
+def test_generation_lock_is_exclusive_until_released():
+    SQLModel.metadata.create_all(engine)
+    try:
+        with Session(engine) as session:
+            assert claim_generation(session, "vid1", "worker-a", ttl_seconds=60)
+            assert not claim_generation(session, "vid1", "worker-b", ttl_seconds=60)
+
+            release_generation(session, "vid1", "worker-a")
+            assert claim_generation(session, "vid1", "worker-b", ttl_seconds=60)
+    finally:
+        SQLModel.metadata.drop_all(engine)
+
+def test_expired_generation_lock_is_taken_over():
+    SQLModel.metadata.create_all(engine)
+    try:
+        with Session(engine) as session:
+            assert claim_generation(session, "vid1", "crashed-worker", ttl_seconds=-1)
+            assert claim_generation(session, "vid1", "worker-b", ttl_seconds=60)
+    finally:
+        SQLModel.metadata.drop_all(engine)
+
+def test_work_is_cancelled_only_when_every_caller_is():
+    asyncio.run(_run_cancelled_callers())
+
+async def _run_cancelled_callers():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = False
+
+    async def generate():
+        nonlocal cancelled
+        started.set()
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return 42
+
+    first = asyncio.ensure_future(flight.do("vid1", generate))
+    second = asyncio.ensure_future(flight.do("vid1", generate))
+    await started.wait()
+    assert flight.waiters("vid1") == 2
+
+    # One client going away leaves the work running for the other
+    first.cancel()
+    assert await second == 42
+    assert not cancelled
+
+    first = asyncio.ensure_future(flight.do("vid2", generate))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert cancelled
+    assert not flight.is_inflight("vid2")
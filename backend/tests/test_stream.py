@@ -0,0 +1,88 @@
+import asyncio
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Note
+from app.services.note_content import load_note_content, save_note_content
+import pytest
+
+client = TestClient(app)
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+@patch("app.main.extract_video_id")
+@patch("app.main.get_raw_transcript")
+@patch("app.main.generate_notes_map_reduce")
+def test_stream_emits_progress_chunks_and_tokens(mock_generate, mock_transcript, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    mock_transcript.return_value = [{"text": "foo", "start": 0, "duration": 1}]
+
+    async def fake_generate(segments, on_progress=None, on_chunk=None, on_token=None, **kwargs):
+        on_progress("map", 0, 1)
+        on_chunk(0, "### Chunk")
+        on_progress("map", 1, 1)
+        on_progress("reduce", 0, 1)
+        on_token("# Title")
+        on_token(" body")
+        return "# Title body", {"cost": 0.01, "input_tokens": 100, "output_tokens": 50}
+
+    mock_generate.side_effect = fake_generate
+
+    response = client.post("/notes/stream", json={"url": "http://youtube.com/vid1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "progress" and events[0][1]["stage"] == "transcript"
+    assert ("chunk", {"index": 0, "markdown": "### Chunk"}) in events
+    assert "".join(data["text"] for name, data in events if name == "token") == "# Title body"
+
+    name, note = events[-1]
+    assert name == "done"
+    assert note["content_detailed"] == "# Title body"
+    assert load_note_content(session, session.get(Note, note["id"])) == "# Title body"
+
+@patch("app.main.extract_video_id")
+@patch("app.main.generate_notes_map_reduce")
+def test_stream_returns_existing_note(mock_generate, mock_extract, session):
+    mock_extract.side_effect = lambda url: url.split("/")[-1]
+    note = Note(video_id="vid1", url="http://youtube.com/vid1")
+    session.add(note)
+    session.flush()
+    save_note_content(session, note, "cached")
+    session.commit()
+
+    response = client.post("/notes/stream", json={"url": "http://youtube.com/vid1"})
+    events = parse_events(response.text)
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["content_detailed"] == "cached"
+    mock_generate.assert_not_called()
+
+def test_generation_is_cancelled_when_the_client_disconnects():
+    from app.main import ClientDisconnected, _cancel_on_disconnect
+
+    class Disconnecting:
+        async def receive(self):
+            await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+
+    cancelled = False
+
+    async def generate():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(_cancel_on_disconnect(Disconnecting(), generate()))
+    assert cancelled
@@ -71,3 +71,19 @@ def test_extract_video_id_empty(transcript_services):
         transcript_services.extract_video_id(url)
     assert excinfo.value.status_code == 400
     assert excinfo.value.detail == "Invalid YouTube URL"
+
+def test_transcript_store_roundtrip(transcript_services):
+    from sqlmodel import Session, SQLModel, create_engine
+
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    segments = [
+        {"text": "Welcome to this Python tutorial.", "start": 0.0, "duration": 5.0},
+        {"text": "We will learn about lists today.", "start": 5.0, "duration": 5.0},
+    ]
+
+    with Session(engine) as session:
+        assert transcript_services.load_transcript(session, "dQw4w9WgXcQ", "en") is None
+        transcript_services.save_transcript(session, "dQw4w9WgXcQ", "en", segments)
+        assert transcript_services.load_transcript(session, "dQw4w9WgXcQ", "en") == segments
+        assert transcript_services.load_transcript(session, "dQw4w9WgXcQ", "de") is None
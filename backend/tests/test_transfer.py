@@ -0,0 +1,80 @@
+import gzip
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+from app.config import settings
+from app.main import app
+from app.models import Note
+from app.services.note_content import load_note_content, save_note_content
+from app.services.search import search_note_ids
+from app.services.transfer import export_lines, import_lines
+import pytest
+
+client = TestClient(app)
+
+@pytest.fixture(name="target")
+def target_fixture():
+    target_engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(target_engine)
+    with Session(target_engine) as target:
+        yield target
+
+@pytest.fixture(name="admin")
+def admin_fixture():
+    # admin_ips_set is a cached_property, i.e. stored in the instance dict
+    with patch.dict(settings.__dict__, {"admin_ips_set": {"testclient"}}):
+        yield
+
+def add_notes(session: Session, count: int):
+    for i in range(count):
+        note = Note(video_id=f"vid{i}", url=f"https://youtu.be/vid{i}", title=f"Video {i}", user_ip="1.2.3.4", input_tokens=i)
+        session.add(note)
+        session.flush()
+        save_note_content(session, note, f"# Notes {i}\n\nAbout topic{i}.")
+    session.commit()
+
+def test_round_trip_in_batches(session, target):
+    add_notes(session, 7)
+    chunks = list(export_lines(session, batch_size=3))
+    assert len(chunks) == 3  # 7 notes, 3 per cursor batch
+    lines = b"".join(chunks).splitlines()
+    first = json.loads(lines[0])
+    assert first["video_id"] == "vid0" and first["content"] == "# Notes 0\n\nAbout topic0."
+    assert "id" not in first
+
+    result = import_lines(target, lines, batch_size=3)
+    assert (result.inserted, result.skipped) == (7, 0)
+    notes = {note.video_id: note for note in target.exec(select(Note)).all()}
+    assert notes["vid3"].user_ip == "1.2.3.4" and notes["vid3"].input_tokens == 3
+    assert load_note_content(target, notes["vid3"]) == "# Notes 3\n\nAbout topic3."
+    # Imported notes are searchable
+    assert [note_id for note_id, _ in search_note_ids(target, "topic5", 10)] == [notes["vid5"].id]
+
+def test_import_is_idempotent_on_video_id(session, target):
+    add_notes(session, 3)
+    lines = b"".join(export_lines(session)).splitlines()
+    import_lines(target, lines[:2])
+
+    # Re-running the whole file (plus a repeated line) only adds what is missing
+    result = import_lines(target, lines + lines[:1], batch_size=2)
+    assert (result.inserted, result.skipped) == (1, 3)
+    assert len(target.exec(select(Note)).all()) == 3
+
+    with pytest.raises(ValueError, match="Line 2"):
+        import_lines(target, [lines[0], b'{"video_id": "x"}'])
+
+def test_export_endpoint_streams_gzip_for_admins(session, admin):
+    add_notes(session, 2)
+    response = client.get("/notes/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["video_id"] for line in response.text.splitlines()] == ["vid0", "vid1"]
+
+    response = client.get("/notes/export", params={"gzip": "true"})
+    assert response.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(response.content).decode().count("\n") == 2
+
+def test_export_is_admin_only(session):
+    assert client.get("/notes/export").status_code == 403
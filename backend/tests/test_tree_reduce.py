@@ -0,0 +1,138 @@
+import asyncio
+from unittest.mock import patch
+from app.services import ai
+
+BUDGET = 100  # estimated tokens per reduce call
+
+
+def note(tokens: int, label: str) -> str:
+    # estimate_tokens() is len // 4 + 1
+    return label.ljust((tokens - 1) * 4, ".")
+
+
+def is_partial(prompt: str) -> bool:
+    return "Do not add a Title" in prompt
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def __call__(self, system_prompt, user_content, tracker=None, on_token=None, stage=None):
+        self.prompts.append(user_content)
+        await asyncio.sleep(0)
+        if on_token:
+            on_token("final")
+        return "merged" if is_partial(user_content) else "final"
+
+    def partials(self) -> list[str]:
+        return [p for p in self.prompts if is_partial(p)]
+
+    def finals(self) -> list[str]:
+        return [p for p in self.prompts if not is_partial(p)]
+
+
+def run_reduce(outputs_in_completion_order, texts, fake, on_token=None):
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        level = [loop.create_future() for _ in texts]
+        reduce_task = asyncio.ensure_future(
+            ai._tree_reduce(level, ai.TokenTracker(), lambda *args: None, on_token)
+        )
+        for index in outputs_in_completion_order:
+            level[index].set_result(texts[index])
+            await asyncio.sleep(0.01)
+        return await reduce_task
+
+    with patch.object(ai, "_call_llm", fake), patch.object(ai.settings, "LLM_REDUCE_INPUT_TOKENS", BUDGET):
+        return asyncio.run(scenario())
+
+
+def test_small_level_goes_straight_to_final_reduce():
+    fake = FakeLLM()
+    tokens = []
+    texts = [note(20, "a"), note(20, "b"), note(20, "c")]
+
+    assert run_reduce([2, 0, 1], texts, fake, on_token=tokens.append) == "final"
+    assert fake.partials() == []
+    assert len(fake.finals()) == 1
+    assert tokens == ["final"]
+
+
+def test_partial_reduce_starts_before_stragglers_finish():
+    fake = FakeLLM()
+    texts = [note(40, f"n{i}") for i in range(6)]
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        level = [loop.create_future() for _ in texts]
+        reduce_task = asyncio.ensure_future(
+            ai._tree_reduce(level, ai.TokenTracker(), lambda *args: None)
+        )
+        # The first three outputs are ready, the rest of the video is still mapping
+        for index in (0, 1, 2):
+            level[index].set_result(texts[index])
+        await asyncio.sleep(0.01)
+        started_early = len(fake.partials())
+
+        for index in (3, 4, 5):
+            level[index].set_result(texts[index])
+        return started_early, await reduce_task
+
+    with patch.object(ai, "_call_llm", fake), patch.object(ai.settings, "LLM_REDUCE_INPUT_TOKENS", BUDGET):
+        started_early, result = asyncio.run(scenario())
+
+    assert started_early >= 1
+    assert result == "final"
+    assert len(fake.finals()) == 1
+
+
+def test_batches_are_packed_by_size_in_document_order():
+    fake = FakeLLM()
+    texts = [note(30, "a"), note(30, "b"), note(30, "c"), note(90, "d"), note(30, "e")]
+
+    assert run_reduce([4, 3, 2, 1, 0], texts, fake) == "final"
+
+    partials = fake.partials()
+    # Level 0: a+b+c fill the budget; d is too big to share and e is the
+    # tail, both carried up alone. Level 1: merged(a,b,c)+d, then e.
+    assert len(partials) == 2
+    first, second = partials
+    assert first.index("a..") < first.index("b..") < first.index("c..")
+    assert "d.." not in first
+    assert second.index("merged") < second.index("d..")
+    assert "e.." not in second
+    final = fake.finals()[0]
+    assert final.index("merged") < final.index("e..")
+
+
+def input_tokens(prompt: str) -> int:
+    notes = prompt.split("Input Notes:\n", 1)[1].split("\n\nRules:", 1)[0]
+    return sum(ai.estimate_tokens(text) for text in notes.split(ai.NOTES_SEPARATOR))
+
+
+def test_outputs_too_large_to_pair_are_condensed_first():
+    fake = FakeLLM()
+    texts = [note(95, f"n{i}") for i in range(4)]
+
+    assert run_reduce([0, 1, 2, 3], texts, fake) == "final"
+
+    # No two outputs fit one call: each is condensed on its own first
+    assert len(fake.partials()) == 4
+    assert all("Keep the result under 37 words" in prompt for prompt in fake.partials())
+    assert max(input_tokens(prompt) for prompt in fake.prompts) <= BUDGET
+
+
+def test_output_over_the_budget_is_condensed_in_pieces():
+    fake = FakeLLM()
+    big = "\n".join(note(30, f"line{i}") for i in range(8))  # ~240 tokens
+    texts = [note(20, "a"), big, note(20, "c")]
+
+    assert run_reduce([0, 1, 2], texts, fake) == "final"
+
+    assert max(input_tokens(prompt) for prompt in fake.prompts) <= BUDGET
+    condensed = [prompt for prompt in fake.partials() if "Keep the result under" in prompt]
+    assert len(condensed) == 3
+    # Every line of the big output went to exactly one piece, in order
+    pieces = "".join(prompt.split("Input Notes:\n", 1)[1].split("\n\nRules:", 1)[0] for prompt in condensed)
+    assert [line for line in pieces.splitlines() if line] == big.splitlines()
@@ -31,6 +31,18 @@ export async function POST(
             body,
         });
 
+        // Server-Sent Events (e.g. /notes/stream): pipe the body through unbuffered
+        if (response.headers.get('content-type')?.includes('text/event-stream')) {
+            return new Response(response.body, {
+                status: response.status,
+                headers: {
+                    'Content-Type': 'text/event-stream',
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                },
+            });
+        }
+
         const data = await response.json();
         return Response.json(data, { status: response.status });
     } catch (error: unknown) {
@@ -42,6 +54,11 @@ export async function POST(
     }
 }
 
+// Validators and caching policy passed through from the backend, so the
+// browser's HTTP cache can revalidate notes and listings through the proxy
+const CACHE_HEADERS = ['etag', 'last-modified', 'cache-control', 'vary'];
+const CONDITIONAL_HEADERS = ['if-none-match', 'if-modified-since'];
+
 export async function GET(
     request: Request,
     { params }: { params: Promise<{ path?: string[] }> }
@@ -49,17 +66,39 @@ export async function GET(
     const { path } = await params;
     const apiUrl = getApiUrl();
     const endpoint = path?.join('/') || '';
+    // Keep the query string, e.g. ?cursor= for paging through GET /notes
+    const { search } = new URL(request.url);
+
+    const headers: Record<string, string> = {
+        'X-Forwarded-For': request.headers.get('x-forwarded-for') || '',
+    };
+    for (const name of CONDITIONAL_HEADERS) {
+        const value = request.headers.get(name);
+        if (value) headers[name] = value;
+    }
 
     try {
-        const response = await fetch(`${apiUrl}/${endpoint}`, {
+        const response = await fetch(`${apiUrl}/${endpoint}${search}`, {
             method: 'GET',
-            headers: {
-                'X-Forwarded-For': request.headers.get('x-forwarded-for') || '',
-            },
+            headers,
+            // Revalidation is up to the browser, never serve from Next's data cache
+            cache: 'no-store',
         });
 
-        const data = await response.json();
-        return Response.json(data, { status: response.status });
+        const responseHeaders = new Headers();
+        for (const name of CACHE_HEADERS) {
+            const value = response.headers.get(name);
+            if (value) responseHeaders.set(name, value);
+        }
+
+        // Client's copy is current: no body to read or send
+        if (response.status === 304) {
+            return new Response(null, { status: 304, headers: responseHeaders });
+        }
+
+        // fetch has already decompressed the body; pass the JSON through unparsed
+        responseHeaders.set('Content-Type', response.headers.get('content-type') || 'application/json');
+        return new Response(await response.text(), { status: response.status, headers: responseHeaders });
     } catch (error: unknown) {
         console.error('API proxy error:', error);
         return Response.json(
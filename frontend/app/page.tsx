@@ -4,7 +4,7 @@ import { useState, useEffect } from 'react';
 import { NoteInput } from '@/components/NoteInput';
 import { NoteViewer } from '@/components/NoteViewer';
 import { NotesGallery } from '@/components/NotesGallery';
-import { createNote, listNotes, Note } from '@/lib/api';
+import { createNote, getRenderedNote, listNotes, NoteSummary, RenderedNote } from '@/lib/api';
 import { AlertTriangle } from 'lucide-react';
 
 interface RateLimitError {
@@ -14,8 +14,10 @@ interface RateLimitError {
 }
 
 export default function Home() {
-  const [note, setNote] = useState<Note | null>(null);
-  const [allNotes, setAllNotes] = useState<Note[]>([]);
+  const [note, setNote] = useState<RenderedNote | null>(null);
+  const [allNotes, setAllNotes] = useState<NoteSummary[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
   const [isLoadingNotes, setIsLoadingNotes] = useState(true);
   const [statusText, setStatusText] = useState('');
@@ -30,8 +32,9 @@ export default function Home() {
   const loadNotes = async () => {
     setIsLoadingNotes(true);
     try {
-      const notes = await listNotes();
-      setAllNotes(notes);
+      const page = await listNotes();
+      setAllNotes(page.items);
+      setNextCursor(page.next_cursor);
     } catch (err) {
       console.error('Failed to load notes:', err);
     } finally {
@@ -39,6 +42,20 @@ export default function Home() {
     }
   };
 
+  const loadMoreNotes = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const page = await listNotes(nextCursor);
+      setAllNotes((notes) => [...notes, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error('Failed to load more notes:', err);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   // Status simulation effect
   useEffect(() => {
     if (!isLoading) {
@@ -73,7 +90,7 @@ export default function Home() {
 
     try {
       const data = await createNote(url, false);
-      setNote(data);
+      setNote(await getRenderedNote(data.id));
       loadNotes(); // Refresh gallery
     } catch (err: any) {
       console.error(err);
@@ -99,7 +116,7 @@ export default function Home() {
 
     try {
       const data = await createNote(note.url, true);
-      setNote(data);
+      setNote(await getRenderedNote(data.id));
       loadNotes();
     } catch (err: any) {
       console.error(err);
@@ -116,10 +133,16 @@ export default function Home() {
     }
   };
 
-  const handleSelectNote = (selectedNote: Note) => {
-    setNote(selectedNote);
+  const handleSelectNote = async (selectedNote: NoteSummary) => {
     setError(null);
     setRateLimitError(null);
+    // The listing has no content, fetch the rendered note
+    try {
+      setNote(await getRenderedNote(selectedNote.id));
+    } catch (err) {
+      console.error('Failed to load note:', err);
+      setError('Could not load this note.');
+    }
     // Scroll to top to show the note
     window.scrollTo({ top: 0, behavior: 'smooth' });
   };
@@ -173,7 +196,10 @@ export default function Home() {
         {note && (
           <div className="animate-in fade-in slide-in-from-bottom-8 duration-700">
             <NoteViewer
-              content_detailed={note.content_detailed}
+              key={note.id}
+              noteId={note.id}
+              html={note.html}
+              toc={note.toc}
               input_tokens={note.input_tokens}
               output_tokens={note.output_tokens}
               generation_cost={note.generation_cost}
@@ -184,7 +210,14 @@ export default function Home() {
 
         {/* Notes Gallery */}
         <div className="pt-8 border-t border-primary/10">
-          <NotesGallery notes={allNotes} isLoading={isLoadingNotes} onSelectNote={handleSelectNote} />
+          <NotesGallery
+            notes={allNotes}
+            isLoading={isLoadingNotes}
+            hasMore={nextCursor !== null}
+            isLoadingMore={isLoadingMore}
+            onLoadMore={loadMoreNotes}
+            onSelectNote={handleSelectNote}
+          />
         </div>
       </div>
     </main>
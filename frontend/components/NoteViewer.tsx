@@ -1,42 +1,34 @@
 'use client';
 
-import ReactMarkdown from 'react-markdown';
-import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
-import { vscDarkPlus } from 'react-syntax-highlighter/dist/esm/styles/prism';
-import { Copy, Check, FileText, FileCode, RefreshCw } from 'lucide-react';
-import { useState, useRef } from 'react';
+import { FileText, FileCode, RefreshCw } from 'lucide-react';
+import { useRef } from 'react';
 import { useReactToPrint } from 'react-to-print';
-import remarkGfm from 'remark-gfm';
-import rehypeSlug from 'rehype-slug';
+import { getNote, TocEntry } from '@/lib/api';
 
 interface NoteViewerProps {
-  content_detailed?: string;
+  noteId: number;
+  html: string;
+  toc: TocEntry[];
   input_tokens?: number;
   output_tokens?: number;
   generation_cost?: number;
   onRegenerate?: () => void;
 }
 
-// Helper function to create slug from text (for smooth scrolling)
-function slugify(text: string): string {
-  return text
-    .toLowerCase()
-    .replace(/[^\w\s-]/g, '')
-    .replace(/\s+/g, '-')
-    .trim();
-}
-
-export function NoteViewer({ content_detailed, input_tokens, output_tokens, generation_cost, onRegenerate }: NoteViewerProps) {
+// The HTML is rendered and sanitized by the backend (GET /notes/{id}/rendered),
+// so this component only displays it and wires up the copy buttons and anchors.
+export function NoteViewer({ noteId, html, toc, input_tokens, output_tokens, generation_cost, onRegenerate }: NoteViewerProps) {
   const contentRef = useRef<HTMLDivElement>(null);
-  const displayContent = content_detailed || '';
 
   const handlePrint = useReactToPrint({
     contentRef: contentRef,
     documentTitle: "Technical Notes",
   });
 
-  const handleDownloadMD = () => {
-    const blob = new Blob([displayContent], { type: 'text/markdown' });
+  // The Markdown source is only needed for the download, fetch it on demand
+  const handleDownloadMD = async () => {
+    const { content_detailed } = await getNote(noteId);
+    const blob = new Blob([content_detailed || ''], { type: 'text/markdown' });
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
     a.href = url;
@@ -47,17 +39,32 @@ export function NoteViewer({ content_detailed, input_tokens, output_tokens, gene
     URL.revokeObjectURL(url);
   };
 
-  // Handle anchor link clicks for smooth scrolling
-  const handleAnchorClick = (e: React.MouseEvent<HTMLAnchorElement>, href: string) => {
-    if (href.startsWith('#')) {
+  const scrollToAnchor = (href: string) => {
+    const targetElement = document.getElementById(href.slice(1));
+    if (targetElement) {
+      targetElement.scrollIntoView({ behavior: 'smooth', block: 'start' });
+      // Update URL without page reload
+      window.history.pushState(null, '', href);
+    }
+  };
+
+  // One delegated handler for the copy buttons and in-page links in the HTML
+  const handleContentClick = (e: React.MouseEvent<HTMLDivElement>) => {
+    const target = e.target as HTMLElement;
+
+    const copyButton = target.closest<HTMLButtonElement>('button.copy-code');
+    if (copyButton) {
+      const code = copyButton.parentElement?.querySelector('pre')?.textContent || '';
+      navigator.clipboard.writeText(code.replace(/\n$/, ''));
+      copyButton.textContent = 'Copied';
+      setTimeout(() => { copyButton.textContent = 'Copy'; }, 2000);
+      return;
+    }
+
+    const href = target.closest('a')?.getAttribute('href');
+    if (href?.startsWith('#')) {
       e.preventDefault();
-      const targetId = href.slice(1);
-      const targetElement = document.getElementById(targetId);
-      if (targetElement) {
-        targetElement.scrollIntoView({ behavior: 'smooth', block: 'start' });
-        // Update URL without page reload
-        window.history.pushState(null, '', href);
-      }
+      scrollToAnchor(href);
     }
   };
 
@@ -102,6 +109,25 @@ export function NoteViewer({ content_detailed, input_tokens, output_tokens, gene
         </div>
       </div>
 
+      {toc.length > 0 && (
+        <details className="print:hidden rounded-xl border border-muted px-6 py-4 text-sm">
+          <summary className="font-semibold cursor-pointer">Contents</summary>
+          <ul className="space-y-1 mt-2">
+            {toc.filter((entry) => entry.level > 1).map((entry) => (
+              <li key={entry.anchor} style={{ paddingLeft: `${(entry.level - 2) * 1}rem` }}>
+                <a
+                  href={`#${entry.anchor}`}
+                  onClick={(e) => { e.preventDefault(); scrollToAnchor(`#${entry.anchor}`); }}
+                  className="text-primary hover:text-primary/80"
+                >
+                  {entry.text}
+                </a>
+              </li>
+            ))}
+          </ul>
+        </details>
+      )}
+
       <article
         ref={contentRef}
         className="prose prose-stone dark:prose-invert max-w-none w-full bg-background p-8 md:p-12 rounded-xl shadow-sm border border-muted print:shadow-none print:border-none"
@@ -110,88 +136,12 @@ export function NoteViewer({ content_detailed, input_tokens, output_tokens, gene
           <h1 className="text-2xl font-bold">Technical Notes</h1>
           <p className="text-sm text-gray-500">Generated by YouTube Technical Note-Taker</p>
         </div>
-        <ReactMarkdown
-          remarkPlugins={[remarkGfm]}
-          rehypePlugins={[rehypeSlug]}
-          components={{
-            h1: ({ node, children, ...props }) => {
-              const id = typeof children === 'string' ? slugify(children) : props.id;
-              return <h1 id={id} className="text-3xl font-extrabold tracking-tight text-primary mb-6 scroll-mt-20" {...props}>{children}</h1>;
-            },
-            h2: ({ node, children, ...props }) => {
-              const id = typeof children === 'string' ? slugify(children) : props.id;
-              return <h2 id={id} className="text-2xl font-bold border-b border-primary/20 pb-2 mt-8 mb-4 scroll-mt-20" {...props}>{children}</h2>;
-            },
-            h3: ({ node, children, ...props }) => {
-              const id = typeof children === 'string' ? slugify(children) : props.id;
-              return <h3 id={id} className="text-xl font-semibold text-primary/90 mt-6 mb-3 scroll-mt-20" {...props}>{children}</h3>;
-            },
-            a: ({ node, href, children, ...props }) => {
-              const isAnchor = href?.startsWith('#');
-              return (
-                <a
-                  href={href}
-                  onClick={isAnchor ? (e) => handleAnchorClick(e, href!) : undefined}
-                  className="text-primary hover:text-primary/80 no-underline border-b border-primary/30 hover:border-primary transition-colors cursor-pointer"
-                  {...props}
-                >
-                  {children}
-                </a>
-              );
-            },
-            code({ node, inline, className, children, ...props }: any) {
-              const match = /language-(\w+)/.exec(className || '');
-              const codeString = String(children).replace(/\n$/, '');
-
-              if (!inline && match) {
-                return (
-                  <div className="relative group rounded-lg overflow-hidden my-6 shadow-md border border-muted-foreground/20 print:border-gray-300">
-                    <div className="absolute right-2 top-2 z-10 opacity-0 group-hover:opacity-100 transition-opacity print:hidden">
-                      <CopyButton code={codeString} />
-                    </div>
-                    <SyntaxHighlighter
-                      {...props}
-                      style={vscDarkPlus}
-                      language={match[1]}
-                      PreTag="div"
-                      customStyle={{ margin: 0, padding: '1.5rem', borderRadius: '0', fontSize: '0.9em' }}
-                    >
-                      {codeString}
-                    </SyntaxHighlighter>
-                  </div>
-                );
-              }
-              return (
-                <code {...props} className="bg-muted px-1.5 py-0.5 rounded text-sm font-mono text-primary font-medium">
-                  {children}
-                </code>
-              );
-            },
-          }}
-        >
-          {displayContent}
-        </ReactMarkdown>
+        <div
+          className="rendered-note"
+          onClick={handleContentClick}
+          dangerouslySetInnerHTML={{ __html: html }}
+        />
       </article>
     </div>
   );
 }
-
-function CopyButton({ code }: { code: string }) {
-  const [copied, setCopied] = useState(false);
-
-  const handleCopy = () => {
-    navigator.clipboard.writeText(code);
-    setCopied(true);
-    setTimeout(() => setCopied(false), 2000);
-  };
-
-  return (
-    <button
-      onClick={handleCopy}
-      className="p-1.5 rounded-md bg-stone-800/80 hover:bg-stone-700/80 text-stone-200 transition-colors backdrop-blur-sm"
-      title="Copy code"
-    >
-      {copied ? <Check className="w-4 h-4 text-green-400" /> : <Copy className="w-4 h-4" />}
-    </button>
-  );
-}
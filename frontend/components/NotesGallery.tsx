@@ -1,15 +1,18 @@
 'use client';
 
-import { Note } from '@/lib/api';
+import { NoteSummary } from '@/lib/api';
 import { Search, FileText, Clock } from 'lucide-react';
 import { useState, useMemo } from 'react';
 
 import { Loader2 } from 'lucide-react';
 
 interface NotesGalleryProps {
-    notes: Note[];
+    notes: NoteSummary[];
     isLoading?: boolean;
-    onSelectNote: (note: Note) => void;
+    hasMore?: boolean;
+    isLoadingMore?: boolean;
+    onLoadMore?: () => void;
+    onSelectNote: (note: NoteSummary) => void;
 }
 
 function formatTimeAgo(dateString: string): string {
@@ -28,7 +31,7 @@ function getYouTubeThumb(videoId: string): string {
     return `https://img.youtube.com/vi/${videoId}/mqdefault.jpg`;
 }
 
-export function NotesGallery({ notes, isLoading, onSelectNote }: NotesGalleryProps) {
+export function NotesGallery({ notes, isLoading, hasMore, isLoadingMore, onLoadMore, onSelectNote }: NotesGalleryProps) {
     const [search, setSearch] = useState('');
 
     const filteredNotes = useMemo(() => {
@@ -69,7 +72,7 @@ export function NotesGallery({ notes, isLoading, onSelectNote }: NotesGalleryPro
                     <Search className="absolute left-3 top-1/2 -translate-y-1/2 w-4 h-4 text-muted-foreground" />
                     <input
                         type="text"
-                        placeholder="Search by video URL..."
+                        placeholder={hasMore ? 'Filter loaded notes...' : 'Search by video URL...'}
                         value={search}
                         onChange={(e) => setSearch(e.target.value)}
                         className="pl-9 pr-4 py-2 text-sm rounded-lg border border-primary/20 bg-background focus:outline-none focus:ring-2 focus:ring-primary/30 w-64"
@@ -122,6 +125,19 @@ export function NotesGallery({ notes, isLoading, onSelectNote }: NotesGalleryPro
             {filteredNotes.length === 0 && search && (
                 <div className="text-center py-8 text-muted-foreground">
                     No notes matching &quot;{search}&quot;
+                    {hasMore && ' among the notes loaded so far. Load more to search further.'}
+                </div>
+            )}
+
+            {hasMore && onLoadMore && (
+                <div className="text-center">
+                    <button
+                        onClick={onLoadMore}
+                        disabled={isLoadingMore}
+                        className="px-4 py-2 text-sm rounded-lg border border-primary/20 text-primary hover:bg-primary/5 transition-all disabled:opacity-50"
+                    >
+                        {isLoadingMore ? 'Loading...' : 'Load more'}
+                    </button>
                 </div>
             )}
         </div>
@@ -21,6 +21,35 @@ export interface Note {
   created_at: string;
 }
 
+// Listing projection returned by GET /notes (no content)
+export interface NoteSummary {
+  id: number;
+  video_id: string;
+  url: string;
+  title: string;
+  generation_cost?: number;
+  created_at: string;
+}
+
+export interface TocEntry {
+  level: number;
+  text: string;
+  anchor: string;
+}
+
+// GET /notes/{id}/rendered: sanitized HTML rendered by the backend at save time
+export interface RenderedNote extends NoteSummary {
+  input_tokens?: number;
+  output_tokens?: number;
+  html: string;
+  toc: TocEntry[];
+}
+
+export interface NotePage {
+  items: NoteSummary[];
+  next_cursor: string | null;
+}
+
 export const createNote = async (url: string, force_refresh: boolean = false): Promise<Note> => {
   const response = await api.post<Note>('/notes', { url, force_refresh });
   return response.data;
@@ -31,7 +60,12 @@ export const getNote = async (id: number): Promise<Note> => {
   return response.data;
 };
 
-export const listNotes = async (): Promise<Note[]> => {
-  const response = await api.get<Note[]>('/notes');
+export const getRenderedNote = async (id: number): Promise<RenderedNote> => {
+  const response = await api.get<RenderedNote>(`/notes/${id}/rendered`);
+  return response.data;
+};
+
+export const listNotes = async (cursor?: string): Promise<NotePage> => {
+  const response = await api.get<NotePage>('/notes', { params: cursor ? { cursor } : undefined });
   return response.data;
 };